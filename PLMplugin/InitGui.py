@@ -39,6 +39,15 @@ class MyWorkbench(FreeCADGui.Workbench):
         self.appendToolbar('My Toolbar', ['MyFormCommand'])
         self.appendMenu('PLM', ['MyFormCommand'])
 
+    def Activated(self):
+        try:
+            # Модули FreeCAD для скриптов импортируются в фоне сразу после активации,
+            # а не при первом полученном скрипте
+            from freecad_executor import prewarm_namespace
+            prewarm_namespace()
+        except Exception as e:
+            FreeCAD.Console.PrintError(f"Error scheduling namespace prewarm: {str(e)}\n")
+
     def GetClassName(self):
         return 'Gui::PythonWorkbench'
 
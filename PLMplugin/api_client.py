@@ -1,13 +1,204 @@
 import json
 import http.client
+import select
+import threading
 import urllib.parse
 import time
 from utils.logger import log
 
+# Maximum number of idle keep-alive connections kept per host/port
+DEFAULT_POOL_SIZE = 8
+# Idle connections older than this are closed instead of reused: servers
+# usually drop idle keep-alive connections after a few seconds
+DEFAULT_IDLE_TIMEOUT = 4.0
+
+# Errors meaning a reused connection was already closed by the server
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+# Methods that may be resent after a failure: the server may have processed
+# the first attempt, so POST/PATCH are only resent if nothing was written yet
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+
+
+def _connection_dropped(conn) -> bool:
+    """Checks whether an idle connection was closed by the server
+
+    An idle keep-alive socket becomes readable only when the server has
+    closed it (or sent unexpected data), either way it must not be reused.
+    """
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class HTTPConnectionPool:
+    """Thread-safe pool of persistent HTTP/1.1 connections to one host/port.
+
+    Every request takes a connection for its exclusive use and returns it
+    after the response body has been read, so consecutive requests (for
+    example while loading an assembly node by node) reuse one TCP connection
+    instead of paying a handshake each time.
+    """
+
+    def __init__(self, host: str, port: int, max_size: int = DEFAULT_POOL_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        """
+        Args:
+            host: Server host
+            port: Server port
+            max_size: Maximum number of idle connections kept open
+            idle_timeout: Seconds an idle connection may be reused for
+        """
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        # Idle connections with the time they were returned, most recent last
+        self._idle = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.created = 0
+        self.reused = 0
+        self.reconnects = 0
+
+    def _acquire(self):
+        """Returns (connection, reused); expired idle connections are closed"""
+        expired = []
+        conn = None
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                candidate, released = self._idle.pop()
+                if now - released <= self.idle_timeout:
+                    conn = candidate
+                    break
+                expired.append(candidate)
+            self._in_use += 1
+            if conn is not None:
+                self.reused += 1
+            else:
+                self.created += 1
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            return conn, True
+        return http.client.HTTPConnection(self.host, port=self.port), False
+
+    def _release(self, conn, reusable: bool):
+        """Returns a connection to the pool or closes it"""
+        with self._lock:
+            self._in_use -= 1
+            if reusable and len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, body=None, headers: dict | None = None):
+        """Send a request over a pooled connection
+
+        A reused connection the server has already closed is detected before
+        the request is written and replaced with a new one. If a reused
+        connection fails after that, only idempotent methods are retried:
+        a POST/PATCH may already have been processed and is not resent.
+
+        Args:
+            method: HTTP method
+            url: Request URL (path and query)
+            body: Request body
+            headers: Request headers
+
+        Returns:
+            tuple: (status, reason, body bytes)
+        """
+        with self._lock:
+            self.requests += 1
+        while True:
+            conn, reused = self._acquire()
+            if reused and _connection_dropped(conn):
+                self._release(conn, False)
+                self._count_reconnect()
+                continue
+            try:
+                conn.request(method, url, body=body, headers=headers or {})
+                response = conn.getresponse()
+                # The body must be read completely before the connection is reused
+                data = response.read()
+            except STALE_CONNECTION_ERRORS:
+                self._release(conn, False)
+                if not reused or method.upper() not in IDEMPOTENT_METHODS:
+                    raise
+                self._count_reconnect()
+                continue
+            except BaseException:
+                self._release(conn, False)
+                raise
+            self._release(conn, not response.will_close)
+            return response.status, response.reason, data
+
+    def _count_reconnect(self):
+        with self._lock:
+            self.reconnects += 1
+        log(f"Stale keep-alive connection to {self.host}:{self.port}, reconnecting")
+
+    def stats(self) -> dict:
+        """Returns pool size and connection reuse counters"""
+        with self._lock:
+            acquired = self.created + self.reused
+            return {
+                'host': f"{self.host}:{self.port}",
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+                'requests': self.requests,
+                'connections_created': self.created,
+                'connections_reused': self.reused,
+                'reconnects': self.reconnects,
+                'reuse_rate': self.reused / acquired if acquired else 0.0,
+            }
+
+    def close(self):
+        """Closes idle connections; connections in use are closed when returned"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+# Pools shared by all clients of the same host/port
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(host: str, port: int) -> HTTPConnectionPool:
+    """Returns the shared connection pool for host/port"""
+    with _pools_lock:
+        pool = _pools.get((host, port))
+        if pool is None:
+            pool = _pools[(host, port)] = HTTPConnectionPool(host, port)
+        return pool
+
+
 class APIClient:
     def __init__(self, host="localhost", port=8000):
         self.host = host
         self.port = port
+        self.pool = get_connection_pool(host, port)
+
+    def get_pool_stats(self) -> dict:
+        """Returns keep-alive connection pool metrics (size, reuse rate)"""
+        return self.pool.stats()
 
     def _send_request_with_body(self, method: str, url: str, payload: dict):
         """Send request with JSON body to the API
@@ -18,7 +209,6 @@ class APIClient:
             payload: Dictionary to be sent as JSON payload
         """
         start_time = time.time()
-        conn = http.client.HTTPConnection(self.host, port=self.port)
 
         try:
             headers = {
@@ -27,23 +217,20 @@ class APIClient:
 
             json_payload = json.dumps(payload)
 
-            conn.request(method, url, body=json_payload, headers=headers)
-            response = conn.getresponse()
-            log(f"Response status: {response.status} {response.reason}")
+            status, reason, data = self.pool.request(method, url, body=json_payload, headers=headers)
+            log(f"Response status: {status} {reason}")
 
-            if response.status in [200, 201]:
-                data = response.read()
+            if status in [200, 201]:
                 return data.decode("utf-8")
             else:
-                log(f"Error response: {response.status} {response.reason}")
-                return json.dumps({"error": f"HTTP {response.status}: {response.reason}"})
+                log(f"Error response: {status} {reason}")
+                return json.dumps({"error": f"HTTP {status}: {reason}"})
 
         except Exception as e:
             log(f"Exception in send_request_with_body: {str(e)}")
             return json.dumps({"error": str(e)})
 
         finally:
-            conn.close()
             end_time = time.time()
             log(f"Total db time: {end_time - start_time:.2f} seconds")
 
@@ -57,31 +244,26 @@ class APIClient:
 
     def send_get_request(self, url_template: str, path_params: dict | None = None, query_params: dict | None = None):
         start_time = time.time()
-        
-        conn = http.client.HTTPConnection(self.host, port=self.port)
 
         try:
             full_url = self._build_url(url_template, path_params, query_params)
             log(f"Requesting URL: {full_url}")
 
-            conn.request("GET", full_url)
-            response = conn.getresponse()
-            log(f"Response status: {response.status} {response.reason}")
+            status, reason, data = self.pool.request("GET", full_url)
+            log(f"Response status: {status} {reason}")
 
-            if response.status == 200:
-                data = response.read()
+            if status == 200:
                 decode = data.decode("utf-8")
                 return decode
             else:
-                log(f"Error response: {response.status} {response.reason}")
-                return json.dumps({"error": f"HTTP {response.status}: {response.reason}"})
+                log(f"Error response: {status} {reason}")
+                return json.dumps({"error": f"HTTP {status}: {reason}"})
 
         except Exception as e:
             log(f"Exception in send_get_request: {str(e)}")
             return json.dumps({"error": str(e)})
 
         finally:
-            conn.close()
             end_time = time.time()
             log(f"Total db time: {end_time - start_time:.2f} seconds")
 
@@ -0,0 +1,327 @@
+"""
+Бинарные сообщения PLM WebSocket протокола (фреймы с opcode 2).
+
+Позволяют передавать BREP, PNG и другие сырые данные без экранирования
+в JSON и без накладных расходов base64.
+
+Формат сообщения (все числа в сетевом порядке байт):
+    magic            4 байта   b'PLMB'
+    version          1 байт    версия формата (BINARY_FORMAT_VERSION)
+    message_type     1 байт    тип сообщения (MESSAGE_TYPE_*)
+    correlation_len  2 байта   длина идентификатора запроса
+    content_type_len 1 байт    длина типа содержимого
+    meta_len         4 байта   длина JSON с метаданными
+    correlation_id   UTF-8     идентификатор запроса (может быть пустым)
+    content_type     ASCII     MIME-тип полезной нагрузки
+    meta             UTF-8     JSON-объект с остальными полями сообщения
+    payload          остаток   сырые данные
+
+Если сервер выбрал подпротокол CHUNKED_SUBPROTOCOL, крупное бинарное сообщение
+передается серией сообщений MESSAGE_TYPE_CHUNK: correlation_id - идентификатор
+передачи, meta - {"seq": номер, "count": количество}, payload - очередной кусок
+закодированного исходного сообщения. Куски отправляются в полосе массовых данных
+и не задерживают мелкие сообщения, которые идут между ними.
+"""
+
+import json
+import struct
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+BINARY_MAGIC = b'PLMB'
+BINARY_FORMAT_VERSION = 1
+
+MESSAGE_TYPE_EXECUTION_RESULT = 1
+MESSAGE_TYPE_FUNCTION_RESPONSE = 2
+MESSAGE_TYPE_FUNCTION_CALL = 3
+MESSAGE_TYPE_CHUNK = 4
+
+# Подпротокол WebSocket, означающий поддержку сервером сообщений MESSAGE_TYPE_CHUNK
+CHUNKED_SUBPROTOCOL = 'plm.chunked.v1'
+# Размер куска: сообщение длиннее отправляется по частям
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Максимальный размер сообщения, собираемого из кусков (как у WebSocketClient)
+DEFAULT_MAX_ASSEMBLED_SIZE = 128 * 1024 * 1024
+
+_HEADER = struct.Struct('!4sBBHBI')
+
+
+@dataclass
+class BinaryPayload:
+    """
+    Сырые данные в результате функции или скрипта.
+
+    Если результат (или одно из полей результата-словаря) является
+    BinaryPayload, ответ отправляется бинарным фреймом.
+
+    Example:
+        result = BinaryPayload(shape.exportBrepToString().encode(), 'application/x-brep')
+    """
+    data: bytes
+    content_type: str = 'application/octet-stream'
+
+    def describe(self) -> str:
+        """Краткое описание для вывода в UI и логи"""
+        return f"<{self.content_type}, {len(self.data)} байт>"
+
+
+@dataclass
+class BinaryMessage:
+    """Бинарное сообщение протокола: заголовок, JSON-метаданные и сырые данные"""
+    message_type: int
+    payload: Any = b''
+    content_type: str = 'application/octet-stream'
+    correlation_id: str = ''
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def encode_binary_header(message: BinaryMessage, meta: Optional[bytes] = None) -> bytes:
+    """
+    Формирует заголовок бинарного сообщения (все, кроме полезной нагрузки).
+
+    Args:
+        message: Сообщение для кодирования
+        meta: Уже сериализованные метаданные (None - сериализуются message.meta)
+
+    Returns:
+        bytes: Заголовок, за которым должен следовать message.payload
+    """
+    # Импорт здесь: result_serializer сам зависит от этого модуля (BinaryPayload)
+    from result_serializer import dumps_bytes
+    
+    correlation_id = (message.correlation_id or '').encode('utf-8')
+    content_type = (message.content_type or '').encode('ascii')
+    if meta is None:
+        meta = dumps_bytes(message.meta) if message.meta else b''
+    if len(correlation_id) > 0xFFFF or len(content_type) > 0xFF:
+        raise ValueError("Слишком длинный correlation_id или content_type")
+    return b''.join((
+        _HEADER.pack(BINARY_MAGIC, BINARY_FORMAT_VERSION, message.message_type,
+                     len(correlation_id), len(content_type), len(meta)),
+        correlation_id,
+        content_type,
+        meta,
+    ))
+
+
+def encode_binary_message(message: BinaryMessage, meta: Optional[bytes] = None) -> bytes:
+    """
+    Кодирует бинарное сообщение целиком.
+
+    Args:
+        message: Сообщение для кодирования
+        meta: Уже сериализованные метаданные (None - сериализуются message.meta)
+
+    Returns:
+        bytes: Данные для отправки бинарным фреймом
+    """
+    return b''.join((encode_binary_header(message, meta), message.payload))
+
+
+def is_binary_message(data) -> bool:
+    """Проверяет, начинаются ли данные с сигнатуры бинарного сообщения"""
+    return len(data) >= _HEADER.size and bytes(data[:len(BINARY_MAGIC)]) == BINARY_MAGIC
+
+
+def decode_binary_message(data) -> BinaryMessage:
+    """
+    Разбирает бинарное сообщение.
+
+    Полезная нагрузка возвращается как memoryview на исходный буфер, без копирования.
+
+    Args:
+        data: Данные бинарного фрейма
+
+    Returns:
+        BinaryMessage: Разобранное сообщение
+
+    Raises:
+        ValueError: Если данные не являются бинарным сообщением поддерживаемой версии
+    """
+    view = memoryview(data).cast('B')
+    if len(view) < _HEADER.size:
+        raise ValueError("Бинарное сообщение короче заголовка")
+    magic, version, message_type, correlation_len, content_type_len, meta_len = _HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Неизвестная сигнатура бинарного сообщения")
+    if version != BINARY_FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия бинарного сообщения: {version}")
+
+    offset = _HEADER.size
+    end = offset + correlation_len + content_type_len + meta_len
+    if end > len(view):
+        raise ValueError("Бинарное сообщение обрезано")
+    correlation_id = bytes(view[offset:offset + correlation_len]).decode('utf-8')
+    offset += correlation_len
+    content_type = bytes(view[offset:offset + content_type_len]).decode('ascii')
+    offset += content_type_len
+    meta = json.loads(bytes(view[offset:end]).decode('utf-8')) if meta_len else {}
+
+    return BinaryMessage(
+        message_type=message_type,
+        payload=view[end:],
+        content_type=content_type,
+        correlation_id=correlation_id,
+        meta=meta,
+    )
+
+
+def split_binary_payload(result) -> Tuple[Any, Optional[BinaryPayload], Optional[str]]:
+    """
+    Отделяет сырые данные от JSON-части результата.
+
+    Поддерживается результат-BinaryPayload целиком или словарь, в котором
+    одно поле содержит BinaryPayload.
+
+    Args:
+        result: Результат функции или скрипта
+
+    Returns:
+        tuple: (JSON-часть результата, BinaryPayload или None, имя поля или None)
+    """
+    if isinstance(result, BinaryPayload):
+        return None, result, None
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if isinstance(value, BinaryPayload):
+                rest = {k: v for k, v in result.items() if k != key}
+                return rest, value, key
+    return result, None, None
+
+
+def build_result_message(message_type: int, result, meta: Dict[str, Any],
+                         correlation_id: str = '') -> Optional[BinaryMessage]:
+    """
+    Собирает бинарное сообщение для результата, если в нем есть BinaryPayload.
+
+    Args:
+        message_type: Тип сообщения (MESSAGE_TYPE_*)
+        result: Результат функции или скрипта
+        meta: Остальные поля ответа (как в JSON-варианте)
+        correlation_id: Идентификатор запроса
+
+    Returns:
+        BinaryMessage или None, если результат не содержит сырых данных
+    """
+    json_part, binary, field_name = split_binary_payload(result)
+    if binary is None:
+        return None
+    meta = dict(meta)
+    meta['result'] = json_part
+    if field_name is not None:
+        meta['binary_field'] = field_name
+    return BinaryMessage(
+        message_type=message_type,
+        payload=binary.data,
+        content_type=binary.content_type,
+        correlation_id=correlation_id,
+        meta=meta,
+    )
+
+
+def split_into_chunks(data, chunk_size: int = DEFAULT_CHUNK_SIZE, transfer_id: str = None) -> List[bytes]:
+    """
+    Делит закодированное бинарное сообщение на сообщения MESSAGE_TYPE_CHUNK.
+
+    Args:
+        data: Закодированное сообщение (encode_binary_message)
+        chunk_size: Размер куска в байтах
+        transfer_id: Идентификатор передачи (по умолчанию - случайный)
+
+    Returns:
+        list: Закодированные сообщения-куски по порядку
+    """
+    transfer_id = transfer_id or uuid.uuid4().hex
+    view = memoryview(data).cast('B')
+    count = max(1, -(-len(view) // chunk_size))
+    return [
+        encode_binary_message(BinaryMessage(
+            message_type=MESSAGE_TYPE_CHUNK,
+            payload=view[seq * chunk_size:(seq + 1) * chunk_size],
+            content_type='',
+            correlation_id=transfer_id,
+            meta={'seq': seq, 'count': count},
+        ))
+        for seq in range(count)
+    ]
+
+
+class ChunkProtocolError(ValueError):
+    """Кусок передачи нарушает протокол (некорректные метаданные или превышен размер)"""
+
+
+class ChunkAssembler:
+    """
+    Собирает сообщения, переданные кусками MESSAGE_TYPE_CHUNK.
+
+    Одновременно хранится не более max_transfers незавершенных передач;
+    при превышении отбрасывается самая старая. Собранное сообщение не может
+    быть больше max_message_size: иначе куски обходили бы ограничение размера
+    сообщения WebSocketClient. Память выделяется по мере получения кусков,
+    а не по объявленному в них количеству.
+    """
+
+    def __init__(self, max_transfers: int = 16, max_message_size: int = DEFAULT_MAX_ASSEMBLED_SIZE):
+        """
+        Args:
+            max_transfers: Максимальное количество незавершенных передач
+            max_message_size: Максимальный размер собранного сообщения в байтах
+        """
+        self.max_transfers = max_transfers
+        self.max_message_size = max_message_size
+        self._transfers: Dict[str, list] = {}
+
+    def add(self, chunk: BinaryMessage) -> Optional[bytes]:
+        """
+        Добавляет кусок передачи.
+
+        Args:
+            chunk: Разобранное сообщение MESSAGE_TYPE_CHUNK
+
+        Returns:
+            bytes: Исходное закодированное сообщение, если получены все куски, иначе None
+
+        Raises:
+            ChunkProtocolError: Если метаданные куска некорректны или не совпадают
+                с первым куском передачи, или собранное сообщение превышает max_message_size
+                (незавершенная передача при этом отбрасывается)
+        """
+        transfer_id = chunk.correlation_id
+        seq = chunk.meta.get('seq')
+        count = chunk.meta.get('count')
+        # Каждый кусок, кроме пустого единственного, содержит хотя бы один байт
+        if (not isinstance(seq, int) or not isinstance(count, int) or isinstance(seq, bool)
+                or not 0 <= seq < count or count > max(1, self.max_message_size)):
+            self._transfers.pop(transfer_id, None)
+            raise ChunkProtocolError(f"Некорректный кусок передачи {transfer_id}: {chunk.meta}")
+
+        transfer = self._transfers.get(transfer_id)
+        if transfer is None:
+            if len(self._transfers) >= self.max_transfers:
+                dropped = next(iter(self._transfers))
+                del self._transfers[dropped]
+            # [куски по номеру, объявленное количество, полученный размер]
+            transfer = self._transfers[transfer_id] = [{}, count, 0]
+        parts, expected_count, size = transfer
+        if count != expected_count:
+            del self._transfers[transfer_id]
+            raise ChunkProtocolError(
+                f"Кусок передачи {transfer_id} с количеством {count} вместо {expected_count}"
+            )
+
+        payload = bytes(chunk.payload)
+        previous = parts.get(seq)
+        size += len(payload) - (len(previous) if previous is not None else 0)
+        if size > self.max_message_size:
+            del self._transfers[transfer_id]
+            raise ChunkProtocolError(
+                f"Передача {transfer_id} превышает {self.max_message_size} байт"
+            )
+        parts[seq] = payload
+        transfer[2] = size
+
+        if len(parts) < expected_count:
+            return None
+        del self._transfers[transfer_id]
+        return b''.join(parts[index] for index in range(expected_count))
@@ -1,34 +1,153 @@
+import concurrent.futures
+import itertools
 import json
+import reprlib
 import threading
 import time
 from plm_functions import PLMFunctions
 from PySide2 import QtWidgets, QtCore
 
-from socket_client import create_websocket_client
+from socket_client import (
+    WebSocketClient,
+    OutboundQueue,
+    reconnect_delays,
+    DEFAULT_MAX_MESSAGE_SIZE,
+    OPCODE_BINARY,
+    OPCODE_TEXT,
+    LANE_PRIORITY,
+    LANE_BULK,
+)
+from binary_messages import (
+    BinaryMessage,
+    ChunkAssembler,
+    CHUNKED_SUBPROTOCOL,
+    DEFAULT_CHUNK_SIZE,
+    MESSAGE_TYPE_CHUNK,
+    MESSAGE_TYPE_FUNCTION_CALL,
+    decode_binary_message,
+    encode_binary_message,
+    is_binary_message,
+    split_binary_payload,
+    split_into_chunks,
+)
 import traceback
 from freecad_executor import FreeCADExecutor
 from utils.logger import log
-from function_registry import FunctionRegistry
+from function_registry import FunctionRegistry, AFFINITY_ANY, AFFINITY_WORKER
+from result_serializer import dumps_bytes
+from request_profiler import RequestProfile
+from geometry_pool import GeometryWorkerPool
+
+# Представление результатов для UI и журнала: не больше нескольких сотен символов
+# независимо от размера результата
+class _ResultRepr(reprlib.Repr):
+    """reprlib.Repr без сортировки ключей словаря: стоимость не зависит от размера словаря"""
+
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        pieces = [f"{self.repr1(key, level - 1)}: {self.repr1(value, level - 1)}"
+                  for key, value in itertools.islice(x.items(), self.maxdict)]
+        if len(x) > self.maxdict:
+            pieces.append('...')
+        return '{%s}' % ', '.join(pieces)
+
+
+_result_repr = _ResultRepr()
+_result_repr.maxlevel = 3
+_result_repr.maxdict = 10
+_result_repr.maxlist = 10
+_result_repr.maxtuple = 10
+_result_repr.maxstring = 200
+_result_repr.maxother = 200
+
+
+def _summarize(value):
+    """Усеченное представление значения с количеством элементов коллекции"""
+    text = _result_repr.repr(value)
+    if isinstance(value, (dict, list, tuple)) and len(value) > 10:
+        text = f"{text} ({len(value)} элементов)"
+    return text
 
 class PLMClientPanel(QtWidgets.QWidget):
     # Сигнал для обновления UI из другого потока
     message_received = QtCore.Signal(str)
     connection_status_changed = QtCore.Signal(bool, str)
-    # Добавляем сигнал для выполнения кода в главном потоке
-    execute_code_signal = QtCore.Signal(str)
-    # Добавляем сигнал для выполнения функций в главном потоке
-    execute_function_signal = QtCore.Signal(str, dict)
+    # Сигнал с результатом heartbeat (RTT в миллисекундах)
+    heartbeat_updated = QtCore.Signal(float)
+    # Добавляем сигнал для выполнения кода в главном потоке (код, request_id, параметры выполнения)
+    execute_code_signal = QtCore.Signal(str, object, dict)
+    # Добавляем сигнал для выполнения функций в главном потоке (имя, аргументы, request_id, профиль запроса)
+    execute_function_signal = QtCore.Signal(str, dict, object, object)
+    # Сигнал для выполнения шаблона скрипта в главном потоке (идентификатор, аргументы, request_id, параметры выполнения)
+    execute_template_signal = QtCore.Signal(str, dict, object, dict)
+    # Сигнал для выполнения пакета скриптов и вызовов функций в главном потоке (элементы, request_id, параметры выполнения)
+    execute_batch_signal = QtCore.Signal(list, object, dict)
+    # Сигнал для выполнения пакета вызовов функций в главном потоке (вызовы, request_id, параметры)
+    execute_function_calls_signal = QtCore.Signal(list, object, dict)
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.ws_client = None
         self.send_message = None
         self.receive_message = None
         self.close_connection = None
         self.listener_thread = None
         self.is_connected = False
+        # Адрес сервера текущей сессии (для переподключения из потока прослушивания)
+        self.host = None
+        self.port = None
+        # Идет ли автоматическое переподключение после разрыва
+        self.is_reconnecting = False
+        # Устанавливается при отключении пользователем: останавливает прослушивание и переподключение
+        self.stop_event = threading.Event()
+        self.stop_event.set()
+        # Результаты, накопленные пока соединение разорвано
+        self.outbound_queue = OutboundQueue()
+        # Поддерживает ли сервер передачу крупных сообщений кусками (подпротокол CHUNKED_SUBPROTOCOL)
+        self.chunked_transfers = False
+        # Сборка входящих сообщений, переданных кусками
+        self.chunk_assembler = ChunkAssembler(max_message_size=DEFAULT_MAX_MESSAGE_SIZE)
         
         self.freecad_executor = FreeCADExecutor()
         self.function_registry = FunctionRegistry()  # Создаем экземпляр реестра функций
+        # Шаблоны скриптов и статистика кэша скомпилированного кода доступны серверу как функции
+        self.function_registry.register_function(
+            "register_script_template", self.freecad_executor.register_template, affinity=AFFINITY_ANY
+        )
+        self.function_registry.register_function(
+            "get_code_cache_stats", self.freecad_executor.get_cache_stats, affinity=AFFINITY_ANY
+        )
+        # Именованные сессии выполнения: пространство имен сохраняется между скриптами.
+        # create_session собирает пространство имен (импорт FreeCAD, FreeCADGui, Draft),
+        # поэтому выполняется в главном потоке
+        self.function_registry.register_function(
+            "create_session", self.freecad_executor.create_session
+        )
+        self.function_registry.register_function(
+            "destroy_session", self.freecad_executor.destroy_session, affinity=AFFINITY_ANY
+        )
+        self.function_registry.register_function(
+            "list_sessions", self.freecad_executor.list_sessions, affinity=AFFINITY_ANY
+        )
+        # Пул процессов FreeCADCmd для тяжелых геометрических задач; функции
+        # выгружают формы в главном потоке и возвращают Future, ответ уходит по готовности
+        self.geometry_pool = GeometryWorkerPool()
+        self.function_registry.register_function("compare_objects_parallel", self.geometry_pool.compare_objects)
+        self.function_registry.register_function("fuse_objects_parallel", self.geometry_pool.fuse_objects)
+        self.function_registry.register_function(
+            "get_geometry_pool_stats", self.geometry_pool.stats, affinity=AFFINITY_ANY
+        )
+        # Отмена выполняемого скрипта: вызывается в потоке прослушивания,
+        # пока главный поток занят скриптом
+        self.function_registry.register_function(
+            "cancel_execution", self.freecad_executor.cancel_execution, affinity=AFFINITY_ANY
+        )
+        self.function_registry.register_function(
+            "list_executions", self.freecad_executor.list_executions, affinity=AFFINITY_ANY
+        )
         
         # Переменная для хранения PLMFunctions
         self.plm_functions = None
@@ -38,10 +157,16 @@ class PLMClientPanel(QtWidgets.QWidget):
         # Подключаем сигналы
         self.message_received.connect(self.update_messages)
         self.connection_status_changed.connect(self.update_connection_status)
+        self.heartbeat_updated.connect(self.update_heartbeat_status)
         # Подключаем сигнал для выполнения кода
         self.execute_code_signal.connect(self.execute_code_in_main_thread)
         # Подключаем сигнал для выполнения функций
         self.execute_function_signal.connect(self.execute_function_in_main_thread)
+        # Подключаем сигнал для выполнения шаблонов скриптов
+        self.execute_template_signal.connect(self.execute_template_in_main_thread)
+        # Подключаем сигнал для выполнения пакетов
+        self.execute_batch_signal.connect(self.execute_batch_in_main_thread)
+        self.execute_function_calls_signal.connect(self.execute_function_calls_in_main_thread)
 
     def setup_ui(self):
         layout = QtWidgets.QVBoxLayout(self)
@@ -70,6 +195,10 @@ class PLMClientPanel(QtWidgets.QWidget):
         self.status_label = QtWidgets.QLabel('Статус: Отключено')
         connection_layout.addWidget(self.status_label, 3, 0, 1, 2)
         
+        # Состояние heartbeat: время ответа сервера на ping
+        self.heartbeat_label = QtWidgets.QLabel('Пинг: -')
+        connection_layout.addWidget(self.heartbeat_label, 4, 0, 1, 2)
+        
         layout.addLayout(connection_layout)
         
         # Область для отправки сообщений
@@ -100,7 +229,7 @@ class PLMClientPanel(QtWidgets.QWidget):
         layout.addWidget(self.clear_button)
 
     def toggle_connection(self):
-        if not self.is_connected:
+        if not self.is_connected and not self.is_reconnecting:
             self.connect_to_server()
         else:
             self.disconnect_from_server()
@@ -115,21 +244,13 @@ class PLMClientPanel(QtWidgets.QWidget):
             
         try:
             self.add_message(f"Подключение к {host}:{port}...")
-            self.send_message, self.receive_message, self.close_connection = create_websocket_client(host, port)
-            
-            # Проверяем, что функции получены корректно
-            if not self.send_message or not self.receive_message or not self.close_connection:
-                self.add_message("Ошибка: Не удалось получить функции WebSocket")
-                return
-                
-            # Тестовое сообщение для проверки соединения
-            try:
-                self.send_message("CONNECT_TEST")
-                self.add_message("Тестовое сообщение отправлено")
-            except Exception as e:
-                self.add_message(f"Ошибка при отправке тестового сообщения: {str(e)}")
+            self.open_connection(host, port)
             
             # Запускаем поток для прослушивания сообщений
+            self.host = host
+            self.port = port
+            self.stop_event = threading.Event()
+            self.outbound_queue.clear()
             self.is_connected = True
             self.listener_thread = threading.Thread(target=self.listen_for_messages)
             self.listener_thread.daemon = True
@@ -140,22 +261,118 @@ class PLMClientPanel(QtWidgets.QWidget):
         except Exception as e:
             self.add_message(f"Ошибка подключения: {str(e)}")
 
+    def open_connection(self, host, port):
+        """
+        Устанавливает WebSocket соединение и настраивает функции отправки и приема.
+        Вызывается при подключении и из потока прослушивания при переподключении.
+        
+        Args:
+            host (str): Хост сервера
+            port (int): Порт сервера
+            
+        Returns:
+            WebSocketClient: Новое соединение
+        """
+        ws_client = WebSocketClient(host, port, subprotocols=[CHUNKED_SUBPROTOCOL])
+        self.chunked_transfers = ws_client.subprotocol == CHUNKED_SUBPROTOCOL
+        log(f"Передача крупных сообщений кусками: {'включена' if self.chunked_transfers else 'не поддерживается сервером'}")
+        # RTT приходит из потока прослушивания, поэтому передаем его через сигнал
+        ws_client.on_heartbeat = lambda rtt: self.heartbeat_updated.emit(rtt * 1000)
+        # Когда поток записи разгрузился, отправляем результаты, не поместившиеся в его очередь
+        ws_client.on_send_drained = self.flush_outbound_queue
+        
+        self.ws_client = ws_client
+        self.send_message = ws_client.send_message
+        self.receive_message = ws_client.receive_message
+        self.close_connection = ws_client.close
+            
+        # Тестовое сообщение для проверки соединения
+        try:
+            self.send_message("CONNECT_TEST")
+            self.message_received.emit("Тестовое сообщение отправлено")
+        except Exception as e:
+            self.message_received.emit(f"Ошибка при отправке тестового сообщения: {str(e)}")
+        return ws_client
+
     def disconnect_from_server(self):
+        # Останавливаем прослушивание и переподключение до закрытия,
+        # чтобы поток прослушивания завершился без ошибки
+        self.stop_event.set()
+        self.is_connected = False
+        self.is_reconnecting = False
         if self.close_connection:
             try:
                 self.close_connection()
                 self.add_message("Соединение закрыто")
             except Exception as e:
                 self.add_message(f"Ошибка при закрытии соединения: {str(e)}")
+        
+        if len(self.outbound_queue):
+            self.add_message(f"Отброшено неотправленных результатов: {len(self.outbound_queue)}")
+            self.outbound_queue.clear()
                 
-        self.is_connected = False
         self.connection_status_changed.emit(False, "Отключено")
         
         # Сбрасываем функции
+        self.ws_client = None
         self.send_message = None
         self.receive_message = None
         self.close_connection = None
 
+    def reconnect(self, stop_event):
+        """
+        Переподключается к серверу с экспоненциально растущей задержкой со случайным
+        разбросом и отправляет накопленные за время разрыва результаты.
+        Вызывается из потока прослушивания.
+        
+        Args:
+            stop_event (threading.Event): Событие отключения пользователем
+            
+        Returns:
+            bool: True, если соединение восстановлено; False, если пользователь отключился
+        """
+        self.is_reconnecting = True
+        self.connection_status_changed.emit(False, "Соединение потеряно, переподключение...")
+        
+        for attempt, delay in enumerate(reconnect_delays(), 1):
+            self.message_received.emit(f"Переподключение через {delay:.1f} с (попытка {attempt})...")
+            if stop_event.wait(delay):
+                return False
+            try:
+                ws_client = self.open_connection(self.host, self.port)
+            except Exception as e:
+                log(f"Попытка переподключения {attempt} не удалась: {str(e)}")
+                continue
+            
+            if stop_event.is_set():
+                # Пользователь отключился, пока устанавливалось соединение
+                ws_client.close()
+                return False
+            
+            self.is_reconnecting = False
+            self.is_connected = True
+            self.connection_status_changed.emit(True, f"Переподключено к {self.host}:{self.port}")
+            self.flush_outbound_queue()
+            return True
+        return False
+
+    def flush_outbound_queue(self):
+        """
+        Отправляет результаты, накопленные пока соединение было разорвано
+        
+        Returns:
+            bool: False, если отправка прервалась ошибкой и в очереди остались результаты
+        """
+        try:
+            sent = self.outbound_queue.flush(self.send_message)
+            if sent:
+                self.message_received.emit(f"Отправлено накопленных результатов: {sent}")
+            return True
+        except Exception as e:
+            # Неотправленные результаты остаются в очереди до следующего переподключения
+            log(f"Ошибка при отправке накопленных результатов: {str(e)}")
+            return False
+
     def listen_for_messages(self):
         # Используем сигнал для безопасного обновления UI из другого потока
         log("Запущен поток прослушивания сообщений")
@@ -164,15 +381,19 @@ class PLMClientPanel(QtWidgets.QWidget):
         self.message_received.emit("Запущен поток прослушивания сообщений")
         
         message_count = 0
-        while self.is_connected and self.receive_message:
+        stop_event = self.stop_event
+        while not stop_event.is_set():
+            ws_client = self.ws_client
             try:
-                message = self.receive_message()
-                if message:
-                    # Добавляем отладочное сообщение
-                    log(f"Получено сырое сообщение от сервера: {message}")
-                    
+                # Ждем данных в селекторе и разбираем все фреймы, пришедшие за одно пробуждение
+                for message in ws_client.receive_available():
                     # Используем сигнал для безопасного обновления UI из другого потока
-                    message_text = f"Получено: {message}"
+                    if isinstance(message, (bytes, bytearray)):
+                        message_text = f"Получено бинарное сообщение: {len(message)} байт"
+                    else:
+                        # Добавляем отладочное сообщение
+                        log(f"Получено сырое сообщение от сервера: {message}")
+                        message_text = f"Получено: {message}"
                     log(message_text)  # Отладка в консоль
                     
                     # Отправляем сообщение через сигнал
@@ -186,10 +407,10 @@ class PLMClientPanel(QtWidgets.QWidget):
                     # Увеличиваем счетчик сообщений
                     message_count += 1
                     log(f"Всего получено сообщений: {message_count}")
-                    
-                # Небольшая задержка, чтобы не нагружать CPU
-                time.sleep(0.1)
             except Exception as e:
+                if stop_event.is_set():
+                    # Соединение закрыто пользователем во время ожидания
+                    break
                 error_msg = f"Ошибка при получении сообщения: {str(e)}"
                 log(error_msg)  # Отладочная информация в консоль
                 
@@ -197,8 +418,16 @@ class PLMClientPanel(QtWidgets.QWidget):
                 self.message_received.emit(error_msg)
                 
                 self.is_connected = False
-                self.connection_status_changed.emit(False, "Отключено из-за ошибки")
-                break
+                try:
+                    ws_client.close()
+                except Exception:
+                    pass
+                # Сообщения, которые поток записи не успел отправить, уйдут после переподключения
+                self.outbound_queue.requeue(ws_client.take_unsent())
+                
+                # Результаты, готовые во время разрыва, накапливаются в outbound_queue
+                if not self.reconnect(stop_event):
+                    break
         
         # Отправляем сообщение о завершении через сигнал
         self.message_received.emit("Поток прослушивания сообщений завершен")
@@ -242,14 +471,19 @@ class PLMClientPanel(QtWidgets.QWidget):
         self.status_label.setText(f"Статус: {status_text}")
         
         # Обновляем состояние кнопки подключения
-        if is_connected:
+        if is_connected or self.is_reconnecting:
             self.connect_button.setText("Отключиться")
-            self.message_input.setEnabled(True)
-            self.send_button.setEnabled(True)
+            self.message_input.setEnabled(is_connected)
+            self.send_button.setEnabled(is_connected)
         else:
             self.connect_button.setText("Подключиться")
             self.message_input.setEnabled(False)
             self.send_button.setEnabled(False)
+            self.heartbeat_label.setText("Пинг: -")
+
+    def update_heartbeat_status(self, rtt_ms):
+        """Обновляет время ответа сервера на ping (вызывается из другого потока через сигнал)"""
+        self.heartbeat_label.setText(f"Пинг: {rtt_ms:.1f} мс")
 
     def clear_messages(self):
         """Очищает область сообщений"""
@@ -259,6 +493,8 @@ class PLMClientPanel(QtWidgets.QWidget):
         """Обработчик закрытия окна"""
         if self.is_connected:
             self.disconnect_from_server()
+        self.geometry_pool.shutdown()
+        self.function_registry.shutdown()
         event.accept()
         
     # Функции для выполнения Python-кода
@@ -271,7 +507,14 @@ class PLMClientPanel(QtWidgets.QWidget):
         Args:
             message (str): Полученное сообщение от сервера
         """
+        # Момент получения сообщения: от него считается время в профиле запроса
+        received = time.perf_counter()
         try:
+            # Бинарные сообщения (opcode 2) разбираем отдельно
+            if isinstance(message, (bytes, bytearray)):
+                self.process_binary_message(message)
+                return
+            
             # Добавляем отладочное сообщение
             log(f"Обработка сообщения: {message}")
             
@@ -293,13 +536,48 @@ class PLMClientPanel(QtWidgets.QWidget):
                 # Добавляем отладочное сообщение
                 log(f"Сообщение успешно распарсено как JSON: {data}")
                 
+                # Идентификатор запроса возвращается в ответе, чтобы сервер мог
+                # держать несколько запросов в полете одновременно
+                request_id = data.get('request_id') if isinstance(data, dict) else None
+                # Параметры выполнения скрипта (сессия и т.п.)
+                options = self.execution_options(data) if isinstance(data, dict) else {}
+                # Разбивка времени обработки запроса, если сервер запросил профиль
+                profile = RequestProfile.from_message(data.get('profile'), received) if isinstance(data, dict) else None
+                if profile is not None:
+                    profile.mark_parsed()
+                
                 # Проверяем, содержит ли JSON поле с Python-кодом
                 if isinstance(data, dict) and 'python_code' in data:
                     code = data['python_code']
                     # Добавляем отладочное сообщение
                     log(f"Найден python_code: {code}")
+                    if profile is not None:
+                        options['profile'] = profile
                     # Используем сигнал для выполнения кода в главном потоке
-                    self.execute_code_signal.emit(code)
+                    self.execute_code_signal.emit(code, request_id, options)
+                # Шаблон скрипта: идентификатор и аргументы вместо исходного текста
+                elif isinstance(data, dict) and 'template_id' in data:
+                    template_id = data['template_id']
+                    arguments = data.get('arguments', {})
+                    log(f"Найден template_id: {template_id}, аргументы: {arguments}")
+                    if profile is not None:
+                        options['profile'] = profile
+                    self.execute_template_signal.emit(template_id, arguments, request_id, options)
+                # Пакет: упорядоченный список скриптов, шаблонов и вызовов функций,
+                # выполняемый в одной транзакции с одним пересчетом документа
+                elif isinstance(data, dict) and isinstance(data.get('batch'), list):
+                    items = data['batch']
+                    options['stop_on_error'] = bool(data.get('stop_on_error', True))
+                    log(f"Найден пакет из {len(items)} элементов")
+                    self.execute_batch_signal.emit(items, request_id, options)
+                # Пакет вызовов функций: один разбор, одна диспетчеризация и один ответ
+                elif isinstance(data, dict) and isinstance(data.get('function_calls'), list):
+                    calls = data['function_calls']
+                    options = {'stop_on_error': bool(data.get('stop_on_error', True))}
+                    if profile is not None:
+                        options['profile'] = profile
+                    log(f"Найден пакет из {len(calls)} вызовов функций")
+                    self.dispatch_function_calls(calls, request_id, options)
                 # Проверяем наличие вызова функции
                 elif isinstance(data, dict) and 'function_call' in data:
                     function_name = data['function_call']
@@ -307,10 +585,10 @@ class PLMClientPanel(QtWidgets.QWidget):
                     function_args = data.get('arguments', {})
                     # Добавляем отладочное сообщение
                     log(f"Найден function_call: {function_name}, аргументы: {function_args}")
-                    # Используем сигнал для выполнения функции в главном потоке
-                    self.execute_function_signal.emit(function_name, function_args)
+                    self.dispatch_function_call(function_name, function_args, request_id, profile)
                 else:
-                    log(f"В сообщении JSON отсутствует поле 'python_code' или 'function_call'")
+                    log(f"В сообщении JSON отсутствует поле 'python_code', 'template_id', 'batch', "
+                        f"'function_calls' или 'function_call'")
                     # Выводим информационное сообщение о полученных данных
                     self.message_received.emit(f"Информация: Получены данные: {json.dumps(data, ensure_ascii=False)}")
                     
@@ -326,12 +604,211 @@ class PLMClientPanel(QtWidgets.QWidget):
             log(error_msg)
             self.message_received.emit(error_msg)
     
-    def execute_code_in_main_thread(self, code):
+    def process_binary_message(self, data):
+        """
+        Обрабатывает бинарное сообщение PLM-протокола.
+        Для function_call сырые данные передаются функции в аргументе,
+        имя которого указано в поле binary_argument метаданных (по умолчанию data).
+        
+        Args:
+            data (bytearray): Данные бинарного фрейма
+        """
+        if not is_binary_message(data):
+            log(f"Бинарное сообщение без заголовка PLM: {len(data)} байт")
+            self.message_received.emit(f"Информация: Получены бинарные данные ({len(data)} байт)")
+            return
+        
+        message = decode_binary_message(data)
+        if message.message_type == MESSAGE_TYPE_CHUNK:
+            # Кусок крупного сообщения: обрабатываем, когда получены все куски
+            assembled = self.chunk_assembler.add(message)
+            if assembled is not None:
+                self.process_binary_message(assembled)
+            return
+        
+        log(f"Бинарное сообщение: тип {message.message_type}, {message.content_type}, "
+            f"{len(message.payload)} байт, метаданные: {message.meta}")
+        
+        if message.message_type == MESSAGE_TYPE_FUNCTION_CALL and 'function_call' in message.meta:
+            function_name = message.meta['function_call']
+            function_args = dict(message.meta.get('arguments') or {})
+            function_args[message.meta.get('binary_argument', 'data')] = bytes(message.payload)
+            request_id = message.meta.get('request_id', message.correlation_id or None)
+            self.dispatch_function_call(function_name, function_args, request_id)
+        else:
+            self.message_received.emit(
+                f"Информация: Получено бинарное сообщение типа {message.message_type} "
+                f"({message.content_type}, {len(message.payload)} байт)"
+            )
+    
+    def dispatch_function_call(self, function_name, function_args, request_id=None, profile=None):
+        """
+        Направляет вызов функции в нужный поток: функции с привязкой AFFINITY_ANY
+        выполняются сразу в потоке прослушивания, AFFINITY_WORKER - ставятся в пул
+        рабочих потоков (ответ отправляется по готовности), остальные - в главном
+        потоке через сигнал
+        
+        Args:
+            function_name (str): Имя функции для вызова
+            function_args (dict): Аргументы функции
+            request_id: Идентификатор запроса
+            profile (RequestProfile): Профиль запроса, если сервер его запросил
+        """
+        if self.function_registry.get_affinity(function_name) in (AFFINITY_ANY, AFFINITY_WORKER):
+            self.execute_function_call(function_name, function_args, request_id, profile)
+        else:
+            # Используем сигнал для выполнения функции в главном потоке
+            self.execute_function_signal.emit(function_name, function_args, request_id, profile)
+    
+    def dispatch_function_calls(self, calls, request_id=None, options=None):
+        """
+        Направляет пакет вызовов функций в нужный поток (FunctionRegistry.get_batch_affinity):
+        в поток прослушивания, в пул рабочих потоков или в главный поток
+        
+        Args:
+            calls (list): Вызовы в формате сообщений
+            request_id: Идентификатор запроса
+            options (dict): Параметры пакета (stop_on_error, profile)
+        """
+        affinity = self.function_registry.get_batch_affinity(calls)
+        if affinity == AFFINITY_ANY:
+            self.execute_function_calls(calls, request_id, options)
+        elif affinity == AFFINITY_WORKER:
+            self.function_registry.submit(self.execute_function_calls, calls, request_id, options)
+        else:
+            self.execute_function_calls_signal.emit(calls, request_id, options or {})
+    
+    def send_result_to_server(self, data, profile=None):
+        """
+        Отправляет результат на сервер через WebSocket: словарь как JSON,
+        BinaryMessage - бинарным фреймом. Может вызываться из любого потока
+        и не ждет сети: запись в сокет выполняет поток записи WebSocketClient.
+        Крупные бинарные сообщения идут в полосе массовых данных (кусками, если
+        сервер это поддерживает), чтобы не задерживать мелкие ответы.
+        Если соединение разорвано или очередь потока записи заполнена, результат
+        ставится в outbound_queue и будет отправлен позже.
+        
+        Args:
+            data: Словарь или BinaryMessage
+            profile (RequestProfile): Профиль запроса, вложенный в data; в его отчет
+                попадает время сериализации ответа
+            
+        Returns:
+            bool: True, если результат отправлен
+        """
+        try:
+            parts = self.prepare_outgoing(data, profile)
+        except Exception as e:
+            log(f"Ошибка при подготовке результата: {str(e)}")
+            self.message_received.emit(f"Ошибка при отправке результата: {str(e)}")
+            return False
+        
+        sent = 0
+        if self.is_connected and self.send_message:
+            try:
+                if len(self.outbound_queue):
+                    # Сначала должны уйти результаты, накопленные во время разрыва
+                    for message, opcode, lane in parts:
+                        self.outbound_queue.put(message, opcode, lane)
+                    parts = []
+                    if not self.flush_outbound_queue():
+                        self.message_received.emit("Результат поставлен в очередь отправки")
+                        return False
+                else:
+                    # Отправляем через веб-сокет
+                    for message, opcode, lane in parts:
+                        self.send_message(message, opcode, lane)
+                        sent += 1
+                self.message_received.emit(f"Результат отправлен на сервер")
+                return True
+            except Exception as e:
+                # Отправленные куски не повторяем
+                parts = parts[sent:]
+                log(f"Ошибка при отправке результата: {str(e)}")
+                if self.stop_event.is_set():
+                    self.message_received.emit(f"Ошибка при отправке результата: {str(e)}")
+                    return False
+        
+        if not self.stop_event.is_set():
+            # Соединение разорвано (или очередь потока записи заполнена),
+            # но не закрыто пользователем: отправим позже
+            if all([self.outbound_queue.put(message, opcode, lane) for message, opcode, lane in parts]):
+                self.message_received.emit(
+                    f"Результат поставлен в очередь отправки (в очереди: {len(self.outbound_queue)})"
+                )
+        else:
+            self.message_received.emit("Не удалось отправить результат: нет подключения к серверу")
+        return False
+    
+    def prepare_outgoing(self, data, profile=None):
+        """
+        Кодирует результат в сообщения WebSocket
+        
+        Args:
+            data: Словарь или BinaryMessage
+            profile (RequestProfile): Профиль запроса, вложенный в data
+            
+        Returns:
+            list: Кортежи (message, opcode, lane) в порядке отправки
+        """
+        if not isinstance(data, BinaryMessage):
+            # Сериализуем один раз сразу в байты (типы FreeCAD - через кодировщики)
+            body = profile.serialize(data) if profile is not None else dumps_bytes(data)
+            return [(body, OPCODE_TEXT, LANE_PRIORITY)]
+        
+        meta = profile.serialize(data.meta) if profile is not None and data.meta else None
+        message = encode_binary_message(data, meta)
+        if len(message) <= DEFAULT_CHUNK_SIZE:
+            return [(message, OPCODE_BINARY, LANE_PRIORITY)]
+        if not self.chunked_transfers:
+            # Сервер не собирает куски (нет plm.chunked.v1): сообщение уходит одним
+            # WebSocket-сообщением из фрагментов по max_frame_size. Между фрагментами
+            # проходят только ping/pong; ответы, поставленные позже, по RFC 6455 ждут
+            # конца сообщения - не дожидаются только уже стоящие в очереди раньше него
+            return [(message, OPCODE_BINARY, LANE_BULK)]
+        return [(chunk, OPCODE_BINARY, LANE_BULK) for chunk in split_into_chunks(message)]
+    
+    @staticmethod
+    def format_result(result):
+        """
+        Возвращает результат в виде текста для UI: усеченное представление
+        ограниченного размера (результат не сериализуется целиком, чтобы крупный
+        результат не задерживал главный поток) и сырые данные кратким описанием
+        """
+        json_part, binary, field_name = split_binary_payload(result)
+        if binary is None:
+            return _summarize(result)
+        if field_name is None:
+            return binary.describe()
+        return f"{_summarize(json_part)}, {field_name}: {binary.describe()}"
+    
+    @staticmethod
+    def execution_options(data):
+        """
+        Извлекает из сообщения параметры выполнения скрипта.
+        
+        Args:
+            data (dict): Разобранное сообщение сервера
+            
+        Returns:
+            dict: Параметры для FreeCADExecutor (session_id, timeout)
+        """
+        options = {}
+        if data.get('session_id') is not None:
+            options['session_id'] = str(data['session_id'])
+        # Срок выполнения скрипта в секундах (0 - без ограничения)
+        if isinstance(data.get('timeout'), (int, float)):
+            options['timeout'] = float(data['timeout'])
+        return options
+    
+    def execute_code_in_main_thread(self, code, request_id=None, options=None):
         """
         Выполняет Python-код в главном потоке и отправляет результат на сервер через WebSocket
         
         Args:
             code (str): Python-код для выполнения
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            options (dict): Параметры выполнения (session_id, timeout)
         """
         try:
             # Добавляем отладочное сообщение
@@ -339,122 +816,316 @@ class PLMClientPanel(QtWidgets.QWidget):
             
             self.add_message(f"Выполнение Python-кода...")
             
-            # Создаем функцию отправки результатов через веб-сокет
-            def websocket_sender(data):
-                if self.is_connected and self.send_message:
-                    try:
-                        # Преобразуем данные в JSON
-                        json_data = json.dumps(data)
-                        # Отправляем через веб-сокет
-                        self.send_message(json_data)
-                        self.add_message(f"Результат отправлен на сервер")
-                    except Exception as e:
-                        self.add_message(f"Ошибка при отправке результата: {str(e)}")
-                else:
-                    self.add_message("Не удалось отправить результат: нет подключения к серверу")
-            
             # Настраиваем executor для отправки результатов через веб-сокет
-            self.freecad_executor.websocket_sender = websocket_sender
+            self.freecad_executor.websocket_sender = self.send_result_to_server
             
             # Используем FreeCADExecutor для выполнения кода с отправкой результата
-            result = self.freecad_executor.execute_code(code, send_result=True)
+            result = self.freecad_executor.execute_code(
+                code, send_result=True, request_id=request_id, **(options or {})
+            )
             
-            # Добавляем отладочное сообщение
-            log(f"Результат выполнения: {result}")
-            
-            if result['success']:
-                self.add_message(result['message'])
+            self.show_execution_result(result)
                 
-                # Если есть результат, выводим его
-                if 'result' in result and result['result']:
-                    self.add_message(f"Результат: {json.dumps(result['result'], ensure_ascii=False)}")
-            else:
-                error_msg = f"Ошибка при выполнении Python-кода: {result.get('error', 'Неизвестная ошибка')}"
-                self.add_message(error_msg)
+        except Exception as e:
+            error_msg = f"Ошибка при выполнении Python-кода: {str(e)}\n{traceback.format_exc()}"
+            log(error_msg)
+            self.add_message(error_msg)
+
+    def execute_template_in_main_thread(self, template_id, arguments, request_id=None, options=None):
+        """
+        Выполняет шаблон скрипта в главном потоке и отправляет результат на сервер через WebSocket
+        
+        Args:
+            template_id (str): Идентификатор шаблона
+            arguments (dict): Аргументы шаблона
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            options (dict): Параметры выполнения (session_id, timeout)
+        """
+        try:
+            log(f"Выполнение шаблона {template_id} в главном потоке с аргументами: {arguments}")
+            
+            self.add_message(f"Выполнение шаблона скрипта {template_id}...")
+            
+            # Настраиваем executor для отправки результатов через веб-сокет
+            self.freecad_executor.websocket_sender = self.send_result_to_server
+            
+            result = self.freecad_executor.execute_template(
+                template_id, arguments, send_result=True, request_id=request_id, **(options or {})
+            )
+            self.show_execution_result(result)
                 
-                # Если есть трассировка, выводим её
-                if 'traceback' in result:
-                    self.add_message(f"Трассировка: {result['traceback']}")
+        except Exception as e:
+            error_msg = f"Ошибка при выполнении шаблона {template_id}: {str(e)}\n{traceback.format_exc()}"
+            log(error_msg)
+            self.add_message(error_msg)
+
+    def execute_batch_in_main_thread(self, items, request_id=None, options=None):
+        """
+        Выполняет пакет в главном потоке и отправляет сводный результат на сервер через WebSocket
+        
+        Args:
+            items (list): Элементы пакета (python_code, template_id или function_call)
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            options (dict): Параметры выполнения (session_id, timeout, stop_on_error)
+        """
+        try:
+            log(f"Выполнение пакета из {len(items)} элементов в главном потоке")
+            
+            self.add_message(f"Выполнение пакета из {len(items)} элементов...")
+            
+            # Настраиваем executor для отправки результатов через веб-сокет
+            self.freecad_executor.websocket_sender = self.send_result_to_server
+            
+            result = self.freecad_executor.execute_batch(
+                items, send_result=True, request_id=request_id,
+                call_function=self.function_registry.execute_function, **(options or {})
+            )
+            self.add_message(result['message'])
+            if not result['success']:
+                failed = next((item for item in result['result'] if not item['success']), None)
+                if failed is not None:
+                    self.add_message(f"Ошибка в элементе {failed['index']}: {failed.get('error')}")
                 
         except Exception as e:
-            error_msg = f"Ошибка при выполнении Python-кода: {str(e)}\n{traceback.format_exc()}"
+            error_msg = f"Ошибка при выполнении пакета: {str(e)}\n{traceback.format_exc()}"
             log(error_msg)
             self.add_message(error_msg)
 
-    def execute_function_in_main_thread(self, function_name, function_args):
+    def show_execution_result(self, result):
+        """
+        Выводит в UI результат выполнения скрипта
+        
+        Args:
+            result (dict): Результат FreeCADExecutor
+        """
+        # Добавляем отладочное сообщение
+        log(f"Результат выполнения: {self.format_result(result)}")
+        
+        if result['success']:
+            self.add_message(result['message'])
+            
+            # Если есть результат, выводим его
+            if 'result' in result and result['result']:
+                self.add_message(f"Результат: {self.format_result(result['result'])}")
+        else:
+            error_msg = f"Ошибка при выполнении Python-кода: {result.get('error', 'Неизвестная ошибка')}"
+            self.add_message(error_msg)
+            
+            # Если есть трассировка, выводим её
+            if 'traceback' in result:
+                self.add_message(f"Трассировка: {result['traceback']}")
+
+    def execute_function_in_main_thread(self, function_name, function_args, request_id=None, profile=None):
         """
         Выполняет вызов функции в главном потоке и отправляет результат на сервер
         
         Args:
             function_name (str): Имя функции для вызова
             function_args (dict): Аргументы функции
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            profile (RequestProfile): Профиль запроса, если сервер его запросил
+        """
+        log(f"Выполнение функции в главном потоке: {function_name} с аргументами: {function_args}")
+        self.execute_function_call(function_name, function_args, request_id, profile)
+
+    def execute_function_call(self, function_name, function_args, request_id=None, profile=None):
+        """
+        Выполняет функцию из реестра и отправляет ответ с request_id на сервер.
+        Вызывается из главного потока или, для функций AFFINITY_ANY и AFFINITY_WORKER,
+        из потока прослушивания, поэтому UI обновляется только через сигнал message_received.
+        Функция AFFINITY_WORKER ставится в пул рабочих потоков и возвращает Future.
+        
+        Args:
+            function_name (str): Имя функции для вызова
+            function_args (dict): Аргументы функции
+            request_id: Идентификатор запроса
+            profile (RequestProfile): Профиль запроса; разбивка времени добавляется в ответ
         """
+        if profile is not None:
+            profile.mark_started()
         try:
-            # Добавляем отладочное сообщение
-            log(f"Выполнение функции в главном потоке: {function_name} с аргументами: {function_args}")
-            
-            self.add_message(f"Выполнение функции: {function_name}...")
-            
-            # Создаем функцию отправки результатов через веб-сокет (аналогично execute_code_in_main_thread)
-            def websocket_sender(data):
-                if self.is_connected and self.send_message:
-                    try:
-                        # Преобразуем данные в JSON
-                        json_data = json.dumps(data)
-                        # Отправляем через веб-сокет
-                        self.send_message(json_data)
-                        self.add_message(f"Результат отправлен на сервер")
-                    except Exception as e:
-                        self.add_message(f"Ошибка при отправке результата: {str(e)}")
-                else:
-                    self.add_message("Не удалось отправить результат: нет подключения к серверу")
+            self.message_received.emit(f"Выполнение функции: {function_name}...")
             
             # Передаем функцию отправки в реестр функций
-            self.function_registry.websocket_sender = websocket_sender
+            self.function_registry.websocket_sender = self.send_result_to_server
             
             # Вызываем функцию из реестра и получаем результат
-            result = self.function_registry.execute_function(function_name, function_args)
+            if profile is None:
+                result = self.function_registry.submit_function(function_name, function_args)
+            elif self.function_registry.get_affinity(function_name) == AFFINITY_WORKER:
+                # Профилируется выполнение в рабочем потоке, а не постановка в пул
+                result = self.function_registry.submit_function(
+                    function_name, function_args, context=profile.execution
+                )
+            else:
+                with profile.execution():
+                    result = self.function_registry.execute_function(function_name, function_args)
+            
+            # Функция выполняется в фоне (пул потоков или процессов): ответ отправится по готовности
+            if isinstance(result, concurrent.futures.Future):
+                self.message_received.emit(f"Функция {function_name} выполняется в фоне")
+                result.add_done_callback(
+                    lambda future: self.send_future_response(function_name, future, request_id, profile)
+                )
+                return
             
             # Добавляем отладочное сообщение
-            log(f"Результат выполнения функции: {result}")
+            log(f"Результат выполнения функции: {self.format_result(result)}")
             
-            # Отправляем результат на сервер
-            if self.is_connected and self.send_message:
-                try:
-                    response_data = {
-                        "function_response": function_name,
-                        "result": result
-                    }
-                    json_response = json.dumps(response_data)
-                    self.send_message(json_response)
-                    self.add_message(f"Результат функции {function_name} отправлен на сервер")
-                except Exception as e:
-                    error_msg = f"Ошибка при отправке результата функции: {str(e)}"
-                    log(error_msg)
-                    self.add_message(error_msg)
+            # Отправляем результат на сервер (сырые данные - бинарным сообщением)
+            response_data = self.function_registry.build_response(
+                function_name, result, request_id, profile=profile
+            )
+            if self.send_result_to_server(response_data, profile):
+                self.message_received.emit(f"Результат функции {function_name} отправлен на сервер")
             
             # Выводим информацию о выполнении в UI
-            self.add_message(f"Функция {function_name} выполнена успешно")
+            self.message_received.emit(f"Функция {function_name} выполнена успешно")
             if result:
-                self.add_message(f"Результат: {json.dumps(result, ensure_ascii=False)}")
+                self.message_received.emit(f"Результат: {self.format_result(result)}")
                 
         except Exception as e:
             error_msg = f"Ошибка при выполнении функции {function_name}: {str(e)}\n{traceback.format_exc()}"
             log(error_msg)
-            self.add_message(error_msg)
+            self.message_received.emit(error_msg)
             
             # Отправляем информацию об ошибке на сервер
-            if self.is_connected and self.send_message:
-                try:
-                    error_data = {
-                        "function_response": function_name,
-                        "error": str(e),
-                        "traceback": traceback.format_exc()
-                    }
-                    json_error = json.dumps(error_data)
-                    self.send_message(json_error)
-                except Exception as send_error:
-                    self.add_message(f"Ошибка при отправке информации об ошибке: {str(send_error)}")
+            self.send_result_to_server(
+                self.function_registry.build_response(
+                    function_name, request_id=request_id, error=e, profile=profile
+                ),
+                profile
+            )
+
+    def send_future_response(self, function_name, future, request_id=None, profile=None):
+        """
+        Отправляет ответ на вызов функции, результат которой был отложен (Future).
+        Вызывается из потока, завершившего Future.
+        
+        Args:
+            function_name (str): Имя функции
+            future (Future): Завершенный результат функции
+            request_id: Идентификатор запроса
+            profile (RequestProfile): Профиль запроса, если сервер его запросил
+        """
+        error = future.exception()
+        if error is not None:
+            log(f"Ошибка при выполнении функции {function_name}: {str(error)}")
+            self.message_received.emit(f"Ошибка при выполнении функции {function_name}: {str(error)}")
+            response_data = self.function_registry.build_response(
+                function_name, request_id=request_id, error=error, profile=profile
+            )
+        else:
+            result = future.result()
+            self.message_received.emit(f"Функция {function_name} выполнена успешно")
+            if result:
+                self.message_received.emit(f"Результат: {self.format_result(result)}")
+            response_data = self.function_registry.build_response(
+                function_name, result, request_id, profile=profile
+            )
+        self.send_result_to_server(response_data, profile)
+
+    def execute_function_calls_in_main_thread(self, calls, request_id=None, options=None):
+        """
+        Выполняет пакет вызовов функций в главном потоке и отправляет один ответ на сервер
+        
+        Args:
+            calls (list): Вызовы в формате сообщений
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            options (dict): Параметры пакета (stop_on_error, profile)
+        """
+        log(f"Выполнение пакета из {len(calls)} вызовов функций в главном потоке")
+        self.execute_function_calls(calls, request_id, options)
+
+    def execute_function_calls(self, calls, request_id=None, options=None):
+        """
+        Выполняет пакет вызовов функций из реестра и отправляет один ответ с request_id.
+        Функции, вернувшие Future (пул процессов), не задерживают следующие вызовы:
+        ответ отправляется, когда готовы все отложенные результаты.
+        
+        Args:
+            calls (list): Вызовы в формате сообщений
+            request_id: Идентификатор запроса
+            options (dict): Параметры пакета (stop_on_error, profile)
+        """
+        options = options or {}
+        profile = options.get('profile')
+        if profile is not None:
+            profile.mark_started()
+        try:
+            self.message_received.emit(f"Выполнение пакета из {len(calls)} вызовов функций...")
+            self.function_registry.websocket_sender = self.send_result_to_server
+            
+            if profile is None:
+                batch = self.function_registry.execute_batch(calls, options.get('stop_on_error', True))
+            else:
+                with profile.execution():
+                    batch = self.function_registry.execute_batch(calls, options.get('stop_on_error', True))
+            
+            futures = [
+                call_result['result'] for call_result in batch['results']
+                if isinstance(call_result.get('result'), concurrent.futures.Future)
+            ]
+            if not futures:
+                self.send_function_calls_response(batch, request_id, profile)
+                return
+            
+            self.message_received.emit(f"Пакет ожидает {len(futures)} фоновых вызовов")
+            remaining = [len(futures)]
+            lock = threading.Lock()
+            
+            def on_done(_):
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self.send_function_calls_response(batch, request_id, profile)
+            
+            for future in futures:
+                future.add_done_callback(on_done)
+                
+        except Exception as e:
+            error_msg = f"Ошибка при выполнении пакета вызовов функций: {str(e)}\n{traceback.format_exc()}"
+            log(error_msg)
+            self.message_received.emit(error_msg)
+            response_data = {"function_calls_response": [], "error": str(e)}
+            if request_id is not None:
+                response_data["request_id"] = request_id
+            self.send_result_to_server(response_data)
+
+    def send_function_calls_response(self, batch, request_id=None, profile=None):
+        """
+        Подставляет в пакет результаты завершенных Future и отправляет ответ на сервер
+        
+        Args:
+            batch (dict): Результаты FunctionRegistry.execute_batch
+            request_id: Идентификатор запроса
+            profile (RequestProfile): Профиль запроса, если сервер его запросил
+        """
+        for call_result in batch['results']:
+            future = call_result.get('result')
+            if not isinstance(future, concurrent.futures.Future):
+                continue
+            error = future.exception()
+            if error is None:
+                call_result['result'] = future.result()
+            else:
+                del call_result['result']
+                call_result['success'] = False
+                call_result['error'] = str(error)
+                call_result['traceback'] = "".join(
+                    traceback.format_exception(type(error), error, error.__traceback__)
+                )
+        batch['failed'] = sum(1 for call_result in batch['results'] if not call_result['success'])
+        batch['completed'] = len(batch['results']) - batch['failed']
+        
+        response_data = self.function_registry.build_batch_response(batch, request_id, profile)
+        
+        self.message_received.emit(
+            f"Пакет вызовов функций выполнен: {batch['completed']} успешно, "
+            f"{batch['failed']} с ошибкой, {batch['skipped']} пропущено"
+        )
+        self.send_result_to_server(response_data, profile)
 
     def set_plm_functions(self, plm_functions: PLMFunctions):
         """
@@ -0,0 +1,217 @@
+"""
+Именованные сессии выполнения скриптов FreeCAD.
+
+Сессия хранит пространство имен между вызовами execute_code, поэтому клиенту
+достаточно один раз отправить вспомогательные функции, поиск объектов
+документа и константы, а затем присылать только очередные шаги.
+"""
+
+import sys
+import threading
+import time
+import uuid
+from types import FunctionType, ModuleType
+from typing import Any, Dict, List, Optional
+
+from utils.logger import log
+
+# Максимальное количество одновременно открытых сессий
+DEFAULT_MAX_SESSIONS = 32
+# Сессия, к которой не обращались дольше этого времени (в секундах), закрывается
+DEFAULT_SESSION_IDLE_TIMEOUT = 30 * 60
+# Максимальный оценочный объем данных сессии в байтах
+DEFAULT_SESSION_MAX_BYTES = 256 * 1024 * 1024
+
+# Глубина обхода вложенных контейнеров и количество элементов, по которым
+# оценивается размер длинного контейнера
+_SIZE_DEPTH = 4
+_SIZE_SAMPLE = 100
+
+
+class SessionError(Exception):
+    """Ошибка работы с сессией (сессия не найдена, превышены ограничения)"""
+
+
+def estimate_size(value, depth: int = _SIZE_DEPTH) -> int:
+    """
+    Приблизительно оценивает объем памяти, занимаемый значением.
+
+    Модули, функции и классы считаются по собственному размеру без содержимого.
+    Размер длинных контейнеров экстраполируется по первым элементам, чтобы оценка
+    не стоила дороже самого скрипта.
+
+    Args:
+        value: Оцениваемое значение
+        depth: Глубина обхода вложенных контейнеров
+
+    Returns:
+        int: Оценка размера в байтах
+    """
+    size = sys.getsizeof(value, 0)
+    if depth <= 0 or isinstance(value, (str, bytes, bytearray, ModuleType, FunctionType, type)):
+        return size
+
+    if isinstance(value, dict):
+        items = value.items()
+        count = len(value)
+        sample = [item for _, item in zip(range(_SIZE_SAMPLE), items)]
+        sampled = sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1) for k, v in sample)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        sample = [item for _, item in zip(range(_SIZE_SAMPLE), value)]
+        sampled = sum(estimate_size(item, depth - 1) for item in sample)
+    else:
+        return size
+
+    if not sample:
+        return size
+    return size + sampled * count // len(sample)
+
+
+class ExecutionSession:
+    """Пространство имен, сохраняемое между вызовами"""
+
+    def __init__(self, session_id: str, namespace: Dict[str, Any]):
+        self.session_id = session_id
+        self.namespace = namespace
+        # Имена базового пространства имен не учитываются в объеме сессии
+        self._base_names = {name: id(value) for name, value in namespace.items()}
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.calls = 0
+        # Блокировка на время выполнения скрипта в сессии
+        self.lock = threading.RLock()
+
+    def estimate_size(self) -> int:
+        """Оценивает объем данных, добавленных скриптами"""
+        return sum(
+            estimate_size(value)
+            for name, value in self.namespace.items()
+            if self._base_names.get(name) != id(value) and name != '__builtins__'
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        """Краткое описание сессии для клиента"""
+        return {
+            'session_id': self.session_id,
+            'calls': self.calls,
+            'idle_seconds': round(time.monotonic() - self.last_used, 1),
+            'variables': sorted(
+                name for name, value in self.namespace.items()
+                if self._base_names.get(name) != id(value) and not name.startswith('__')
+            ),
+        }
+
+
+class SessionManager:
+    """
+    Реестр сессий выполнения.
+
+    Сессии создаются и закрываются явно; кроме того, закрываются сессии,
+    простаивающие дольше idle_timeout, а при превышении max_sessions -
+    дольше всех не использовавшиеся. Потокобезопасен.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 idle_timeout: float = DEFAULT_SESSION_IDLE_TIMEOUT,
+                 max_bytes: int = DEFAULT_SESSION_MAX_BYTES):
+        """
+        Args:
+            max_sessions: Максимальное количество сессий
+            idle_timeout: Время простоя в секундах, после которого сессия закрывается
+            max_bytes: Максимальный оценочный объем данных одной сессии
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+        self._sessions: Dict[str, ExecutionSession] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, namespace: Dict[str, Any], session_id: Optional[str] = None) -> ExecutionSession:
+        """
+        Создает сессию.
+
+        Args:
+            namespace: Начальное пространство имен (копия базового)
+            session_id: Идентификатор; по умолчанию генерируется случайный
+
+        Returns:
+            ExecutionSession: Новая сессия
+
+        Raises:
+            SessionError: Если сессия с таким идентификатором уже существует
+        """
+        session_id = session_id or uuid.uuid4().hex
+        namespace.setdefault('__name__', f'plm_session_{session_id}')
+        with self._lock:
+            self._evict_idle()
+            if session_id in self._sessions:
+                raise SessionError(f"Сессия {session_id} уже существует")
+            while len(self._sessions) >= self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda session: session.last_used)
+                del self._sessions[oldest.session_id]
+                log(f"Сессия {oldest.session_id} закрыта: превышено количество сессий")
+            session = self._sessions[session_id] = ExecutionSession(session_id, namespace)
+        log(f"Создана сессия выполнения {session_id}")
+        return session
+
+    def get(self, session_id: str) -> ExecutionSession:
+        """
+        Возвращает сессию и отмечает обращение к ней.
+
+        Raises:
+            SessionError: Если сессия не найдена (в том числе закрыта по простою)
+        """
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionError(f"Сессия {session_id} не найдена")
+            session.last_used = time.monotonic()
+            return session
+
+    def destroy(self, session_id: str) -> bool:
+        """
+        Закрывает сессию.
+
+        Returns:
+            bool: Существовала ли сессия
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            log(f"Сессия выполнения {session_id} закрыта")
+        return session is not None
+
+    def check_memory(self, session: ExecutionSession) -> Optional[int]:
+        """
+        Проверяет объем данных сессии и закрывает ее при превышении max_bytes.
+
+        Returns:
+            int или None: Оценка объема, если сессия закрыта из-за превышения
+        """
+        size = session.estimate_size()
+        if size <= self.max_bytes:
+            return None
+        self.destroy(session.session_id)
+        log(f"Сессия {session.session_id} закрыта: объем данных {size} байт превышает {self.max_bytes}")
+        return size
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Возвращает описания открытых сессий"""
+        with self._lock:
+            self._evict_idle()
+            sessions = list(self._sessions.values())
+        return [session.describe() for session in sessions]
+
+    def _evict_idle(self) -> None:
+        """Закрывает простаивающие сессии (вызывается под блокировкой)"""
+        if not self.idle_timeout:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        for session_id in [sid for sid, session in self._sessions.items() if session.last_used < deadline]:
+            del self._sessions[session_id]
+            log(f"Сессия {session_id} закрыта по простою")
@@ -0,0 +1,275 @@
+"""
+Ограничение времени выполнения скриптов и их отмена.
+
+Скрипты выполняются в главном потоке Qt, поэтому бесконечный цикл в скрипте
+замораживает FreeCAD и все запросы, стоящие за ним в очереди. Сторожевой поток
+следит за сроками выполняемых скриптов и прерывает просроченные (или отмененные
+по запросу сервера) асинхронным исключением в потоке скрипта.
+
+Асинхронное исключение срабатывает между инструкциями байткода Python, поэтому
+долгий вызов C++ (например, булева операция Part) прерывается только после возврата
+из него. Исключения наследуются от BaseException, чтобы их не перехватывал
+обычный "except Exception" внутри скрипта; если скрипт все же перехватил
+прерывание, оно повторяется каждые INTERRUPT_REPEAT_INTERVAL секунд.
+
+Еще не сработавшее прерывание нельзя снять вызовом PyThreadState_SetAsyncExc
+с NULL: в CPython 3.11 флаг асинхронного исключения интерпретатора при этом
+остается взведенным, и под профилировщиком любой следующий вызов функции
+зацикливается на первой строке. Поэтому отложенное прерывание заменяется
+служебным исключением, которое сразу перехватывается (_discard_pending_interrupt).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from utils.logger import log
+
+try:
+    import ctypes
+    _PyThreadState_SetAsyncExc = ctypes.pythonapi.PyThreadState_SetAsyncExc
+except (ImportError, AttributeError):  # pragma: no cover - не CPython
+    _PyThreadState_SetAsyncExc = None
+
+
+def _set_async_exc(thread_id: int, exc_type) -> None:
+    """Поднимает исключение exc_type в потоке thread_id (None - снимает отложенное)"""
+    _PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id),
+        ctypes.py_object(exc_type) if exc_type is not None else None
+    )
+
+# Срок выполнения скрипта по умолчанию в секундах (0 или None - без ограничения).
+# Длительные операции (пересчет крупных сборок) законны, поэтому по умолчанию
+# срок не ограничен: он задается в запросе, а отмена доступна всегда
+DEFAULT_SCRIPT_TIMEOUT = None
+# Интервал повторного прерывания скрипта, перехватившего исключение
+INTERRUPT_REPEAT_INTERVAL = 0.5
+
+INTERRUPT_TIMEOUT = 'timeout'
+INTERRUPT_CANCELLED = 'cancelled'
+
+
+class ScriptInterrupted(BaseException):
+    """Выполнение скрипта прервано сторожевым потоком"""
+    reason = None
+
+
+class ScriptTimeout(ScriptInterrupted):
+    """Скрипт не уложился в отведенное время"""
+    reason = INTERRUPT_TIMEOUT
+
+
+class ScriptCancelled(ScriptInterrupted):
+    """Выполнение скрипта отменено по запросу"""
+    reason = INTERRUPT_CANCELLED
+
+
+class _InterruptDiscarded(ScriptInterrupted):
+    """Служебное исключение, замещающее отложенное прерывание завершенного скрипта"""
+
+
+_INTERRUPTS = {
+    INTERRUPT_TIMEOUT: ScriptTimeout,
+    INTERRUPT_CANCELLED: ScriptCancelled,
+}
+
+
+def _discard_pending_interrupt() -> None:
+    """
+    Снимает отложенное прерывание текущего потока.
+
+    Отложенное исключение заменяется служебным, которое срабатывает при первой
+    же проверке интерпретатора и перехватывается здесь; после его доставки
+    флаг асинхронного исключения сбрасывается. Если раньше успело сработать
+    само прерывание, оно тоже перехватывается.
+    """
+    try:
+        _set_async_exc(threading.get_ident(), _InterruptDiscarded)
+        while True:
+            pass
+    except ScriptInterrupted:
+        pass
+
+
+class GuardedExecution:
+    """Состояние одного выполняемого скрипта"""
+
+    def __init__(self, thread_id: int, timeout: Optional[float], request_id: Any = None):
+        self.thread_id = thread_id
+        self.request_id = request_id
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        # Причина прерывания (INTERRUPT_*) или None
+        self.interrupted = None
+        # Последнее отправленное прерывание сработало (и больше не ожидает доставки)
+        self.delivered = False
+        # Скрипт остановлен прерыванием (а не завершился до его доставки)
+        self.stopped = False
+        self.finished = False
+        self.elapsed = 0.0
+        self._last_signal = None
+        self._lock = threading.Lock()
+
+    def next_wakeup(self) -> Optional[float]:
+        """Момент, когда сторожевому потоку нужно проверить выполнение"""
+        if self.interrupted is not None:
+            return self._last_signal + INTERRUPT_REPEAT_INTERVAL
+        return self.deadline
+
+    def interrupt(self, reason: str) -> bool:
+        """
+        Прерывает скрипт асинхронным исключением в его потоке.
+
+        Returns:
+            bool: Было ли отправлено исключение (False, если скрипт уже завершен)
+        """
+        with self._lock:
+            if self.finished or _PyThreadState_SetAsyncExc is None:
+                return False
+            if self.interrupted is None:
+                self.interrupted = reason
+            self._last_signal = time.monotonic()
+            self.delivered = False
+            _set_async_exc(self.thread_id, _INTERRUPTS[self.interrupted])
+            return True
+
+    def finish(self) -> None:
+        """
+        Отмечает завершение скрипта и снимает еще не сработавшее прерывание.
+        Вызывается в потоке скрипта сразу после выполнения тела: прерывания
+        после этого не отправляются, а отправленное ранее не сработает.
+        """
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            self.elapsed = time.monotonic() - self.started
+            pending = self.interrupted is not None and not self.delivered
+        if pending:
+            _discard_pending_interrupt()
+
+    def report(self) -> Dict[str, Any]:
+        """Поля результата с временем выполнения и причиной прерывания"""
+        report = {'elapsed_ms': round(self.elapsed * 1000, 3)}
+        if self.stopped:
+            report['interrupted'] = self.interrupted
+        return report
+
+
+class ExecutionWatchdog:
+    """
+    Сторожевой поток для выполняемых скриптов.
+
+    Один поток на все выполнения: спит до ближайшего срока и прерывает
+    просроченные скрипты. Поток запускается при первом выполнении.
+    """
+
+    def __init__(self):
+        self._active: Dict[int, GuardedExecution] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @contextmanager
+    def guard(self, timeout: Optional[float], request_id: Any = None):
+        """
+        Контекст выполнения скрипта с ограничением времени.
+
+        Прерывание поднимает ScriptTimeout или ScriptCancelled внутри контекста;
+        обработать его должен вызывающий код. Сразу после тела скрипта внутри
+        контекста нужно вызвать execution.finish(): иначе прерывание, пришедшее
+        между завершением скрипта и выходом из контекста, сделало бы успешно
+        выполненный скрипт прерванным.
+
+        Args:
+            timeout: Срок выполнения в секундах (0 или None - без ограничения, только отмена)
+            request_id: Идентификатор запроса для отмены через cancel
+
+        Yields:
+            GuardedExecution: Состояние выполнения
+        """
+        execution = GuardedExecution(threading.get_ident(), timeout, request_id)
+        with self._cond:
+            self._active[id(execution)] = execution
+            if execution.deadline is not None and _PyThreadState_SetAsyncExc is not None:
+                self._ensure_thread()
+                self._cond.notify()
+        try:
+            yield execution
+        except ScriptInterrupted:
+            # Прерывание сработало и больше не ожидает доставки
+            execution.delivered = execution.stopped = True
+            raise
+        finally:
+            # Прерывание может сработать и здесь, пока выполнение не отмечено завершенным
+            while True:
+                try:
+                    execution.finish()
+                    break
+                except ScriptInterrupted:
+                    # Скрипт уже выполнен: прерывание не делает его прерванным
+                    execution.delivered = True
+            with self._cond:
+                self._active.pop(id(execution), None)
+
+    def cancel(self, request_id: Any) -> bool:
+        """
+        Отменяет выполняемый скрипт по идентификатору запроса.
+
+        Returns:
+            bool: Найден ли выполняемый скрипт с этим идентификатором
+        """
+        with self._cond:
+            executions = [e for e in self._active.values() if e.request_id == request_id]
+            found = False
+            for execution in executions:
+                found = execution.interrupt(INTERRUPT_CANCELLED) or found
+            if found:
+                self._ensure_thread()
+                self._cond.notify()
+        if found:
+            log(f"Выполнение запроса {request_id} отменено")
+        return found
+
+    def active(self) -> list:
+        """Возвращает описания выполняемых скриптов"""
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    'request_id': e.request_id,
+                    'running_ms': round((now - e.started) * 1000, 3),
+                    'timeout': e.timeout,
+                    'interrupted': e.interrupted,
+                }
+                for e in self._active.values()
+            ]
+
+    def _ensure_thread(self) -> None:
+        """Запускает сторожевой поток (вызывается под self._cond)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="plm-script-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Цикл сторожевого потока"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wakeups = []
+                for execution in list(self._active.values()):
+                    wakeup = execution.next_wakeup()
+                    if wakeup is None or execution.finished:
+                        continue
+                    if wakeup <= now:
+                        first = execution.interrupted is None
+                        if execution.interrupt(INTERRUPT_TIMEOUT) and first:
+                            log(f"Скрипт (запрос {execution.request_id}) прерван: превышено время "
+                                f"выполнения {execution.timeout} с")
+                        wakeup = execution.next_wakeup()
+                        if execution.finished:
+                            continue
+                    wakeups.append(wakeup)
+                self._cond.wait(max(0.0, min(wakeups) - now) if wakeups else None)
@@ -6,10 +6,251 @@
 import traceback
 import sys
 import os
+import concurrent.futures
+import hashlib
 import importlib
-import json
-from typing import Dict, Any, Callable
+import threading
+import time
+import types
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Any, Callable, List, Optional
 from utils.logger import log
+from binary_messages import BinaryPayload, build_result_message, MESSAGE_TYPE_EXECUTION_RESULT
+from execution_sessions import SessionManager, SessionError
+from execution_watchdog import ExecutionWatchdog, ScriptInterrupted, DEFAULT_SCRIPT_TIMEOUT, INTERRUPT_CANCELLED
+from request_profiler import RequestProfile
+
+# Количество скомпилированных скриптов, хранимых в кэше
+DEFAULT_CODE_CACHE_SIZE = 256
+
+# Встроенные шаблоны скриптов: вызывающая сторона передает идентификатор шаблона
+# и аргументы, которые доступны в скрипте как переменные (и целиком как args)
+BUILTIN_TEMPLATES = {
+    'compare_objects': """
+import FreeCAD as App
+from utils.cad_utils import CADUtils
+
+try:
+    if not App.ActiveDocument:
+        raise Exception("Нет активного документа. Перед сравнением объектов нужно создать или открыть документ.")
+    identical = CADUtils.object_are_identical(obj1_name, obj2_name, tolerance)
+    result = {"success": True, "identical": identical}
+except Exception as e:
+    import traceback
+    result = {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+""",
+}
+
+
+# Модули FreeCAD, доступные скриптам без импорта
+NAMESPACE_MODULES = ['Part', 'Mesh', 'Sketcher', 'PartDesign']
+# Модули, которые можно импортировать только в главном потоке (Draft создает
+# виджеты Qt при импорте): в пространстве имен они загружаются при первом обращении
+LAZY_NAMESPACE_MODULES = ['Draft']
+
+# Базовое пространство имен скриптов: собирается один раз на процесс,
+# каждый вызов получает его поверхностную копию
+_base_namespace = None
+_base_namespace_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Модуль, импортируемый при первом обращении к его атрибутам (в потоке скрипта)"""
+
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        return getattr(module, name)
+
+
+def build_base_namespace() -> Dict[str, Any]:
+    """
+    Возвращает базовое пространство имен для выполнения скриптов, собирая его
+    при первом вызове (импорт модулей FreeCAD занимает секунды). Draft
+    (LAZY_NAMESPACE_MODULES) импортируется при первом обращении скрипта к нему.
+    
+    Returns:
+        dict: Пространство имен; изменять его нельзя, для вызова нужна копия
+        
+    Raises:
+        ImportError: Если FreeCAD недоступен
+    """
+    global _base_namespace
+    if _base_namespace is not None:
+        return _base_namespace
+    
+    with _base_namespace_lock:
+        if _base_namespace is not None:
+            return _base_namespace
+        
+        start = time.perf_counter()
+        import FreeCAD
+        import FreeCADGui
+        
+        namespace = {
+            'FreeCAD': FreeCAD,
+            'Gui': FreeCADGui,
+            'App': FreeCAD,  # Алиас для совместимости
+            # Результат в виде BinaryPayload отправляется бинарным фреймом
+            'BinaryPayload': BinaryPayload,
+        }
+        
+        # Пытаемся импортировать другие модули FreeCAD
+        for module_name in NAMESPACE_MODULES:
+            try:
+                namespace[module_name] = importlib.import_module(module_name)
+            except ImportError:
+                pass
+        for module_name in LAZY_NAMESPACE_MODULES:
+            namespace[module_name] = _LazyModule(module_name)
+                
+        # Добавляем утилиты CAD, если они доступны
+        try:
+            from utils.cad_utils import CADUtils, Coordinates, PartCreationDTO
+            namespace['CADUtils'] = CADUtils
+            namespace['Coordinates'] = Coordinates
+            namespace['PartCreationDTO'] = PartCreationDTO
+        except ImportError as e:
+            log(f"Предупреждение: Не удалось импортировать CADUtils: {str(e)}")
+        
+        _base_namespace = namespace
+        log(f"Пространство имен для выполнения скриптов подготовлено за {time.perf_counter() - start:.2f} с")
+        return _base_namespace
+
+
+def prewarm_namespace() -> threading.Thread:
+    """
+    Заранее собирает базовое пространство имен в фоновом потоке, чтобы первый
+    скрипт не ждал импорта модулей FreeCAD, а главный поток не замирал после
+    активации верстака. Модули, требующие главного потока (Draft), остаются
+    отложенными.
+    
+    Returns:
+        threading.Thread: Запущенный поток подготовки
+    """
+    def prewarm():
+        try:
+            build_base_namespace()
+        except Exception as e:
+            log(f"Не удалось заранее подготовить пространство имен: {str(e)}")
+    
+    thread = threading.Thread(target=prewarm, name="plm-namespace-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+@contextmanager
+def batch_transaction(name: str):
+    """
+    Выполняет блок в одной транзакции активного документа с отложенным пересчетом:
+    вызовы recompute() внутри блока ничего не делают, документ пересчитывается
+    один раз в конце, а все изменения отменяются одним шагом Undo.
+    
+    Args:
+        name: Имя транзакции (отображается в истории Undo)
+        
+    Yields:
+        dict: Статистика, заполняемая при выходе (recompute_ms)
+    """
+    import FreeCAD
+    
+    stats = {}
+    doc = FreeCAD.ActiveDocument
+    if doc is None:
+        yield stats
+        return
+    
+    # RecomputesFrozen есть начиная с FreeCAD 0.19
+    frozen = getattr(doc, 'RecomputesFrozen', None)
+    doc.openTransaction(name)
+    if frozen is not None:
+        doc.RecomputesFrozen = True
+    try:
+        yield stats
+    finally:
+        if frozen is not None:
+            doc.RecomputesFrozen = frozen
+        start = time.perf_counter()
+        try:
+            doc.recompute()
+        except Exception as e:
+            log(f"Ошибка при пересчете документа после пакета: {str(e)}")
+        stats['recompute_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        doc.commitTransaction()
+
+
+class CompiledCodeCache:
+    """
+    LRU-кэш скомпилированных скриптов.
+
+    Ключ - хэш исходного текста, поэтому повторная отправка одного и того же
+    скрипта не требует повторной компиляции. Потокобезопасен.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CODE_CACHE_SIZE):
+        """
+        Args:
+            max_size: Максимальное количество скомпилированных скриптов
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(code: str) -> str:
+        """Возвращает ключ кэша для исходного текста"""
+        return hashlib.blake2b(code.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, code: str, filename: str = '<freecad-script>'):
+        """
+        Возвращает скомпилированный скрипт, компилируя его при промахе.
+
+        Args:
+            code: Исходный текст скрипта
+            filename: Имя файла для трассировок
+
+        Returns:
+            code: Объект кода для exec
+
+        Raises:
+            SyntaxError: Если скрипт содержит синтаксическую ошибку
+        """
+        key = (self.key(code), filename)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        compiled = compile(code, filename, 'exec')
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер кэша и счетчики попаданий и промахов"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        """Очищает кэш и сбрасывает счетчики"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
 
 
 class FreeCADExecutor:
@@ -25,11 +266,22 @@ class FreeCADExecutor:
         Args:
             logger_callback: Функция обратного вызова для логирования сообщений
             websocket_sender: Функция для отправки сообщений через веб-сокет
+                (вторым аргументом передается профиль запроса, если он есть)
         """
         
         self.websocket_sender = websocket_sender
         # Откладываем настройку окружения до первого использования
         self.freecad_available = None
+        # Скомпилированные скрипты и шаблоны
+        self.code_cache = CompiledCodeCache()
+        # Шаблоны скриптов по идентификатору
+        self._templates = dict(BUILTIN_TEMPLATES)
+        # Именованные сессии: пространство имен сохраняется между вызовами
+        self.sessions = SessionManager()
+        # Ограничение времени выполнения скриптов и их отмена; срок задается
+        # запросом, default_timeout (None - без ограничения) - если он не задан
+        self.watchdog = ExecutionWatchdog()
+        self.default_timeout: Optional[float] = DEFAULT_SCRIPT_TIMEOUT
         
     def _setup_environment(self) -> None:
         """Настраивает окружение для выполнения кода FreeCAD"""
@@ -63,13 +315,89 @@ class FreeCADExecutor:
             
             log(f"Ошибка при настройке путей: {str(e)}")
     
-    def execute_code(self, code: str, send_result: bool = True) -> Dict[str, Any]:
+    def register_template(self, template_id: str, source: str) -> None:
+        """
+        Регистрирует шаблон скрипта. Шаблон компилируется при первом вызове
+        и затем берется из кэша.
+        
+        Args:
+            template_id: Идентификатор шаблона
+            source: Текст скрипта; аргументы вызова доступны в нем как переменные
+            
+        Raises:
+            SyntaxError: Если шаблон содержит синтаксическую ошибку
+        """
+        self.code_cache.get(source, f'<template:{template_id}>')
+        self._templates[template_id] = source
+        log(f"Шаблон скрипта {template_id} зарегистрирован")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Возвращает статистику кэша скомпилированных скриптов и список шаблонов"""
+        stats = self.code_cache.stats()
+        stats['templates'] = sorted(self._templates)
+        return stats
+    
+    def create_session(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Создает именованную сессию выполнения. Переменные, функции и импорты,
+        определенные скриптом в сессии, доступны следующим скриптам этой сессии.
+        
+        Args:
+            session_id: Идентификатор сессии; по умолчанию генерируется случайный
+            
+        Returns:
+            dict: Описание созданной сессии
+            
+        Raises:
+            SessionError: Если сессия с таким идентификатором уже существует
+        """
+        session = self.sessions.create(dict(build_base_namespace()), session_id)
+        return session.describe()
+    
+    def destroy_session(self, session_id: str) -> bool:
+        """
+        Закрывает сессию и освобождает ее пространство имен.
+        
+        Returns:
+            bool: Существовала ли сессия
+        """
+        return self.sessions.destroy(session_id)
+    
+    def list_sessions(self) -> list:
+        """Возвращает описания открытых сессий"""
+        return self.sessions.list()
+    
+    def cancel_execution(self, request_id: Any) -> bool:
+        """
+        Прерывает выполняемый скрипт. Вызывается из другого потока, пока
+        главный поток занят скриптом.
+        
+        Args:
+            request_id: Идентификатор запроса, с которым запущен скрипт
+            
+        Returns:
+            bool: Найден ли выполняемый скрипт
+        """
+        return self.watchdog.cancel(request_id)
+    
+    def list_executions(self) -> list:
+        """Возвращает выполняемые сейчас скрипты с временем выполнения"""
+        return self.watchdog.active()
+    
+    def execute_code(self, code: str, send_result: bool = True, request_id: Any = None,
+                     session_id: Optional[str] = None, timeout: Optional[float] = None,
+                     profile: Optional[RequestProfile] = None) -> Dict[str, Any]:
         """
         Выполняет Python-код в интерпретаторе FreeCAD.
         
         Args:
             code: Python-код для выполнения
             send_result: Отправлять ли результат через веб-сокет
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            session_id: Сессия, в пространстве имен которой выполняется код
+            timeout: Срок выполнения в секундах (None - default_timeout, по умолчанию
+                без ограничения; 0 - без ограничения)
+            profile: Профиль запроса; разбивка времени добавляется в результат (поле profile)
             
         Returns:
             Словарь с результатами выполнения:
@@ -77,7 +405,54 @@ class FreeCADExecutor:
                 - message: Сообщение о результате
                 - error: Сообщение об ошибке (если есть)
                 - result: Результат выполнения (если есть)
+                - elapsed_ms: Время выполнения скрипта
+                - interrupted: Причина прерывания ('timeout' или 'cancelled'), если скрипт прерван
         """
+        return self._execute(code, '<freecad-script>', None, send_result, request_id, session_id, timeout, profile)
+    
+    def execute_template(self, template_id: str, arguments: Optional[Dict[str, Any]] = None,
+                         send_result: bool = True, request_id: Any = None,
+                         session_id: Optional[str] = None, timeout: Optional[float] = None,
+                         profile: Optional[RequestProfile] = None) -> Dict[str, Any]:
+        """
+        Выполняет зарегистрированный шаблон скрипта с аргументами.
+        
+        Args:
+            template_id: Идентификатор шаблона
+            arguments: Аргументы шаблона (доступны в скрипте как переменные и как args)
+            send_result: Отправлять ли результат через веб-сокет
+            request_id: Идентификатор запроса, возвращаемый в ответе
+            session_id: Сессия, в пространстве имен которой выполняется шаблон
+            timeout: Срок выполнения в секундах (None - default_timeout, по умолчанию
+                без ограничения; 0 - без ограничения)
+            profile: Профиль запроса; разбивка времени добавляется в результат (поле profile)
+            
+        Returns:
+            Словарь с результатами выполнения (как в execute_code)
+        """
+        source = self._templates.get(template_id)
+        if source is None:
+            result = {
+                'success': False,
+                'message': 'Шаблон скрипта не найден',
+                'error': f"Шаблон {template_id} не зарегистрирован"
+            }
+            if send_result and self.websocket_sender:
+                self.send_result_via_websocket(result, request_id)
+            return result
+        
+        arguments = dict(arguments or {})
+        extra_vars = dict(arguments)
+        extra_vars['args'] = arguments
+        return self._execute(source, f'<template:{template_id}>', extra_vars, send_result, request_id,
+                             session_id, timeout, profile)
+    
+    def _execute(self, code: str, filename: str, extra_vars: Optional[Dict[str, Any]],
+                 send_result: bool, request_id: Any, session_id: Optional[str] = None,
+                 timeout: Optional[float] = None, profile: Optional[RequestProfile] = None) -> Dict[str, Any]:
+        """Компилирует (через кэш) и выполняет скрипт, формируя и отправляя результат"""
+        if profile is not None:
+            profile.mark_started()
         # Настраиваем окружение при первом использовании
         self._setup_environment()
         
@@ -88,44 +463,60 @@ class FreeCADExecutor:
                 'error': 'Не удалось импортировать FreeCAD. Убедитесь, что FreeCAD установлен и доступен.'
             }
             if send_result and self.websocket_sender:
-                self.send_result_via_websocket(result)
+                self.send_result_via_websocket(result, request_id)
             return result
+        
+        session = None
+        if session_id is not None:
+            try:
+                session = self.sessions.get(session_id)
+            except SessionError as e:
+                result = {
+                    'success': False,
+                    'message': 'Сессия не найдена',
+                    'error': str(e),
+                    'session_id': session_id
+                }
+                if send_result and self.websocket_sender:
+                    self.send_result_via_websocket(result, request_id)
+                return result
             
+        if timeout is None:
+            timeout = self.default_timeout
+        execution = None
         try:
             log("Выполнение Python-кода...")
             
-            # Импортируем необходимые модули FreeCAD
-            import FreeCAD
-            import FreeCADGui
-            
-            # Создаем локальный словарь для выполнения кода
-            local_vars = {
-                'FreeCAD': FreeCAD,
-                'Gui': FreeCADGui,
-                'App': FreeCAD,  # Алиас для совместимости
-            }
-            
-            # Пытаемся импортировать другие модули FreeCAD
-            modules_to_import = ['Part', 'Draft', 'Mesh', 'Sketcher', 'PartDesign']
-            for module_name in modules_to_import:
-                try:
-                    module = importlib.import_module(module_name)
-                    local_vars[module_name] = module
-                except ImportError:
-                    pass
-                    
-            # Добавляем утилиты CAD, если они доступны
-            try:
-                from utils.cad_utils import CADUtils, Coordinates, PartCreationDTO
-                local_vars['CADUtils'] = CADUtils
-                local_vars['Coordinates'] = Coordinates
-                local_vars['PartCreationDTO'] = PartCreationDTO
-            except ImportError as e:
-                log(f"Предупреждение: Не удалось импортировать CADUtils: {str(e)}")
-                
-            # Выполняем код
+            # Выполняем код (скомпилированный объект берется из кэша)
+            compiled = self.code_cache.get(code, filename)
             result = {}
-            exec(code, globals(), local_vars)
+            # Сторожевой поток прерывает скрипт по истечении срока или по отмене;
+            # при профилировании с отчетом top скрипт выполняется под cProfile
+            with self.watchdog.guard(timeout, request_id) as execution, \
+                    (profile.execution() if profile is not None else nullcontext()):
+                if session is None:
+                    # Создаем локальный словарь для выполнения кода: копия заранее
+                    # собранного пространства имен, модули повторно не импортируются
+                    local_vars = dict(build_base_namespace())
+                        
+                    # Аргументы шаблона
+                    if extra_vars:
+                        local_vars.update(extra_vars)
+                        
+                    exec(compiled, globals(), local_vars)
+                    # Прерывание после этой точки не делает выполненный скрипт прерванным
+                    execution.finish()
+                else:
+                    # Пространство имен сессии служит глобальным, чтобы функции,
+                    # определенные в предыдущих вызовах, видели друг друга
+                    with session.lock:
+                        local_vars = session.namespace
+                        local_vars.pop('result', None)
+                        if extra_vars:
+                            local_vars.update(extra_vars)
+                        session.calls += 1
+                        exec(compiled, local_vars)
+                        execution.finish()
             
             # Проверяем, был ли создан результат в локальных переменных
             if 'result' in local_vars:
@@ -136,10 +527,44 @@ class FreeCADExecutor:
                 'message': 'Python-код успешно выполнен',
                 'result': result
             }
+            result_dict.update(execution.report())
+            
+            if session is not None:
+                result_dict['session_id'] = session_id
+                # Сессия, превысившая ограничение по памяти, закрывается
+                if self.sessions.check_memory(session) is not None:
+                    result_dict['session_evicted'] = 'memory'
+            self._attach_profile(result_dict, profile)
             
             # Отправляем результат через веб-сокет, если это требуется
             if send_result and self.websocket_sender:
-                self.send_result_via_websocket(result_dict)
+                self.send_result_via_websocket(result_dict, request_id)
+                
+            return result_dict
+        
+        except ScriptInterrupted as e:
+            reason = execution.interrupted if execution is not None else e.reason
+            if reason == INTERRUPT_CANCELLED:
+                message = 'Выполнение кода отменено'
+            else:
+                message = f'Выполнение кода прервано: превышено время выполнения ({timeout} с)'
+            log(message)
+            
+            result_dict = {
+                'success': False,
+                'message': message,
+                'error': message,
+                'traceback': traceback.format_exc()
+            }
+            if execution is not None:
+                result_dict.update(execution.report())
+            result_dict['interrupted'] = reason
+            if session is not None:
+                result_dict['session_id'] = session_id
+            self._attach_profile(result_dict, profile)
+            
+            if send_result and self.websocket_sender:
+                self.send_result_via_websocket(result_dict, request_id)
                 
             return result_dict
                 
@@ -153,36 +578,188 @@ class FreeCADExecutor:
                 'error': str(e),
                 'traceback': traceback.format_exc()
             }
+            if execution is not None:
+                result_dict.update(execution.report())
+            if session is not None:
+                result_dict['session_id'] = session_id
+            self._attach_profile(result_dict, profile)
             
             # Отправляем сообщение об ошибке через веб-сокет, если это требуется
             if send_result and self.websocket_sender:
-                self.send_result_via_websocket(result_dict)
+                self.send_result_via_websocket(result_dict, request_id)
                 
             return result_dict
         
-    def send_result_via_websocket(self, result: Dict[str, Any]) -> None:
+    @staticmethod
+    def _attach_profile(result_dict: Dict[str, Any], profile: Optional[RequestProfile]) -> None:
+        """
+        Добавляет в результат профиль запроса. Разбивка времени подставляется
+        при сериализации ответа, чтобы в нее вошло время самой сериализации.
+        """
+        if profile is not None:
+            result_dict['profile'] = profile
+    
+    def execute_batch(self, items: List[Dict[str, Any]], send_result: bool = True, request_id: Any = None,
+                      session_id: Optional[str] = None, timeout: Optional[float] = None,
+                      stop_on_error: bool = True,
+                      call_function: Optional[Callable[[str, Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+        """
+        Выполняет упорядоченный список скриптов, шаблонов и вызовов функций
+        в одной транзакции документа с одним пересчетом в конце и отправляет
+        один сводный результат.
+        
+        Args:
+            items: Элементы пакета в формате сообщений: {"python_code": ...},
+                {"template_id": ..., "arguments": {...}} или {"function_call": ..., "arguments": {...}}
+            send_result: Отправлять ли результат через веб-сокет
+            request_id: Идентификатор запроса (по нему же пакет можно отменить)
+            session_id: Сессия, общая для всех скриптов пакета
+            timeout: Срок выполнения каждого скрипта (и ожидания результата фоновой функции) в секундах
+            stop_on_error: Прекращать ли выполнение после первой ошибки
+            call_function: Функция вызова зарегистрированных функций (имя, аргументы)
+            
+        Returns:
+            Словарь с результатами выполнения:
+                - success: Все ли элементы выполнены успешно
+                - result: Список результатов элементов (success, elapsed_ms, result или error)
+                - completed / failed: Количество успешных и неуспешных элементов
+                - elapsed_ms, recompute_ms: Общее время и время пересчета
+        """
+        start = time.perf_counter()
+        results = []
+        interrupted = None
+        
+        try:
+            with batch_transaction(f"PLM batch {request_id}" if request_id is not None else "PLM batch") as stats:
+                for index, item in enumerate(items):
+                    item_result = self._execute_batch_item(item, request_id, session_id, timeout, call_function)
+                    item_result['index'] = index
+                    results.append(item_result)
+                    if item_result.get('interrupted') == INTERRUPT_CANCELLED:
+                        # Отмена прерывает весь пакет, а не только текущий элемент
+                        interrupted = INTERRUPT_CANCELLED
+                        break
+                    if stop_on_error and not item_result['success']:
+                        break
+        except Exception as e:
+            error_msg = f"Ошибка при выполнении пакета: {str(e)}\n{traceback.format_exc()}"
+            log(error_msg)
+            stats = {}
+            results.append({
+                'index': len(results),
+                'success': False,
+                'error': str(e),
+                'traceback': traceback.format_exc()
+            })
+        
+        failed = sum(1 for item_result in results if not item_result['success'])
+        result_dict = {
+            'success': failed == 0 and len(results) == len(items),
+            'message': f"Пакет выполнен: {len(results) - failed} из {len(items)} успешно",
+            'result': results,
+            'completed': len(results) - failed,
+            'failed': failed,
+            'skipped': len(items) - len(results),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+        result_dict.update(stats)
+        if interrupted is not None:
+            result_dict['interrupted'] = interrupted
+        if session_id is not None:
+            result_dict['session_id'] = session_id
+        log(result_dict['message'])
+        
+        if send_result and self.websocket_sender:
+            self.send_result_via_websocket(result_dict, request_id)
+        return result_dict
+    
+    def _execute_batch_item(self, item: Dict[str, Any], request_id: Any, session_id: Optional[str],
+                            timeout: Optional[float], call_function) -> Dict[str, Any]:
+        """Выполняет один элемент пакета без отправки результата"""
+        if not isinstance(item, dict):
+            return {'success': False, 'error': f"Некорректный элемент пакета: {item!r}"}
+        
+        if 'python_code' in item:
+            item_result = self._execute(item['python_code'], '<freecad-script>', None,
+                                        False, request_id, session_id, timeout)
+        elif 'template_id' in item:
+            item_result = self.execute_template(item['template_id'], item.get('arguments'), send_result=False,
+                                                request_id=request_id, session_id=session_id, timeout=timeout)
+        elif 'function_call' in item:
+            if call_function is None:
+                return {'success': False, 'function_call': item['function_call'],
+                        'error': 'Вызов функций в пакете не поддерживается'}
+            start = time.perf_counter()
+            item_result = {'function_call': item['function_call']}
+            try:
+                result = call_function(item['function_call'], item.get('arguments') or {})
+                if isinstance(result, concurrent.futures.Future):
+                    # Функция выполняется в фоне (пул процессов): следующие элементы
+                    # могут зависеть от ее результата, поэтому ждем его в пределах срока элемента
+                    try:
+                        result = result.result(timeout=timeout or None)
+                    except concurrent.futures.TimeoutError:
+                        result.cancel()
+                        raise TimeoutError(f"Функция {item['function_call']} не завершилась за {timeout} с")
+                item_result['result'] = result
+                item_result['success'] = True
+            except Exception as e:
+                item_result['success'] = False
+                item_result['error'] = str(e)
+                item_result['traceback'] = traceback.format_exc()
+            item_result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            return item_result
+        else:
+            return {'success': False,
+                    'error': "Элемент пакета должен содержать 'python_code', 'template_id' или 'function_call'"}
+        
+        # Сообщение и идентификатор сессии повторяются в сводном результате
+        item_result.pop('message', None)
+        item_result.pop('session_id', None)
+        return item_result
+    
+    def send_result_via_websocket(self, result: Dict[str, Any], request_id: Any = None) -> None:
         """
         Отправляет результат выполнения кода через веб-сокет.
         
         Args:
             result: Словарь с результатами выполнения
+            request_id: Идентификатор запроса (если был передан сервером)
         """
         if not self.websocket_sender:
             log("Предупреждение: Не настроен обработчик веб-сокета для отправки результатов")
             return
             
         try:
-            # Преобразуем результат в JSON
-            json_result = json.dumps(result)
+            # Сырые данные (BREP, PNG) отправляем бинарным сообщением без JSON и base64
+            meta = {
+                'type': 'execution_result',
+                'data': {key: value for key, value in result.items() if key != 'result'}
+            }
+            if request_id is not None:
+                meta['request_id'] = request_id
+            binary_message = build_result_message(
+                MESSAGE_TYPE_EXECUTION_RESULT,
+                result.get('result'),
+                meta,
+                correlation_id=str(request_id) if request_id is not None else ''
+            )
             
             # Добавляем метку для идентификации типа сообщения
-            data_to_send = {
+            data_to_send = binary_message or {
                 'type': 'execution_result',
                 'data': result
             }
+            # Сервер сопоставляет ответ с запросом по request_id
+            if binary_message is None and request_id is not None:
+                data_to_send['request_id'] = request_id
             
-            # Отправляем через веб-сокет
-            self.websocket_sender(data_to_send)
+            # Отправляем через веб-сокет; время сериализации ответа попадает в профиль
+            profile = result.get('profile')
+            if isinstance(profile, RequestProfile):
+                self.websocket_sender(data_to_send, profile)
+            else:
+                self.websocket_sender(data_to_send)
             log("Результат успешно отправлен через веб-сокет")
         except Exception as e:
             log(f"Ошибка при отправке результата через веб-сокет: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Кэш результатов функций реестра (FunctionRegistry).
+
+Кэширование включается при регистрации функции (cache_ttl): результат хранится
+cache_ttl секунд под ключом из имени функции и канонизированных аргументов.
+Записи помечаются тегами (cache_tags); функции, изменяющие данные (invalidates),
+после вызова удаляют все записи со своими тегами.
+
+Инвалидация увеличивает поколение тегов. Вызов, начавшийся до инвалидации,
+мог прочитать старые данные, поэтому его результат сохраняется, только если
+поколение тегов записи не изменилось за время вызова (generation/put).
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Максимальное количество закэшированных результатов
+DEFAULT_RESULT_CACHE_SIZE = 512
+
+
+def canonical_arguments(arguments: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Возвращает канонический вид аргументов для ключа кэша.
+
+    Returns:
+        str или None, если аргументы нельзя канонизировать (сырые данные и т.п.)
+    """
+    try:
+        return json.dumps(arguments or {}, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+
+
+class FunctionResultCache:
+    """
+    LRU-кэш результатов функций со сроком жизни записей. Потокобезопасен.
+
+    Кэш хранит собственную копию результата и возвращает каждому вызывающему
+    новую копию: изменение полученного результата (функцией, сборкой пакета)
+    не меняет того, что получат следующие вызовы.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_RESULT_CACHE_SIZE):
+        """
+        Args:
+            max_size: Максимальное количество записей
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        # (имя функции, аргументы) -> (момент истечения, результат, теги)
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, Any, frozenset]]' = OrderedDict()
+        # Поколения: тег -> количество инвалидаций по нему; общее - инвалидации всех записей
+        self._tag_generations: Dict[str, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, function_name: str, key: str) -> Tuple[bool, Any]:
+        """
+        Ищет результат в кэше.
+
+        Args:
+            function_name: Имя функции
+            key: Канонические аргументы (canonical_arguments)
+
+        Returns:
+            tuple: (найден ли результат, копия результата)
+        """
+        entry_key = (function_name, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(entry_key)
+                    self.hits += 1
+                    result = entry[1]
+                else:
+                    del self._entries[entry_key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+        return True, copy.deepcopy(result)
+
+    def _generation_of(self, tags: frozenset) -> int:
+        # Поколения только растут, поэтому сумма меняется при любой инвалидации тегов
+        return self._generation + sum(self._tag_generations.get(tag, 0) for tag in tags)
+
+    def generation(self, function_name: str, tags: Iterable[str] = ()) -> int:
+        """
+        Возвращает поколение тегов записи; запоминается перед вызовом функции и передается в put.
+
+        Args:
+            function_name: Имя функции
+            tags: Теги записи
+
+        Returns:
+            int: Поколение
+        """
+        with self._lock:
+            return self._generation_of(frozenset(tags) | {function_name})
+
+    def put(self, function_name: str, key: str, result: Any, ttl: float, tags: Iterable[str] = (),
+            generation: Optional[int] = None) -> bool:
+        """
+        Сохраняет результат.
+
+        Args:
+            function_name: Имя функции
+            key: Канонические аргументы (canonical_arguments)
+            result: Результат функции
+            ttl: Срок жизни записи в секундах
+            tags: Теги для инвалидации; имя функции добавляется всегда
+            generation: Поколение тегов до вызова функции (generation); если с тех пор
+                записи с этими тегами инвалидировались, результат мог устареть и не сохраняется
+
+        Returns:
+            bool: Сохранен ли результат (результат, который нельзя скопировать, не кэшируется)
+        """
+        try:
+            result = copy.deepcopy(result)
+        except Exception:
+            return False
+        tags = frozenset(tags) | {function_name}
+        entry = (time.monotonic() + ttl, result, tags)
+        with self._lock:
+            if generation is not None and self._generation_of(tags) != generation:
+                return False
+            self._entries[(function_name, key)] = entry
+            self._entries.move_to_end((function_name, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, tags: Optional[Iterable[str]] = None) -> int:
+        """
+        Удаляет записи, помеченные любым из тегов.
+
+        Args:
+            tags: Теги или имена функций (None - все записи)
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        tags = frozenset(tags) if tags is not None else None
+        with self._lock:
+            if tags is None:
+                self._generation += 1
+            else:
+                for tag in tags:
+                    self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+            stale = [key for key, (_, _, entry_tags) in self._entries.items()
+                     if tags is None or entry_tags & tags]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер кэша и счетчики попаданий, промахов и инвалидаций"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidated': self.invalidated,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        """Очищает кэш и сбрасывает счетчики"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.hits = 0
+            self.misses = 0
+            self.invalidated = 0
@@ -0,0 +1,168 @@
+"""
+Метрики вызовов функций реестра (FunctionRegistry).
+
+Для каждой функции считаются вызовы, ошибки и задержка. Задержка хранится
+в гистограмме с логарифмическими корзинами фиксированного размера: память
+не растет с числом вызовов, а перцентили (p50/p95/p99) вычисляются по середине
+корзины с относительной погрешностью не более ~4.5% (шаг корзины 2^(1/8)).
+"""
+
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+# Границы гистограммы задержки в миллисекундах: значения вне диапазона
+# попадают в крайние корзины
+HISTOGRAM_MIN_MS = 0.001
+HISTOGRAM_MAX_MS = 3600 * 1000.0
+# Корзин на удвоение значения
+HISTOGRAM_BUCKETS_PER_OCTAVE = 8
+
+_LOG_STEP = math.log(2) / HISTOGRAM_BUCKETS_PER_OCTAVE
+_BUCKET_COUNT = int(math.ceil(math.log(HISTOGRAM_MAX_MS / HISTOGRAM_MIN_MS) / _LOG_STEP)) + 1
+
+PERCENTILES = (50, 95, 99)
+
+
+def _round_ms(value: float) -> float:
+    return round(value, 3)
+
+
+class LatencyHistogram:
+    """Гистограмма задержки фиксированного размера (не потокобезопасна)"""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts: List[int] = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def bucket(value_ms: float) -> int:
+        """Номер корзины для значения"""
+        if value_ms <= HISTOGRAM_MIN_MS:
+            return 0
+        return min(int(math.log(value_ms / HISTOGRAM_MIN_MS) / _LOG_STEP) + 1, _BUCKET_COUNT - 1)
+
+    @staticmethod
+    def midpoint(bucket: int) -> float:
+        """Середина корзины (среднее геометрическое границ) в миллисекундах"""
+        return HISTOGRAM_MIN_MS * math.exp((bucket - 0.5) * _LOG_STEP) if bucket else HISTOGRAM_MIN_MS
+
+    def add(self, value_ms: float) -> None:
+        """Добавляет значение задержки"""
+        self.counts[self.bucket(value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if self.min is None or value_ms < self.min:
+            self.min = value_ms
+        if self.max is None or value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Возвращает перцентиль задержки (середину корзины в пределах наблюдавшихся значений).
+
+        Args:
+            percent: Перцентиль от 0 до 100
+
+        Returns:
+            float или None, если значений нет
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(max(self.midpoint(bucket), self.min), self.max)
+        return self.max
+
+
+class _FunctionStats:
+    """Счетчики и гистограмма одной функции"""
+
+    __slots__ = ('calls', 'errors', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+
+    def report(self) -> Dict[str, Any]:
+        histogram = self.histogram
+        report = {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': self.errors / self.calls if self.calls else 0.0,
+        }
+        if histogram.count:
+            report['mean_ms'] = _round_ms(histogram.total / histogram.count)
+            report['min_ms'] = _round_ms(histogram.min)
+            report['max_ms'] = _round_ms(histogram.max)
+            for percent in PERCENTILES:
+                report[f'p{percent}_ms'] = _round_ms(histogram.percentile(percent))
+        return report
+
+
+class FunctionMetrics:
+    """Метрики вызовов по функциям. Потокобезопасен."""
+
+    def __init__(self):
+        self._stats: Dict[str, _FunctionStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, function_name: str, elapsed_ms: float, error: bool = False) -> None:
+        """
+        Учитывает завершенный вызов.
+
+        Args:
+            function_name: Имя функции
+            elapsed_ms: Задержка вызова в миллисекундах
+            error: Завершился ли вызов ошибкой
+        """
+        with self._lock:
+            stats = self._stats.get(function_name)
+            if stats is None:
+                stats = self._stats[function_name] = _FunctionStats()
+            stats.calls += 1
+            if error:
+                stats.errors += 1
+            stats.histogram.add(elapsed_ms)
+
+    def report(self, function_name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Возвращает метрики функций.
+
+        Args:
+            function_name: Имя функции (None - все вызывавшиеся функции)
+
+        Returns:
+            dict: Имя функции -> calls, errors, error_rate, mean/min/max_ms, p50/p95/p99_ms
+        """
+        with self._lock:
+            if function_name is not None:
+                stats = self._stats.get(function_name)
+                return {function_name: stats.report()} if stats is not None else {}
+            return {name: stats.report() for name, stats in self._stats.items()}
+
+    def reset(self, function_name: Optional[str] = None) -> int:
+        """
+        Сбрасывает метрики.
+
+        Args:
+            function_name: Имя функции (None - все функции)
+
+        Returns:
+            int: Количество функций, метрики которых сброшены
+        """
+        with self._lock:
+            if function_name is not None:
+                return 1 if self._stats.pop(function_name, None) is not None else 0
+            count = len(self._stats)
+            self._stats.clear()
+            return count
@@ -1,5 +1,30 @@
+import concurrent.futures
+import threading
+import time
 import traceback
+from contextlib import nullcontext
 from utils.logger import log
+from function_schema import FunctionSchema
+from function_cache import FunctionResultCache, canonical_arguments
+from function_metrics import FunctionMetrics
+from binary_messages import build_result_message, MESSAGE_TYPE_FUNCTION_RESPONSE
+
+# Привязка функции к потоку выполнения:
+# AFFINITY_GUI - функция работает с документом или виджетами и вызывается в главном потоке Qt;
+# AFFINITY_ANY - функция не трогает GUI и вызывается сразу в потоке прослушивания,
+# не дожидаясь очереди главного потока (ответы могут прийти не в порядке запросов);
+# AFFINITY_WORKER - долгая функция без GUI (запросы к PLM API) выполняется в пуле
+# рабочих потоков и не задерживает ни главный поток, ни поток прослушивания
+AFFINITY_GUI = 'gui'
+AFFINITY_ANY = 'any'
+AFFINITY_WORKER = 'worker'
+AFFINITIES = (AFFINITY_GUI, AFFINITY_ANY, AFFINITY_WORKER)
+
+# Количество рабочих потоков для функций AFFINITY_WORKER
+DEFAULT_WORKER_THREADS = 4
+
+# Тег кэша для результатов, зависящих от состава реестра
+CACHE_TAG_REGISTRY = 'registry'
 
 class FunctionRegistry:
     """
@@ -10,26 +35,73 @@ class FunctionRegistry:
     def __init__(self):
         # Словарь зарегистрированных функций
         self._functions = {}
+        # Привязка функций к потоку выполнения (AFFINITY_*)
+        self._affinities = {}
+        # Схемы аргументов, разобранные при регистрации (None - без проверки)
+        self._schemas = {}
+        # Кэш результатов: срок жизни и теги кэшируемых функций,
+        # теги, которые сбрасывает вызов изменяющей функции
+        self.cache = FunctionResultCache()
+        self._cache_policies = {}
+        self._invalidates = {}
+        # Счетчики вызовов и ошибок и гистограммы задержки по функциям
+        self.metrics = FunctionMetrics()
         # Функция для отправки результатов через websocket
         self.websocket_sender = None
+        # Пул рабочих потоков для функций AFFINITY_WORKER (создается при первом вызове)
+        self._worker_pool = None
+        self._worker_pool_lock = threading.Lock()
         
         # Регистрируем стандартные функции
         self._register_default_functions()
     
-    def register_function(self, function_name, function_callable):
+    def register_function(self, function_name, function_callable, affinity=AFFINITY_GUI,
+                          cache_ttl=None, cache_tags=(), invalidates=()):
         """
         Регистрирует функцию в реестре
         
         Args:
             function_name (str): Уникальное имя функции для вызова
             function_callable (callable): Вызываемая функция или метод
+            affinity (str): Поток выполнения: AFFINITY_GUI (по умолчанию), AFFINITY_ANY или AFFINITY_WORKER
+            cache_ttl (float): Срок жизни результата в кэше в секундах (None - не кэшировать).
+                Только для функций без побочных эффектов
+            cache_tags (iterable): Теги записей кэша этой функции (имя функции - всегда)
+            invalidates (iterable): Теги (или имена функций), записи которых удаляются
+                из кэша после вызова этой функции
         """
         if not callable(function_callable):
             raise ValueError(f"Объект {function_callable} не является вызываемым")
+        if affinity not in AFFINITIES:
+            raise ValueError(f"Неизвестная привязка к потоку: {affinity}")
             
         self._functions[function_name] = function_callable
+        self._affinities[function_name] = affinity
+        self._schemas[function_name] = FunctionSchema.from_callable(function_callable)
+        if cache_ttl:
+            self._cache_policies[function_name] = (float(cache_ttl), tuple(cache_tags))
+        else:
+            self._cache_policies.pop(function_name, None)
+        if invalidates:
+            self._invalidates[function_name] = tuple(invalidates)
+        else:
+            self._invalidates.pop(function_name, None)
+        # Прежние результаты перерегистрированной функции и список функций устарели
+        self.cache.invalidate((function_name, CACHE_TAG_REGISTRY))
         log(f"Функция {function_name} зарегистрирована в реестре")
     
+    def get_affinity(self, function_name):
+        """
+        Возвращает привязку функции к потоку выполнения
+        
+        Args:
+            function_name (str): Имя функции
+            
+        Returns:
+            str: AFFINITY_GUI, AFFINITY_ANY или AFFINITY_WORKER (для незарегистрированных функций - AFFINITY_GUI)
+        """
+        return self._affinities.get(function_name, AFFINITY_GUI)
+    
     def execute_function(self, function_name, function_args=None):
         """
         Выполняет функцию из реестра по имени с указанными аргументами
@@ -43,19 +115,16 @@ class FunctionRegistry:
             
         Raises:
             KeyError: Если функция с указанным именем не зарегистрирована
+            ArgumentError: Если аргументы не соответствуют сигнатуре функции
             Exception: Если возникла ошибка при выполнении функции
         """
-        if function_name not in self._functions:
-            raise KeyError(f"Функция {function_name} не зарегистрирована в реестре")
+        function = self._get_function(function_name)
             
         log(f"Вызов функции {function_name} с аргументами: {function_args}")
-        
-        if function_args is None:
-            function_args = {}
             
         try:
-            # Вызываем функцию с распакованными аргументами
-            result = self._functions[function_name](**function_args)
+            # Вызываем функцию с распакованными аргументами (или берем результат из кэша)
+            result = self._invoke(function_name, function, function_args)
             log(f"Функция {function_name} успешно выполнена, результат: {result}")
             return result
         except Exception as e:
@@ -63,11 +132,290 @@ class FunctionRegistry:
             log(error_msg)
             raise
     
+    def submit_function(self, function_name, function_args=None, context=None):
+        """
+        Вызывает функцию с учетом ее привязки: функция AFFINITY_WORKER ставится
+        в пул рабочих потоков, остальные выполняются сразу в текущем потоке
+        
+        Args:
+            function_name (str): Имя функции для вызова
+            function_args (dict): Словарь с аргументами функции (kwargs)
+            context (callable): Фабрика контекста, в котором выполняется функция
+                в рабочем потоке (например, профилирование запроса)
+            
+        Returns:
+            Future для функций AFFINITY_WORKER, иначе результат выполнения функции
+        """
+        if self.get_affinity(function_name) != AFFINITY_WORKER:
+            return self.execute_function(function_name, function_args)
+        
+        def run():
+            with context() if context is not None else nullcontext():
+                return self.execute_function(function_name, function_args)
+        
+        return self.submit(run)
+    
+    def submit(self, fn, *args, **kwargs):
+        """
+        Выполняет вызываемый объект в пуле рабочих потоков
+        
+        Returns:
+            concurrent.futures.Future: Результат выполнения
+        """
+        with self._worker_pool_lock:
+            if self._worker_pool is None:
+                self._worker_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=DEFAULT_WORKER_THREADS, thread_name_prefix="plm-function-worker"
+                )
+            return self._worker_pool.submit(fn, *args, **kwargs)
+    
+    def shutdown(self):
+        """Останавливает пул рабочих потоков, не дожидаясь выполняемых функций"""
+        with self._worker_pool_lock:
+            pool, self._worker_pool = self._worker_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+    
+    def execute_batch(self, calls, stop_on_error=True):
+        """
+        Выполняет упорядоченный список вызовов функций.
+        
+        В отличие от execute_function, вызовы не логируются по отдельности:
+        в лог пишется одна сводка на весь пакет.
+        
+        Args:
+            calls (list): Вызовы в формате сообщений: {"function_call": имя, "arguments": {...}}
+            stop_on_error (bool): Прекращать ли выполнение после первой ошибки
+            
+        Returns:
+            dict: Результаты пакета:
+                - results: Список результатов вызовов (index, function_call, success,
+                  elapsed_ms, result или error и traceback)
+                - completed / failed / skipped: Количество успешных, неуспешных и невыполненных вызовов
+                - elapsed_ms: Общее время выполнения
+        """
+        start = time.perf_counter()
+        results = []
+        for index, call in enumerate(calls):
+            call_start = time.perf_counter()
+            if isinstance(call, dict) and 'function_call' in call:
+                call_result = {'index': index, 'function_call': call['function_call']}
+                try:
+                    function = self._get_function(call['function_call'])
+                    call_result['result'] = self._invoke(call['function_call'], function, call.get('arguments'))
+                    call_result['success'] = True
+                except Exception as e:
+                    call_result['success'] = False
+                    call_result['error'] = str(e)
+                    call_result['traceback'] = traceback.format_exc()
+            else:
+                call_result = {'index': index, 'success': False,
+                               'error': f"Элемент пакета должен содержать 'function_call': {call!r}"}
+            call_result['elapsed_ms'] = round((time.perf_counter() - call_start) * 1000, 3)
+            results.append(call_result)
+            if stop_on_error and not call_result['success']:
+                break
+        
+        failed = sum(1 for call_result in results if not call_result['success'])
+        batch = {
+            'results': results,
+            'completed': len(results) - failed,
+            'failed': failed,
+            'skipped': len(calls) - len(results),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+        log(f"Пакет вызовов функций выполнен: {batch['completed']} из {len(calls)} успешно "
+            f"за {batch['elapsed_ms']} мс")
+        return batch
+    
+    def get_batch_affinity(self, calls):
+        """
+        Возвращает привязку пакета вызовов к потоку выполнения. Пакет выполняется
+        целиком в одном потоке, чтобы сохранить порядок вызовов: в главном потоке,
+        если хотя бы одна функция требует GUI, в пуле рабочих потоков, если среди
+        функций есть AFFINITY_WORKER, иначе сразу в потоке прослушивания
+        
+        Args:
+            calls (list): Вызовы в формате сообщений
+            
+        Returns:
+            str: AFFINITY_GUI, AFFINITY_WORKER или AFFINITY_ANY
+        """
+        affinity = AFFINITY_ANY
+        for call in calls:
+            function_name = call.get('function_call') if isinstance(call, dict) else None
+            if not isinstance(function_name, str):
+                return AFFINITY_GUI
+            call_affinity = self.get_affinity(function_name)
+            if call_affinity == AFFINITY_GUI:
+                return AFFINITY_GUI
+            if call_affinity == AFFINITY_WORKER:
+                affinity = AFFINITY_WORKER
+        return affinity
+    
+    def _invoke(self, function_name, function, function_args):
+        """
+        Проверяет аргументы, вызывает функцию и учитывает вызов в метриках.
+        Аргументы проверяются до вызова, а не TypeError из глубины функции
+        """
+        start = time.perf_counter()
+        try:
+            function_args = self.validate_arguments(function_name, function_args)
+            result = self._call(function_name, function, function_args)
+        except Exception:
+            self.metrics.record(function_name, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        
+        if isinstance(result, concurrent.futures.Future):
+            # Отложенный результат учитывается по завершении
+            result.add_done_callback(lambda future: self.metrics.record(
+                function_name, (time.perf_counter() - start) * 1000,
+                error=future.cancelled() or future.exception() is not None
+            ))
+        else:
+            self.metrics.record(function_name, (time.perf_counter() - start) * 1000,
+                                error=self._is_failure(result))
+        return result
+    
+    def _call(self, function_name, function, function_args):
+        """
+        Вызывает функцию с проверенными аргументами через кэш результатов
+        и сбрасывает записи кэша, которые зависят от изменяющей функции
+        """
+        policy = self._cache_policies.get(function_name)
+        key = None
+        if policy is not None:
+            schema = self._schemas.get(function_name)
+            key = canonical_arguments({**schema.defaults, **function_args} if schema is not None else function_args)
+        if key is not None:
+            found, result = self.cache.get(function_name, key)
+            if found:
+                return result
+            # Инвалидация во время вызова делает результат устаревшим: тогда он не сохраняется
+            generation = self.cache.generation(function_name, policy[1])
+        
+        try:
+            result = function(**function_args)
+        finally:
+            # Изменение могло пройти частично, поэтому кэш сбрасывается и при ошибке
+            invalidates = self._invalidates.get(function_name)
+            if invalidates:
+                self.cache.invalidate(invalidates)
+        
+        if key is not None and self._is_cacheable(result):
+            self.cache.put(function_name, key, result, *policy, generation=generation)
+        return result
+    
+    @staticmethod
+    def _is_failure(result):
+        """Функции PLM сообщают об ошибке результатом {"success": False}, а не исключением"""
+        return isinstance(result, dict) and result.get("success") is False
+    
+    @classmethod
+    def _is_cacheable(cls, result):
+        """Отложенные результаты и ответы с ошибкой не кэшируются"""
+        return not isinstance(result, concurrent.futures.Future) and not cls._is_failure(result)
+    
+    def invalidate_cache(self, tags=None):
+        """
+        Удаляет результаты из кэша функций, например после изменения данных PLM в обход реестра
+        
+        Args:
+            tags (list): Теги или имена функций (None - весь кэш)
+            
+        Returns:
+            dict: Количество удаленных записей
+        """
+        if isinstance(tags, str):
+            tags = [tags]
+        return {"invalidated": self.cache.invalidate(tags)}
+    
+    def get_cache_stats(self):
+        """Возвращает статистику кэша результатов и кэшируемые функции со сроком жизни"""
+        stats = self.cache.stats()
+        stats["functions"] = {name: ttl for name, (ttl, _) in self._cache_policies.items()}
+        return stats
+    
+    def get_function_stats(self, function_name=None):
+        """
+        Возвращает метрики вызовов функций: количество вызовов и ошибок
+        и задержку (среднюю, минимальную, максимальную, p50/p95/p99) в миллисекундах
+        
+        Args:
+            function_name (str): Имя функции (None - все вызывавшиеся функции)
+            
+        Returns:
+            dict: Имя функции -> метрики
+        """
+        return {"functions": self.metrics.report(function_name)}
+    
+    def reset_function_stats(self, function_name=None):
+        """
+        Сбрасывает метрики вызовов функций
+        
+        Args:
+            function_name (str): Имя функции (None - все функции)
+            
+        Returns:
+            dict: Количество функций, метрики которых сброшены
+        """
+        return {"reset": self.metrics.reset(function_name)}
+    
+    def validate_arguments(self, function_name, function_args=None):
+        """
+        Проверяет аргументы по схеме функции и приводит их к типам параметров
+        
+        Args:
+            function_name (str): Имя зарегистрированной функции
+            function_args (dict): Аргументы из сообщения
+            
+        Returns:
+            dict: Аргументы для вызова функции
+            
+        Raises:
+            ArgumentError: Если аргументы не соответствуют сигнатуре функции
+        """
+        schema = self._schemas.get(function_name)
+        if schema is None:
+            return function_args or {}
+        return schema.validate(function_args)
+    
+    def get_function_schema(self, function_name):
+        """
+        Возвращает описание функции для клиентов: назначение, привязку к потоку
+        и JSON Schema аргументов
+        
+        Args:
+            function_name (str): Имя зарегистрированной функции
+            
+        Returns:
+            dict: description, affinity, parameters
+        """
+        self._get_function(function_name)
+        schema = self._schemas.get(function_name)
+        return {
+            "description": schema.description if schema is not None else "",
+            "affinity": self.get_affinity(function_name),
+            "parameters": schema.json_schema() if schema is not None else {"type": "object"},
+        }
+    
+    def _get_function(self, function_name):
+        """Возвращает зарегистрированную функцию или поднимает KeyError"""
+        try:
+            return self._functions[function_name]
+        except (KeyError, TypeError):
+            raise KeyError(f"Функция {function_name} не зарегистрирована в реестре") from None
+    
     def _register_default_functions(self):
         """Регистрирует стандартные функции, доступные по умолчанию"""
         # Пример регистрации некоторых стандартных функций
-        self.register_function("echo", self._echo_function)
-        self.register_function("get_available_functions", self._get_available_functions)
+        self.register_function("echo", self._echo_function, affinity=AFFINITY_ANY)
+        self.register_function("get_available_functions", self._get_available_functions, affinity=AFFINITY_ANY,
+                               cache_ttl=300, cache_tags=(CACHE_TAG_REGISTRY,))
+        self.register_function("invalidate_cache", self.invalidate_cache, affinity=AFFINITY_ANY)
+        self.register_function("get_function_cache_stats", self.get_cache_stats, affinity=AFFINITY_ANY)
+        self.register_function("get_function_stats", self.get_function_stats, affinity=AFFINITY_ANY)
+        self.register_function("reset_function_stats", self.reset_function_stats, affinity=AFFINITY_ANY)
         
         # Тут можно добавить другие стандартные функции
         # self.register_function("another_function", self._another_function)
@@ -78,20 +426,89 @@ class FunctionRegistry:
         """Простая тестовая функция, возвращает переданное сообщение"""
         return {"message": message}
     
-    def _get_available_functions(self):
-        """Возвращает список доступных функций"""
-        return {"available_functions": list(self._functions.keys())}
+    def _get_available_functions(self, include_schemas: bool = True):
+        """
+        Возвращает список доступных функций и, по умолчанию, их схемы аргументов
+        (см. get_function_schema), чтобы клиент мог сразу сформировать правильный вызов
+        """
+        response = {"available_functions": list(self._functions.keys())}
+        if include_schemas:
+            response["functions"] = {name: self.get_function_schema(name) for name in self._functions}
+        return response
         
     # Добавьте другие стандартные функции здесь
     
-    def _send_result_via_websocket(self, function_name, result):
+    @staticmethod
+    def build_response(function_name, result=None, request_id=None, error=None, profile=None):
+        """
+        Формирует ответ на function_call
+        
+        Args:
+            function_name (str): Имя вызванной функции
+            result: Результат выполнения функции
+            request_id: Идентификатор запроса, возвращаемый серверу без изменений
+            error (Exception): Исключение, если функция завершилась ошибкой
+            profile (RequestProfile): Профиль запроса (если запрошен); отчет подставляется
+                при сериализации ответа
+            
+        Returns:
+            dict для JSON-ответа или BinaryMessage, если результат содержит BinaryPayload
+        """
+        response_data = {"function_response": function_name}
+        if request_id is not None:
+            response_data["request_id"] = request_id
+        if profile is not None:
+            response_data["profile"] = profile
+        
+        if error is not None:
+            response_data["error"] = str(error)
+            response_data["traceback"] = "".join(
+                traceback.format_exception(type(error), error, error.__traceback__)
+            )
+            return response_data
+        
+        # Результат с BinaryPayload отправляется бинарным сообщением
+        binary_response = build_result_message(
+            MESSAGE_TYPE_FUNCTION_RESPONSE, result, response_data,
+            correlation_id=str(request_id) if request_id is not None else ''
+        )
+        if binary_response is not None:
+            return binary_response
+        
+        response_data["result"] = result
+        return response_data
+    
+    @staticmethod
+    def build_batch_response(batch, request_id=None, profile=None):
+        """
+        Формирует один ответ на сообщение function_calls
+        
+        Сырые данные (BinaryPayload) в результатах пакета заменяются описанием
+        (тип и размер); чтобы получить сами данные, функцию нужно вызвать отдельно.
+        
+        Args:
+            batch (dict): Результаты execute_batch
+            request_id: Идентификатор запроса, возвращаемый серверу без изменений
+            profile (RequestProfile): Профиль запроса (если запрошен); отчет подставляется
+                при сериализации ответа
+            
+        Returns:
+            dict для JSON-ответа
+        """
+        response_data = {"function_calls_response": batch['results']}
+        if request_id is not None:
+            response_data["request_id"] = request_id
+        for key in ('completed', 'failed', 'skipped', 'elapsed_ms'):
+            response_data[key] = batch[key]
+        if profile is not None:
+            response_data["profile"] = profile
+        return response_data
+    
+    def _send_result_via_websocket(self, function_name, result, request_id=None):
         """Отправляет результат выполнения функции через websocket"""
         if self.websocket_sender:
             try:
-                response_data = {
-                    "function_response": function_name,
-                    "result": result
-                }
+                response_data = self.build_response(function_name, result, request_id)
                 self.websocket_sender(response_data)
                 return True
             except Exception as e:
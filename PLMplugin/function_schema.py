@@ -0,0 +1,319 @@
+"""
+Схемы аргументов функций реестра (FunctionRegistry).
+
+Сигнатура функции разбирается один раз при регистрации. По ней до вызова
+проверяются и приводятся аргументы сообщения (например, "10" -> 10 для int,
+12 -> "12" для str), а get_available_functions отдает клиентам JSON Schema
+параметров. Тип параметра берется из аннотации, а без аннотации - из значения
+по умолчанию; параметры без типа принимаются как есть.
+"""
+
+import collections.abc
+import inspect
+import types
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_NO_DEFAULT = inspect.Parameter.empty
+
+# Строковые значения, приводимые к bool
+_TRUE_STRINGS = ('true', '1', 'yes', 'on')
+_FALSE_STRINGS = ('false', '0', 'no', 'off')
+
+
+class ArgumentError(TypeError):
+    """Аргументы вызова не соответствуют сигнатуре функции"""
+
+
+class _Invalid(Exception):
+    """Значение не приводится к типу параметра (внутреннее)"""
+
+
+def _type_name(tp) -> str:
+    if isinstance(tp, type):
+        return tp.__name__
+    return str(tp).replace('typing.', '')
+
+
+def _coerce_int(value):
+    if isinstance(value, bool):
+        raise _Invalid
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise _Invalid
+
+
+def _coerce_float(value):
+    if isinstance(value, bool):
+        raise _Invalid
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise _Invalid
+
+
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+    raise _Invalid
+
+
+def _coerce_str(value):
+    if isinstance(value, str):
+        return value
+    # Идентификаторы часто приходят числами
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise _Invalid
+
+
+def _coerce_bytes(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    raise _Invalid
+
+
+_SCALARS = {
+    int: (_coerce_int, {'type': 'integer'}),
+    float: (_coerce_float, {'type': 'number'}),
+    bool: (_coerce_bool, {'type': 'boolean'}),
+    str: (_coerce_str, {'type': 'string'}),
+    # Сырые данные передаются бинарным сообщением (binary_argument)
+    bytes: (_coerce_bytes, {'type': 'string', 'contentEncoding': 'binary'}),
+}
+
+
+def _accept(value):
+    return value
+
+
+def _compile_type(tp) -> Tuple[Callable[[Any], Any], Dict[str, Any]]:
+    """
+    Строит функцию приведения и JSON Schema для аннотации.
+
+    Returns:
+        tuple: (приведение, поднимающее _Invalid, JSON Schema)
+    """
+    if tp is Any or tp is inspect.Parameter.empty or tp is object:
+        return _accept, {}
+    if tp is None or tp is type(None):
+        def coerce_none(value):
+            if value is not None:
+                raise _Invalid
+            return None
+        return coerce_none, {'type': 'null'}
+    if tp in _SCALARS:
+        return _SCALARS[tp]
+
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+
+    if origin is typing.Union or (hasattr(types, 'UnionType') and origin is types.UnionType):
+        options = [_compile_type(arg) for arg in args]
+        # Сначала точное совпадение типа, затем приведение: "1" для Union[int, str] остается строкой
+        exact = [arg for arg in args if isinstance(arg, type)]
+
+        def coerce_union(value):
+            for arg in exact:
+                if type(value) is arg:
+                    return value
+            for coerce, _ in options:
+                try:
+                    return coerce(value)
+                except _Invalid:
+                    continue
+            raise _Invalid
+        return coerce_union, {'anyOf': [schema for _, schema in options]}
+
+    if origin is typing.Literal:
+        allowed = list(args)
+
+        def coerce_literal(value):
+            if value not in allowed:
+                raise _Invalid
+            return value
+        return coerce_literal, {'enum': allowed}
+
+    container = origin or tp
+    if isinstance(container, type):
+        if issubclass(container, (str, bytes, bytearray)):
+            return _accept, {}
+        if issubclass(container, collections.abc.Mapping):
+            value_coerce, value_schema = _compile_type(args[1]) if len(args) == 2 else (_accept, {})
+
+            def coerce_mapping(value):
+                if not isinstance(value, dict):
+                    raise _Invalid
+                return {key: value_coerce(item) for key, item in value.items()}
+            schema = {'type': 'object'}
+            if value_schema:
+                schema['additionalProperties'] = value_schema
+            return coerce_mapping, schema
+        if issubclass(container, collections.abc.Iterable):
+            # List[int], Sequence[str], Tuple[int, ...]; у кортежей фиксированной длины элементы не проверяются
+            item_type = args[0] if len(args) == 1 or (len(args) == 2 and args[1] is Ellipsis) else None
+            item_coerce, item_schema = _compile_type(item_type) if item_type is not None else (_accept, {})
+
+            def coerce_sequence(value):
+                if not isinstance(value, (list, tuple)):
+                    raise _Invalid
+                return [item_coerce(item) for item in value]
+            schema = {'type': 'array'}
+            if item_schema:
+                schema['items'] = item_schema
+            return coerce_sequence, schema
+
+    # Прочие типы (классы FreeCAD, датаклассы) по JSON не приходят - не проверяем
+    return _accept, {}
+
+
+class ParameterSchema:
+    """Параметр функции: имя, тип, значение по умолчанию"""
+
+    __slots__ = ('name', 'annotation', 'default', 'required', 'coerce', 'schema')
+
+    def __init__(self, name: str, annotation, default):
+        self.name = name
+        self.default = default
+        self.required = default is _NO_DEFAULT
+        if annotation is _NO_DEFAULT and not self.required and default is not None:
+            # Без аннотации тип берется из значения по умолчанию (limit=10 -> int)
+            annotation = type(default) if type(default) in _SCALARS else _NO_DEFAULT
+        elif not self.required and default is None and annotation is not _NO_DEFAULT:
+            # label: str = None: None допускается как значение по умолчанию
+            annotation = Optional[annotation]
+        self.annotation = annotation
+        self.coerce, schema = _compile_type(annotation)
+        self.schema = dict(schema)
+        if not self.required and _is_json_value(default):
+            self.schema['default'] = default
+
+
+def _is_json_value(value) -> bool:
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def _description(function: Callable) -> str:
+    """Первый абзац документации функции"""
+    doc = inspect.getdoc(function) or ''
+    return ' '.join(doc.split('\n\n', 1)[0].split())
+
+
+class FunctionSchema:
+    """
+    Разобранная сигнатура функции реестра: проверка и приведение аргументов
+    вызова и JSON Schema для клиентов.
+    """
+
+    def __init__(self, parameters: List[ParameterSchema], var_keyword: bool, description: str = ''):
+        self.parameters = {parameter.name: parameter for parameter in parameters}
+        self.required = [parameter.name for parameter in parameters if parameter.required]
+        # Значения по умолчанию: вызовы f() и f(limit=10) равнозначны (ключ кэша результатов)
+        self.defaults = {parameter.name: parameter.default for parameter in parameters
+                         if not parameter.required and _is_json_value(parameter.default)}
+        # Функция принимает **kwargs: лишние аргументы передаются как есть
+        self.var_keyword = var_keyword
+        self.description = description
+
+    @classmethod
+    def from_callable(cls, function: Callable) -> Optional['FunctionSchema']:
+        """
+        Разбирает сигнатуру функции.
+
+        Returns:
+            FunctionSchema или None, если сигнатуру получить нельзя (встроенные функции)
+        """
+        try:
+            signature = inspect.signature(function)
+        except (TypeError, ValueError):
+            return None
+        try:
+            hints = typing.get_type_hints(function)
+        except Exception:
+            # Неразрешимые строковые аннотации: используем их как есть
+            hints = {}
+
+        parameters = []
+        var_keyword = False
+        for parameter in signature.parameters.values():
+            if parameter.kind is inspect.Parameter.VAR_KEYWORD:
+                var_keyword = True
+                continue
+            if parameter.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.POSITIONAL_ONLY):
+                # Аргументы передаются только по имени
+                continue
+            annotation = hints.get(parameter.name, parameter.annotation)
+            if isinstance(annotation, str):
+                annotation = _NO_DEFAULT
+            parameters.append(ParameterSchema(parameter.name, annotation, parameter.default))
+        return cls(parameters, var_keyword, _description(function))
+
+    def validate(self, arguments: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Проверяет аргументы вызова и приводит их к типам параметров.
+
+        Args:
+            arguments: Аргументы из сообщения
+
+        Returns:
+            dict: Аргументы для вызова функции
+
+        Raises:
+            ArgumentError: Со списком всех несоответствий
+        """
+        if arguments is None:
+            arguments = {}
+        if not isinstance(arguments, dict):
+            raise ArgumentError(f"Аргументы должны быть объектом, получено: {type(arguments).__name__}")
+
+        errors = []
+        validated = {}
+        for name, value in arguments.items():
+            parameter = self.parameters.get(name)
+            if parameter is None:
+                if self.var_keyword:
+                    validated[name] = value
+                else:
+                    errors.append(f"неизвестный аргумент '{name}'")
+                continue
+            try:
+                validated[name] = parameter.coerce(value)
+            except _Invalid:
+                errors.append(f"аргумент '{name}': ожидается {_type_name(parameter.annotation)}, "
+                              f"получено {value!r}")
+        for name in self.required:
+            if name not in arguments:
+                errors.append(f"не передан обязательный аргумент '{name}'")
+        if errors:
+            raise ArgumentError("; ".join(errors))
+        return validated
+
+    def json_schema(self) -> Dict[str, Any]:
+        """JSON Schema объекта аргументов"""
+        schema = {
+            'type': 'object',
+            'properties': {name: parameter.schema for name, parameter in self.parameters.items()},
+            'additionalProperties': self.var_keyword,
+        }
+        if self.required:
+            schema['required'] = list(self.required)
+        return schema
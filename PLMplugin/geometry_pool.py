@@ -0,0 +1,493 @@
+"""
+Пул headless-процессов FreeCAD (FreeCADCmd) для тяжелых геометрических задач.
+
+Разбор BREP, сравнение деталей булевыми операциями и объединение форм
+выполняются в отдельных процессах, не занимая главный поток FreeCAD и
+используя все ядра. Формы передаются BREP-файлами во временном каталоге пула,
+результаты возвращаются как concurrent.futures.Future.
+
+Рабочие процессы запускаются по мере появления заданий (не больше max_workers),
+упавший процесс перезапускается.
+"""
+
+import concurrent.futures
+import itertools
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Connection, answer_challenge, deliver_challenge
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.logger import log
+from binary_messages import BinaryPayload
+import geometry_worker
+
+# Время ожидания подключения запущенного рабочего процесса в секундах
+WORKER_START_TIMEOUT = 60.0
+# Переменная окружения с путем к FreeCADCmd (если он не находится автоматически)
+FREECAD_CMD_ENV = 'PLM_FREECAD_CMD'
+_FREECAD_CMD_NAMES = ('FreeCADCmd', 'freecadcmd', 'FreeCADCmd.exe')
+
+
+class GeometryWorkerError(Exception):
+    """Ошибка выполнения задания в рабочем процессе"""
+
+
+def default_workers() -> int:
+    """Количество рабочих процессов по умолчанию: все ядра, кроме одного, для GUI"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def find_freecad_cmd() -> str:
+    """
+    Ищет исполняемый файл headless FreeCAD.
+
+    Returns:
+        str: Путь к FreeCADCmd
+
+    Raises:
+        FileNotFoundError: Если FreeCADCmd не найден
+    """
+    configured = os.environ.get(FREECAD_CMD_ENV)
+    if configured:
+        return configured
+
+    candidates = []
+    try:
+        import FreeCAD
+        bin_dir = os.path.join(FreeCAD.getHomePath(), 'bin')
+        candidates.extend(os.path.join(bin_dir, name) for name in _FREECAD_CMD_NAMES)
+    except ImportError:
+        pass
+    # Рядом с исполняемым файлом FreeCAD (sys.executable внутри FreeCAD)
+    exe_dir = os.path.dirname(sys.executable)
+    candidates.extend(os.path.join(exe_dir, name) for name in _FREECAD_CMD_NAMES)
+
+    for candidate in candidates:
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    for name in _FREECAD_CMD_NAMES:
+        found = shutil.which(name)
+        if found:
+            return found
+    raise FileNotFoundError(
+        f"FreeCADCmd не найден; укажите путь в переменной окружения {FREECAD_CMD_ENV}"
+    )
+
+
+class _Job:
+    """Задание для рабочего процесса"""
+    __slots__ = ('task', 'args', 'kwargs', 'future')
+
+    def __init__(self, task, args, kwargs):
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+
+
+class GeometryWorkerPool:
+    """
+    Пул рабочих процессов FreeCADCmd.
+
+    Каждым процессом управляет свой поток-диспетчер: берет задание из общей
+    очереди, отправляет процессу и ждет ответа. Потокобезопасен.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, freecad_cmd: Optional[str] = None):
+        """
+        Args:
+            max_workers: Максимальное количество рабочих процессов (по умолчанию default_workers())
+            freecad_cmd: Путь к FreeCADCmd (по умолчанию find_freecad_cmd())
+        """
+        self.max_workers = max_workers or default_workers()
+        self.freecad_cmd = freecad_cmd
+        self.tmp_dir = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._jobs = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._listener = None
+        self._authkey = os.urandom(32)
+        self._lock = threading.Lock()
+        self._accept_lock = threading.Lock()
+        self._file_counter = itertools.count()
+        self._busy = 0
+        self._closed = False
+
+    def submit(self, task: str, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Ставит задание в очередь пула.
+
+        Args:
+            task: Имя задачи рабочего процесса (geometry_worker.TASKS)
+            *args, **kwargs: Аргументы задачи (должны сериализоваться pickle)
+
+        Returns:
+            Future: Результат задачи; при ошибке - GeometryWorkerError
+        """
+        if task not in geometry_worker.TASKS:
+            raise ValueError(f"Неизвестная задача пула: {task}")
+        job = _Job(task, args, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Пул геометрических процессов остановлен")
+            self._start_locked()
+            self.submitted += 1
+            # Новый диспетчер (и процесс) - только если все существующие заняты
+            if self._busy + self._jobs.qsize() >= len(self._threads) and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._dispatch, name=f"plm-geometry-{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._jobs.put(job)
+        return job.future
+
+    def temp_path(self, suffix: str = '.brep') -> str:
+        """Возвращает путь для нового файла во временном каталоге пула"""
+        with self._lock:
+            self._start_locked()
+            return os.path.join(self.tmp_dir, f"{next(self._file_counter)}{suffix}")
+
+    def write_shape(self, shape) -> str:
+        """
+        Записывает форму во временный BREP-файл для передачи рабочему процессу.
+
+        Args:
+            shape: Part.Shape, BREP-строка или байты BREP
+
+        Returns:
+            str: Путь к файлу
+        """
+        path = self.temp_path()
+        if isinstance(shape, str):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(shape)
+        elif isinstance(shape, (bytes, bytearray, memoryview)):
+            with open(path, 'wb') as f:
+                f.write(shape)
+        else:
+            shape.exportBrep(path)
+        return path
+
+    def compare_shapes(self, shape1, shape2, tolerance: float = 1e-6) -> concurrent.futures.Future:
+        """
+        Сравнивает геометрию двух форм в рабочем процессе.
+
+        Returns:
+            Future: bool - идентичны ли формы
+        """
+        paths = [self.write_shape(shape1), self.write_shape(shape2)]
+        future = self.submit('compare_shapes', paths[0], paths[1], tolerance)
+        future.add_done_callback(lambda _: self._remove_files(paths))
+        return future
+
+    def fuse_shapes(self, shapes: Sequence) -> concurrent.futures.Future:
+        """
+        Объединяет формы. Группы форм объединяются параллельно в разных
+        процессах, затем промежуточные результаты объединяются в один.
+
+        Args:
+            shapes: Формы (Part.Shape, BREP-строки или байты)
+
+        Returns:
+            Future: BinaryPayload с BREP объединенной формы
+        """
+        if not shapes:
+            raise ValueError("Нет форм для объединения")
+        paths = [self.write_shape(shape) for shape in shapes]
+        outer = concurrent.futures.Future()
+        outer.set_running_or_notify_cancel()
+
+        groups = max(1, min(self.max_workers, len(paths) // 2))
+        if groups == 1:
+            final = self.submit('fuse_shapes', paths, self.temp_path())
+            final.add_done_callback(lambda f: self._finish_fuse(f, outer, paths))
+            return outer
+
+        partials = [
+            self.submit('fuse_shapes', paths[index::groups], self.temp_path())
+            for index in range(groups)
+        ]
+        remaining = [len(partials)]
+        lock = threading.Lock()
+
+        def on_partial(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [f.exception() for f in partials if f.exception() is not None]
+            partial_paths = [f.result() for f in partials if f.exception() is None]
+            if errors:
+                self._remove_files(paths + partial_paths)
+                outer.set_exception(errors[0])
+                return
+            final = self.submit('fuse_shapes', partial_paths, self.temp_path())
+            final.add_done_callback(lambda f: self._finish_fuse(f, outer, paths + partial_paths))
+
+        for partial in partials:
+            partial.add_done_callback(on_partial)
+        return outer
+
+    def compare_objects(self, pairs: Sequence[Sequence[str]], tolerance: float = 1e-6) -> concurrent.futures.Future:
+        """
+        Сравнивает пары объектов активного документа параллельно.
+        Вызывается в главном потоке: формы выгружаются из документа сразу,
+        сравнение идет в рабочих процессах.
+
+        Args:
+            pairs: Пары имен объектов [[obj1_name, obj2_name], ...]
+            tolerance: Допустимая погрешность
+
+        Returns:
+            Future: Список {"obj1", "obj2", "identical"} или {"obj1", "obj2", "error"} по парам
+        """
+        doc = self._active_document()
+        futures = []
+        for obj1_name, obj2_name in pairs:
+            futures.append(self.compare_shapes(
+                self._object_shape(doc, obj1_name), self._object_shape(doc, obj2_name), tolerance
+            ))
+
+        def pair_result(index, future):
+            obj1_name, obj2_name = pairs[index]
+            if future.exception() is not None:
+                return {'obj1': obj1_name, 'obj2': obj2_name, 'error': str(future.exception())}
+            return {'obj1': obj1_name, 'obj2': obj2_name, 'identical': future.result()}
+
+        return self._gather(futures, lambda done: [pair_result(i, f) for i, f in enumerate(done)])
+
+    def fuse_objects(self, names: Sequence[str]) -> concurrent.futures.Future:
+        """
+        Объединяет объекты активного документа в один BREP (параллельный аналог
+        CADUtils.get_combined_brep_from_objects). Вызывается в главном потоке.
+
+        Args:
+            names: Имена объектов
+
+        Returns:
+            Future: BinaryPayload с BREP объединенной формы
+        """
+        doc = self._active_document()
+        return self.fuse_shapes([self._object_shape(doc, name) for name in names])
+
+    @staticmethod
+    def _active_document():
+        """Возвращает активный документ FreeCAD"""
+        import FreeCAD
+        if not FreeCAD.ActiveDocument:
+            raise Exception("Нет активного документа FreeCAD")
+        return FreeCAD.ActiveDocument
+
+    @staticmethod
+    def _object_shape(doc, name: str):
+        """Возвращает форму объекта по имени или метке"""
+        obj = doc.getObject(name) or next(iter(doc.getObjectsByLabel(name)), None)
+        if obj is None or not hasattr(obj, 'Shape'):
+            raise Exception(f"Объект с геометрией '{name}' не найден")
+        return obj.Shape
+
+    @staticmethod
+    def _gather(futures, transform) -> concurrent.futures.Future:
+        """Future, завершающийся transform(futures) после завершения всех futures"""
+        outer = concurrent.futures.Future()
+        outer.set_running_or_notify_cancel()
+        if not futures:
+            outer.set_result(transform([]))
+            return outer
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                outer.set_result(transform(futures))
+            except Exception as e:
+                outer.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+        return outer
+
+    def _finish_fuse(self, future, outer, paths) -> None:
+        """Читает объединенную форму и завершает внешний Future"""
+        try:
+            output_path = future.result()
+            with open(output_path, 'rb') as f:
+                data = f.read()
+            self._remove_files([output_path])
+            outer.set_result(BinaryPayload(data, 'application/x-brep'))
+        except Exception as e:
+            outer.set_exception(e)
+        finally:
+            self._remove_files(paths)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер пула и счетчики заданий"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'workers': len(self._processes),
+                'busy': self._busy,
+                'queued': self._jobs.qsize(),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'restarts': self.restarts,
+            }
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Останавливает диспетчеры и рабочие процессы, удаляет временные файлы"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        for process in list(self._processes.values()):
+            if process.poll() is None:
+                process.kill()
+        if self._listener is not None:
+            self._listener.close()
+        if self.tmp_dir:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        log("Пул геометрических процессов остановлен")
+
+    def _start_locked(self) -> None:
+        """Создает временный каталог и сокет для подключения процессов (под self._lock)"""
+        if self._listener is not None:
+            return
+        if self.freecad_cmd is None:
+            self.freecad_cmd = find_freecad_cmd()
+        self.tmp_dir = tempfile.mkdtemp(prefix='plm_geometry_')
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(self.max_workers)
+        listener.settimeout(WORKER_START_TIMEOUT)
+        self._listener = listener
+        log(f"Пул геометрических процессов: до {self.max_workers} процессов {self.freecad_cmd}")
+
+    def _spawn(self):
+        """
+        Запускает рабочий процесс и ждет его подключения.
+
+        Returns:
+            tuple: (Popen, Connection)
+        """
+        host, port = self._listener.getsockname()
+        env = dict(os.environ)
+        env[geometry_worker.ADDRESS_ENV] = f"{host}:{port}"
+        env[geometry_worker.AUTHKEY_ENV] = self._authkey.hex()
+        env[geometry_worker.PLUGIN_DIR_ENV] = os.path.dirname(os.path.abspath(__file__))
+        process = subprocess.Popen(
+            [self.freecad_cmd, os.path.abspath(geometry_worker.__file__)],
+            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        with self._lock:
+            self._processes[process.pid] = process
+
+        # Процессы подключаются в произвольном порядке; свой определяем по pid
+        try:
+            with self._accept_lock:
+                sock, _ = self._listener.accept()
+                sock.settimeout(None)
+                conn = Connection(sock.detach())
+                deliver_challenge(conn, self._authkey)
+                answer_challenge(conn, self._authkey)
+                pid = conn.recv()
+        except Exception:
+            # Процесс не подключился вовремя (FreeCADCmd не запустился или завис)
+            process.kill()
+            with self._lock:
+                self._processes.pop(process.pid, None)
+            raise
+        with self._lock:
+            own = self._processes.get(pid, process)
+        log(f"Запущен геометрический процесс {pid}")
+        return own, conn
+
+    def _dispatch(self) -> None:
+        """Цикл потока-диспетчера одного рабочего процесса"""
+        process = conn = None
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                with self._lock:
+                    self._busy += 1
+                try:
+                    ok, value, details = None, None, None
+                    for attempt in range(2):
+                        try:
+                            if conn is None:
+                                process, conn = self._spawn()
+                            conn.send((job.task, job.args, job.kwargs))
+                            ok, value, details = conn.recv()
+                            break
+                        except (EOFError, OSError) as e:
+                            # Процесс упал или не запустился: перезапускаем и повторяем задание один раз
+                            log(f"Геометрический процесс недоступен: {str(e)}")
+                            process, conn = self._discard(process, conn)
+                            with self._lock:
+                                self.restarts += 1
+                            ok, value = False, f"Рабочий процесс недоступен: {e!r}"
+                    if ok:
+                        job.future.set_result(value)
+                    else:
+                        job.future.set_exception(GeometryWorkerError(f"{value}\n{details or ''}".rstrip()))
+                    with self._lock:
+                        if ok:
+                            self.completed += 1
+                        else:
+                            self.failed += 1
+                finally:
+                    with self._lock:
+                        self._busy -= 1
+        finally:
+            if conn is not None:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            self._discard(process, conn)
+
+    def _discard(self, process, conn):
+        """Закрывает соединение и завершает процесс"""
+        if conn is not None:
+            conn.close()
+        if process is not None:
+            try:
+                process.wait(1.0)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            with self._lock:
+                self._processes.pop(process.pid, None)
+        return None, None
+
+    @staticmethod
+    def _remove_files(paths) -> None:
+        """Удаляет временные файлы заданий"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
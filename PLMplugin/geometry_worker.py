@@ -0,0 +1,99 @@
+"""
+Рабочий процесс пула геометрических вычислений (geometry_pool).
+
+Запускается пулом как скрипт headless FreeCAD: FreeCADCmd geometry_worker.py.
+Подключается к пулу по адресу из переменных окружения, получает задания
+(имя задачи, аргументы) и возвращает результаты. Формы передаются BREP-файлами
+во временном каталоге пула, поэтому по соединению идут только пути и мелкие значения.
+"""
+
+import os
+import sys
+import traceback
+
+ADDRESS_ENV = 'PLM_GEOMETRY_POOL_ADDRESS'
+AUTHKEY_ENV = 'PLM_GEOMETRY_POOL_AUTHKEY'
+PLUGIN_DIR_ENV = 'PLM_PLUGIN_DIR'
+
+
+def load_shape(path):
+    """Читает форму из BREP-файла"""
+    import Part
+    shape = Part.Shape()
+    shape.read(path)
+    return shape
+
+
+def compare_shapes(path1, path2, tolerance=1e-6):
+    """
+    Сравнивает геометрию двух форм (CADUtils.shapes_are_identical).
+
+    Returns:
+        bool: Идентичны ли формы
+    """
+    from utils.cad_utils import CADUtils
+    return bool(CADUtils.shapes_are_identical(load_shape(path1), load_shape(path2), tolerance))
+
+
+def fuse_shapes(paths, output_path):
+    """
+    Объединяет формы и записывает результат в BREP-файл.
+
+    Returns:
+        str: Путь к файлу с объединенной формой
+    """
+    shapes = [load_shape(path) for path in paths]
+    fused = shapes[0].fuse(shapes[1:]) if len(shapes) > 1 else shapes[0]
+    fused.exportBrep(output_path)
+    return output_path
+
+
+def shape_info(path):
+    """Возвращает краткую сводку формы (тип, объем, площадь, габариты)"""
+    from result_serializer import encode_shape
+    return encode_shape(load_shape(path))
+
+
+TASKS = {
+    'compare_shapes': compare_shapes,
+    'fuse_shapes': fuse_shapes,
+    'shape_info': shape_info,
+}
+
+
+def main():
+    """Цикл обработки заданий до закрытия соединения пулом"""
+    from multiprocessing.connection import Client
+
+    plugin_dir = os.environ.get(PLUGIN_DIR_ENV)
+    if plugin_dir and plugin_dir not in sys.path:
+        sys.path.insert(0, plugin_dir)
+
+    host, port = os.environ[ADDRESS_ENV].rsplit(':', 1)
+    conn = Client((host, int(port)), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    conn.send(os.getpid())
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            task, args, kwargs = job
+            try:
+                conn.send((True, TASKS[task](*args, **kwargs), None))
+            except Exception as e:
+                conn.send((False, f"{type(e).__name__}: {e}", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+# В процессе FreeCAD с GUI модуль только импортируется: переменные окружения
+# пула задаются лишь рабочим процессам
+if os.environ.get(ADDRESS_ENV):
+    try:
+        main()
+    finally:
+        # FreeCADCmd после выполнения скрипта может остаться в интерактивной консоли
+        os._exit(0)
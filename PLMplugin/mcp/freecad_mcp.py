@@ -22,13 +22,18 @@ async def send_to_freecad(command: dict) -> dict:
         return {"status": "error", "message": str(e)}
 
 @mcp.tool()
-async def run_script(script: str, result: Optional[str] = None) -> str:
+async def run_script(script: str, result: Optional[str] = None, session_id: Optional[str] = None,
+                     timeout: Optional[float] = None) -> str:
     """Выполняет Python-скрипт в контексте FreeCAD.
     
     Args:
         script: Python-скрипт для выполнения в FreeCAD.
         result: Опциональное имя переменной для результата. Если указано, будет добавлено в конец скрипта.
                Например, при значении "{{'document_name': doc.Name}}" будет добавлено "result = {'document_name': real_document_name}"
+        session_id: Опциональный идентификатор сессии (create_session). Переменные и функции,
+               определенные предыдущими скриптами сессии, остаются доступны.
+        timeout: Опциональный срок выполнения в секундах (по умолчанию без ограничения).
+               Скрипт, не уложившийся в срок, прерывается (в результате поле interrupted).
     
     Returns:
         JSON-строка, содержащая результат выполнения
@@ -47,6 +52,10 @@ async def run_script(script: str, result: Optional[str] = None) -> str:
                 "script": full_script
             }
         }
+        if session_id:
+            command["params"]["session_id"] = session_id
+        if timeout is not None:
+            command["params"]["timeout"] = timeout
         
         result = await send_to_freecad(command)
         return json.dumps(result, indent=2)
@@ -60,6 +69,82 @@ async def run_script(script: str, result: Optional[str] = None) -> str:
         }
         return json.dumps(error_result, indent=2)
 
+@mcp.tool()
+async def run_batch(scripts: list, session_id: Optional[str] = None, stop_on_error: bool = True,
+                    timeout: Optional[float] = None) -> str:
+    """Выполняет несколько Python-скриптов в FreeCAD одним запросом.
+    
+    Скрипты выполняются по порядку в одной транзакции документа; документ пересчитывается
+    один раз в конце. Быстрее, чем отдельные вызовы run_script для каждого изменения.
+    
+    Args:
+        scripts: Список Python-скриптов. Каждый скрипт может записать результат в переменную result.
+        session_id: Опциональный идентификатор сессии, общей для всех скриптов.
+        stop_on_error: Прекращать ли выполнение после первой ошибки (по умолчанию да).
+        timeout: Опциональный срок выполнения каждого скрипта в секундах.
+    
+    Returns:
+        JSON-строка со сводным результатом: список результатов скриптов с временем выполнения
+    """
+    try:
+        params = {
+            "items": [{"python_code": script} for script in scripts],
+            "stop_on_error": stop_on_error
+        }
+        if session_id:
+            params["session_id"] = session_id
+        if timeout is not None:
+            params["timeout"] = timeout
+        
+        result = await send_to_freecad({"type": "run_batch", "params": params})
+        return json.dumps(result, indent=2)
+        
+    except Exception as e:
+        error_result = {
+            'success': False,
+            'message': 'Ошибка при выполнении пакета скриптов',
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+        return json.dumps(error_result, indent=2)
+
+@mcp.tool()
+async def create_session(session_id: Optional[str] = None) -> str:
+    """Создает сессию выполнения скриптов FreeCAD.
+    
+    Скрипты, выполненные через run_script с этим session_id, разделяют пространство имен:
+    вспомогательные функции и найденные объекты достаточно определить один раз.
+    
+    Args:
+        session_id: Опциональный идентификатор сессии. По умолчанию генерируется случайный.
+    
+    Returns:
+        JSON-строка с описанием созданной сессии (поле session_id)
+    """
+    command = {
+        "type": "create_session",
+        "params": {"session_id": session_id} if session_id else {}
+    }
+    result = await send_to_freecad(command)
+    return json.dumps(result, indent=2)
+
+@mcp.tool()
+async def destroy_session(session_id: str) -> str:
+    """Закрывает сессию выполнения скриптов и освобождает ее пространство имен.
+    
+    Args:
+        session_id: Идентификатор сессии.
+    
+    Returns:
+        JSON-строка с результатом
+    """
+    command = {
+        "type": "destroy_session",
+        "params": {"session_id": session_id}
+    }
+    result = await send_to_freecad(command)
+    return json.dumps(result, indent=2)
+
 @mcp.tool()
 async def capture_part_view(part_name: str, view_type: str) -> str:
     """Делает скриншот детали и сохраняет его в файл.
@@ -107,25 +192,17 @@ async def compare_objects(obj1_name: str, obj2_name: str, tolerance: float = 1e-
         JSON-строка, содержащая результат сравнения.
     """
     try:
-        script = f"""
-import FreeCAD as App
-from utils.cad_utils import CADUtils
-
-try:
-    if not App.ActiveDocument:
-        raise Exception("Нет активного документа. Перед сравнением объектов нужно создать или открыть документ.")
-    identical = CADUtils.object_are_identical("{obj1_name}", "{obj2_name}", {tolerance})
-    result = {{"success": True, "identical": identical}}
-except Exception as e:
-    import traceback
-    result = {{"success": False, "error": str(e), "traceback": traceback.format_exc()}}
-"""
-        
-        # Отправляем скрипт через сокет
+        # Скрипт сравнения хранится в FreeCAD как шаблон и компилируется один раз,
+        # поэтому передаем только идентификатор шаблона и аргументы
         command = {
-            "type": "run_script",
+            "type": "run_template",
             "params": {
-                "script": script
+                "template_id": "compare_objects",
+                "arguments": {
+                    "obj1_name": obj1_name,
+                    "obj2_name": obj2_name,
+                    "tolerance": tolerance
+                }
             }
         }
         
@@ -6,6 +6,7 @@ from PySide2 import QtCore, QtWidgets
 import FreeCAD as App
 import FreeCADGui as Gui
 from freecad_executor import FreeCADExecutor
+from result_serializer import dumps_bytes
 
 class FreeCADMCPServer:
     def __init__(self, host=FREECAD_HOST, port=FREECAD_PORT):
@@ -73,8 +74,8 @@ class FreeCADMCPServer:
                                 command = json.loads(self.buffer.decode('utf-8'))
                                 self.buffer = b''
                                 response = self.execute_command(command)
-                                response_json = json.dumps(response)
-                                self.client.sendall(response_json.encode('utf-8'))
+                                # Результат с типами FreeCAD (Vector, Placement, Shape) сериализуется за один проход
+                                self.client.sendall(dumps_bytes(response))
                             except json.JSONDecodeError:
                                 pass
                         else:
@@ -107,6 +108,10 @@ class FreeCADMCPServer:
             
             handlers = {
                 "run_script": self.handle_run_script,
+                "run_template": self.handle_run_template,
+                "run_batch": self.handle_run_batch,
+                "create_session": self.handle_create_session,
+                "destroy_session": self.handle_destroy_session,
                 "capture_part_view": self.handle_capture_part_view
             }
             
@@ -128,10 +133,13 @@ class FreeCADMCPServer:
             traceback.print_exc()
             return {"status": "error", "message": str(e)}
 
-    def handle_run_script(self, script):
+    def handle_run_script(self, script, session_id=None, timeout=None):
         try:
-            # Используем executor для выполнения скрипта
-            result = self.executor.execute_code(script, send_result=False)
+            # Используем executor для выполнения скрипта (в сессии, если она указана);
+            # скрипт, не уложившийся в срок, прерывается, чтобы не заморозить FreeCAD
+            result = self.executor.execute_code(
+                script, send_result=False, session_id=session_id, timeout=timeout
+            )
             return result
         except Exception as e:
             return {
@@ -141,6 +149,43 @@ class FreeCADMCPServer:
                 "traceback": traceback.format_exc()
             }
 
+    def handle_run_template(self, template_id, arguments=None, session_id=None, timeout=None):
+        try:
+            # Шаблон берется из кэша скомпилированных скриптов executor
+            result = self.executor.execute_template(
+                template_id, arguments, send_result=False, session_id=session_id, timeout=timeout
+            )
+            return result
+        except Exception as e:
+            return {
+                "success": False,
+                "message": "Ошибка при выполнении шаблона скрипта",
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }
+
+    def handle_run_batch(self, items, session_id=None, timeout=None, stop_on_error=True):
+        try:
+            # Все скрипты выполняются в одной транзакции с одним пересчетом документа
+            result = self.executor.execute_batch(
+                items, send_result=False, session_id=session_id, timeout=timeout, stop_on_error=stop_on_error
+            )
+            return result
+        except Exception as e:
+            return {
+                "success": False,
+                "message": "Ошибка при выполнении пакета скриптов",
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }
+
+    def handle_create_session(self, session_id=None):
+        # Пространство имен сессии сохраняется между вызовами run_script
+        return self.executor.create_session(session_id)
+
+    def handle_destroy_session(self, session_id):
+        return {"destroyed": self.executor.destroy_session(session_id)}
+
     def handle_capture_part_view(self, part_name, view_type):
         try:
             from mcp.mcp_tools import PartViewCapture
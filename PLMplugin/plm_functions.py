@@ -1,8 +1,14 @@
 import json
 import traceback
-from function_registry import FunctionRegistry
+from function_registry import FunctionRegistry, AFFINITY_ANY, AFFINITY_WORKER
+from binary_messages import BinaryPayload
 from utils.logger import log
 
+# Тег кэша для результатов запросов к объектам PLM
+CACHE_TAG_PLM_OBJECTS = 'plm_objects'
+# Срок жизни закэшированных результатов запросов к PLM в секундах
+PLM_QUERY_CACHE_TTL = 30
+
 class PLMFunctions:
     """
     Класс с функциями для работы с PLM, которые можно регистрировать в FunctionRegistry.
@@ -46,9 +52,25 @@ class PLMFunctions:
         function_registry.register_function("find_all_parts", self.find_all_parts)
         function_registry.register_function("go_to_supersystem", self.go_to_supersystem)
         function_registry.register_function("go_to_subsystem", self.go_to_subsystem)
-        function_registry.register_function("upload_active_part", self.upload_active_part)
-        function_registry.register_function("save_brep", self.save_brep)
-        function_registry.register_function("save_position", self.save_position)
+        # Функции, изменяющие объекты PLM, сбрасывают закэшированные результаты запросов
+        function_registry.register_function("upload_active_part", self.upload_active_part,
+                                            invalidates=(CACHE_TAG_PLM_OBJECTS,))
+        function_registry.register_function("save_brep", self.save_brep, invalidates=(CACHE_TAG_PLM_OBJECTS,))
+        function_registry.register_function("save_position", self.save_position, invalidates=(CACHE_TAG_PLM_OBJECTS,))
+        function_registry.register_function("export_brep", self.export_brep)
+        function_registry.register_function("capture_part_view", self.capture_part_view)
+        # Запросы к PLM API без документа и виджетов выполняются в пуле рабочих потоков,
+        # их результаты кэшируются до изменения объектов PLM
+        for name, function in (
+            ("lookup_parts", self.lookup_parts),
+            ("list_top_level_parts", self.list_top_level_parts),
+            ("count_parts", self.count_parts),
+        ):
+            function_registry.register_function(
+                name, function, affinity=AFFINITY_WORKER,
+                cache_ttl=PLM_QUERY_CACHE_TTL, cache_tags=(CACHE_TAG_PLM_OBJECTS,)
+            )
+        function_registry.register_function("get_http_pool_stats", self.get_http_pool_stats, affinity=AFFINITY_ANY)
         
         log("PLMFunctions: Функции PLM успешно зарегистрированы")
     
@@ -292,6 +314,155 @@ class PLMFunctions:
             log(f"PLMFunctions.save_position: {e}\n{traceback.format_exc()}")
             return {"success": False, "error": str(e)}
 
+    def export_brep(self, label: str = None):
+        """
+        Экспортирует BREP объекта активного документа и возвращает его
+        сырыми данными (ответ уходит бинарным сообщением без JSON-экранирования).
+
+        Args:
+            label (str): Label объекта; если не указан, берется первое тело с геометрией
+
+        Returns:
+            dict: Результат операции с полем brep (BinaryPayload)
+        """
+        try:
+            import FreeCAD
+            from utils.cad_utils import CADUtils
+
+            doc = FreeCAD.ActiveDocument
+            if not doc:
+                return {"success": False, "error": "Нет активного документа FreeCAD"}
+
+            if label:
+                obj = CADUtils.get_object_by_label(label)
+                if not obj or not hasattr(obj, 'Shape'):
+                    return {"success": False, "error": f"Объект с геометрией '{label}' не найден"}
+            else:
+                obj = next(
+                    (o for o in doc.Objects if hasattr(o, 'Shape') and o.Shape and not o.Shape.isNull()),
+                    None
+                )
+                if obj is None:
+                    return {"success": False, "error": "Не найдено ни одного тела с геометрией в активном документе"}
+
+            brep_string = obj.Shape.exportBrepToString()
+            return {
+                "success": True,
+                "label": obj.Label,
+                "brep": BinaryPayload(brep_string.encode('utf-8'), 'application/x-brep'),
+            }
+        except ImportError:
+            log("PLMFunctions.export_brep: модуль FreeCAD недоступен")
+            return {"success": False, "error": "Модуль FreeCAD недоступен"}
+        except Exception as e:
+            log(f"PLMFunctions.export_brep: {e}\n{traceback.format_exc()}")
+            return {"success": False, "error": str(e)}
+
+    def capture_part_view(self, part_name: str, view_type: str = "isometric", width: int = 800, height: int = 600):
+        """
+        Делает скриншот детали и возвращает PNG сырыми данными, без base64.
+
+        Args:
+            part_name (str): Label детали
+            view_type (str): 'front', 'top', 'right', 'left', 'rear', 'bottom', 'isometric'
+            width (int): Ширина изображения в пикселях
+            height (int): Высота изображения в пикселях
+
+        Returns:
+            dict: Результат операции с полем image (BinaryPayload)
+        """
+        try:
+            from mcp.mcp_tools import PartViewCapture
+
+            image_data = PartViewCapture.capture_part_view(part_name, view_type, None, width, height)
+            if not image_data:
+                return {"success": False, "error": "Не удалось получить изображение"}
+            return {
+                "success": True,
+                "part_name": part_name,
+                "view_type": view_type,
+                "image": BinaryPayload(image_data, 'image/png'),
+            }
+        except Exception as e:
+            log(f"PLMFunctions.capture_part_view: {e}\n{traceback.format_exc()}")
+            return {"success": False, "error": str(e)}
+
+    def lookup_parts(self, part_name: str):
+        """
+        Ищет детали по имени в PLM и возвращает найденные объекты,
+        не заполняя дерево результатов (в отличие от search_part)
+
+        Args:
+            part_name (str): Имя детали для поиска
+
+        Returns:
+            dict: Результат операции с полем objects
+        """
+        return self._get_json("/api/basic_object", query_params={"name": part_name}, field="objects")
+
+    def list_top_level_parts(self, limit: int = 10, offset: int = 0):
+        """
+        Возвращает детали верхнего уровня из PLM, не заполняя дерево результатов
+        (в отличие от find_all_parts)
+
+        Args:
+            limit (int): Максимальное количество результатов
+            offset (int): Смещение результатов
+
+        Returns:
+            dict: Результат операции с полем objects
+        """
+        return self._get_json("/api/basic_objects/top_level",
+                              query_params={"limit": limit, "offset": offset}, field="objects")
+
+    def count_parts(self):
+        """
+        Возвращает количество объектов в PLM
+
+        Returns:
+            dict: Результат операции с полем count
+        """
+        return self._get_json("/api/basic_objects/count", field="count")
+
+    def get_http_pool_stats(self):
+        """
+        Возвращает метрики пула keep-alive соединений с PLM API
+        (размер пула, количество созданных и переиспользованных соединений)
+
+        Returns:
+            dict: Метрики пула
+        """
+        if not self.main_window:
+            return {"success": False, "error": "Главное окно не инициализировано"}
+        return {"success": True, "pool": self.main_window.api_client.get_pool_stats()}
+
+    def _get_json(self, url: str, query_params: dict = None, field: str = "data"):
+        """
+        Выполняет GET-запрос к PLM API через APIClient главного окна.
+        Виджеты не затрагиваются, поэтому метод можно вызывать из рабочего потока.
+
+        Args:
+            url (str): Путь запроса
+            query_params (dict): Параметры запроса
+            field (str): Имя поля результата для ответа API
+
+        Returns:
+            dict: Результат операции
+        """
+        if not self.main_window:
+            return {"success": False, "error": "Главное окно не инициализировано"}
+
+        try:
+            data = json.loads(self.main_window.api_client.send_get_request(url, query_params=query_params))
+            if isinstance(data, dict):
+                error_msg = data.get('error') or data.get('error_message')
+                if error_msg:
+                    return {"success": False, "error": str(error_msg)}
+            return {"success": True, field: data}
+        except Exception as e:
+            log(f"PLMFunctions: Ошибка запроса {url}: {e}\n{traceback.format_exc()}")
+            return {"success": False, "error": str(e)}
+
     def _save_single_body(self, doc, module_id: str, api_client):
         """
         Находит первое тело с Shape в документе, экспортирует BREP и патчит модуль.
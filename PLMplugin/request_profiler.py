@@ -0,0 +1,233 @@
+"""
+Профилирование отдельных запросов по флагу profile в сообщении сервера.
+
+Ответ на запрос с флагом profile содержит поле profile с разбивкой времени
+(в миллисекундах):
+    parse_ms      - разбор JSON сообщения
+    queue_wait_ms - ожидание в очереди главного потока Qt (сигнал)
+    execution_ms  - выполнение скрипта или функции без пересчета документа
+    recompute_ms  - пересчет документа (любые вызовы Document.recompute)
+    serialize_ms  - сериализация ответа при отправке (RequestProfile.serialize)
+    total_ms      - от получения сообщения до готовности ответа
+и, если запрошено ("profile": {"top": N}), N самых дорогих функций по данным cProfile.
+
+cProfile включается только при top > 0: без него фазы замеряются таймером.
+В процессе может работать только один профилировщик (в Python 3.12+ второй
+не запускается), поэтому запрос, пришедший во время профилирования другого,
+выполняется под таймером, а в ответе отмечается profiler_busy.
+
+Время пересчета не зависит от cProfile: его замеряет наблюдатель документов
+FreeCAD (slotBeforeRecomputeDocument/slotRecomputedDocument), который
+регистрируется при первом профилировании.
+"""
+
+import cProfile
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from result_serializer import dumps_bytes, register_encoder
+
+# Количество функций в отчете cProfile по умолчанию и максимальное
+DEFAULT_PROFILE_TOP = 20
+MAX_PROFILE_TOP = 200
+
+# Занят, пока выполняется блок под cProfile
+_profiler_lock = threading.Lock()
+
+
+class _RecomputeTimer(threading.local):
+    """
+    Наблюдатель документов FreeCAD, суммирующий время пересчетов по потокам.
+    Вложенные пересчеты (пересчет одного документа из другого) считаются один раз.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.depth = 0
+        self.started = 0.0
+
+    def slotBeforeRecomputeDocument(self, doc):
+        if not self.depth:
+            self.started = time.perf_counter()
+        self.depth += 1
+
+    def slotRecomputedDocument(self, doc):
+        if not self.depth:
+            return
+        self.depth -= 1
+        if not self.depth:
+            self.total += time.perf_counter() - self.started
+
+
+_recompute_timer = _RecomputeTimer()
+_recompute_timer_lock = threading.Lock()
+_recompute_timer_registered = False
+
+
+def _register_recompute_timer() -> None:
+    """Регистрирует наблюдатель пересчетов, если FreeCAD доступен"""
+    global _recompute_timer_registered
+    with _recompute_timer_lock:
+        if _recompute_timer_registered:
+            return
+        _recompute_timer_registered = True
+        try:
+            import FreeCAD
+            FreeCAD.addDocumentObserver(_recompute_timer)
+        except (ImportError, AttributeError):
+            pass
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class RequestProfile:
+    """Замеры времени одного запроса"""
+
+    def __init__(self, received: Optional[float] = None, top: int = 0):
+        """
+        Args:
+            received: Момент получения сообщения (time.perf_counter)
+            top: Количество функций в отчете cProfile (0 - без отчета)
+        """
+        self.received = received if received is not None else time.perf_counter()
+        self.top = max(0, min(int(top), MAX_PROFILE_TOP))
+        self.phases: Dict[str, float] = {}
+        self._dispatched = None
+        self._stats = None
+        self._profiler_busy = False
+        # Метка на месте отчета, пока ответ сериализуется (serialize)
+        self._placeholder = None
+
+    @classmethod
+    def from_message(cls, value, received: float) -> Optional['RequestProfile']:
+        """
+        Создает профиль по значению поля profile сообщения.
+
+        Args:
+            value: true, {"top": N} или отсутствующее значение
+            received: Момент получения сообщения
+
+        Returns:
+            RequestProfile или None, если профилирование не запрошено
+        """
+        if isinstance(value, dict):
+            return cls(received, value.get('top', DEFAULT_PROFILE_TOP))
+        if value:
+            return cls(received)
+        return None
+
+    def mark_parsed(self) -> None:
+        """Отмечает окончание разбора сообщения"""
+        now = time.perf_counter()
+        self.phases['parse'] = now - self.received
+        self._dispatched = now
+
+    def mark_started(self) -> None:
+        """Отмечает начало обработки (в главном потоке или потоке прослушивания)"""
+        if self._dispatched is not None:
+            self.phases['queue_wait'] = time.perf_counter() - self._dispatched
+
+    @contextmanager
+    def phase(self, name: str):
+        """Добавляет время выполнения блока к фазе name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def execution(self):
+        """
+        Замеряет выполнение блока, выделяя из него время пересчета документа.
+        При top > 0 блок выполняется под cProfile (если профилировщик не занят).
+        """
+        _register_recompute_timer()
+        profiler = self._start_profiler() if self.top else None
+        recompute_before = _recompute_timer.total
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+                self._stats = pstats.Stats(profiler)
+            recompute = _recompute_timer.total - recompute_before
+            self.phases['execution'] = self.phases.get('execution', 0.0) + max(0.0, elapsed - recompute)
+            self.phases['recompute'] = self.phases.get('recompute', 0.0) + recompute
+
+    def _start_profiler(self) -> Optional[cProfile.Profile]:
+        """Включает cProfile; None, если профилировщик уже работает"""
+        if not _profiler_lock.acquire(blocking=False):
+            self._profiler_busy = True
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Активен другой инструмент профилирования (например, отладчик)
+            _profiler_lock.release()
+            self._profiler_busy = True
+            return None
+        return profiler
+
+    def top_functions(self) -> List[Dict[str, Any]]:
+        """Самые дорогие функции по суммарному времени"""
+        if self._stats is None or not self.top:
+            return []
+        entries = sorted(self._stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                'function': name if filename == '~' else f"{filename}:{line}({name})",
+                'calls': calls,
+                'total_ms': _ms(total),
+                'cumulative_ms': _ms(cumulative),
+            }
+            for (filename, line, name), (_, calls, total, cumulative, _) in entries[:self.top]
+        ]
+
+    def serialize(self, value) -> bytes:
+        """
+        Сериализует ответ, в который вложен этот профиль, и замеряет фазу serialize.
+        На месте профиля сериализуется метка, которую затем заменяет отчет
+        с уже известным временем сериализации: ответ сериализуется один раз.
+
+        Args:
+            value: Ответ или метаданные бинарного сообщения
+
+        Returns:
+            bytes: JSON с отчетом профиля
+        """
+        self._placeholder = f'request-profile-{uuid.uuid4().hex}'
+        try:
+            with self.phase('serialize'):
+                body = dumps_bytes(value)
+        finally:
+            placeholder, self._placeholder = self._placeholder, None
+        return body.replace(dumps_bytes(placeholder), dumps_bytes(self.report()), 1)
+
+    def to_json(self):
+        """Представление профиля в JSON: отчет или, во время serialize, метка"""
+        return self._placeholder if self._placeholder is not None else self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """Возвращает разбивку времени для поля profile ответа"""
+        report = {f'{name}_ms': _ms(value) for name, value in self.phases.items()}
+        report['total_ms'] = _ms(time.perf_counter() - self.received)
+        top = self.top_functions()
+        if top:
+            report['top'] = top
+        if self._profiler_busy:
+            report['profiler_busy'] = True
+        return report
+
+
+register_encoder(RequestProfile, RequestProfile.to_json)
@@ -0,0 +1,196 @@
+"""
+Сериализация результатов скриптов и функций в JSON.
+
+Результат сериализуется один раз, сразу в байты для текстового фрейма.
+Типы FreeCAD кодируются зарегистрированными кодировщиками:
+    Vector, Rotation    - массив координат / кватернион
+    Placement, Matrix   - матрица 4x4 (список строк)
+    BoundBox            - словарь min/max
+    Shape               - краткая сводка (тип, объем, площадь, габариты, количество элементов)
+    DocumentObject      - имя, метка и тип объекта
+    BinaryPayload       - ссылка на сырые данные (тип и размер); сами данные
+                          передаются бинарным сообщением
+Для остальных типов используется str(). Если установлен orjson, сериализация
+выполняется им.
+"""
+
+import json
+from typing import Any, Callable, Dict
+
+from binary_messages import BinaryPayload
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Кодировщики по типу; для подклассов ищется ближайший зарегистрированный предок
+_encoders: Dict[type, Callable[[Any], Any]] = {}
+# Найденный кодировщик для каждого встреченного типа (None - str())
+_resolved: Dict[type, Callable[[Any], Any]] = {}
+_freecad_registered = False
+_UNRESOLVED = object()
+
+
+def register_encoder(cls: type, encoder: Callable[[Any], Any]) -> None:
+    """
+    Регистрирует кодировщик для типа и его подклассов.
+
+    Args:
+        cls: Тип значения
+        encoder: Функция, возвращающая JSON-совместимое представление значения
+    """
+    _encoders[cls] = encoder
+    _resolved.clear()
+
+
+def encode_vector(vector) -> list:
+    """Vector -> [x, y, z]"""
+    return [vector.x, vector.y, vector.z]
+
+
+def encode_matrix(matrix) -> list:
+    """Matrix -> матрица 4x4 по строкам"""
+    values = list(matrix.A)
+    return [values[0:4], values[4:8], values[8:12], values[12:16]]
+
+
+def encode_placement(placement) -> list:
+    """Placement -> матрица преобразования 4x4"""
+    return encode_matrix(placement.toMatrix())
+
+
+def encode_rotation(rotation) -> list:
+    """Rotation -> кватернион [x, y, z, w]"""
+    return list(rotation.Q)
+
+
+def encode_bound_box(box) -> Dict[str, list]:
+    """BoundBox -> {'min': [...], 'max': [...]}"""
+    return {
+        'min': [box.XMin, box.YMin, box.ZMin],
+        'max': [box.XMax, box.YMax, box.ZMax],
+    }
+
+
+def encode_shape(shape) -> Dict[str, Any]:
+    """Краткая сводка формы; сама геометрия передается как BinaryPayload с BREP"""
+    if shape.isNull():
+        return {'shape_type': None, 'is_null': True}
+    return {
+        'shape_type': shape.ShapeType,
+        'volume': shape.Volume,
+        'area': shape.Area,
+        'bound_box': encode_bound_box(shape.BoundBox),
+        'solids': len(shape.Solids),
+        'faces': len(shape.Faces),
+        'edges': len(shape.Edges),
+        'vertexes': len(shape.Vertexes),
+        'is_valid': shape.isValid(),
+    }
+
+
+def encode_document_object(obj) -> Dict[str, Any]:
+    """DocumentObject -> ссылка на объект документа"""
+    return {'name': obj.Name, 'label': obj.Label, 'type_id': obj.TypeId}
+
+
+def encode_binary_payload(payload: BinaryPayload) -> Dict[str, Any]:
+    """BinaryPayload внутри JSON -> тип и размер данных"""
+    return {'binary': payload.content_type, 'size': len(payload.data)}
+
+
+def _register_freecad_encoders() -> None:
+    """Регистрирует кодировщики типов FreeCAD, если FreeCAD доступен"""
+    global _freecad_registered
+    _freecad_registered = True
+    try:
+        import FreeCAD
+    except ImportError:
+        return
+
+    for name, encoder in (
+        ('Vector', encode_vector),
+        ('Matrix', encode_matrix),
+        ('Placement', encode_placement),
+        ('Rotation', encode_rotation),
+        ('BoundBox', encode_bound_box),
+    ):
+        cls = getattr(FreeCAD, name, None)
+        if isinstance(cls, type):
+            register_encoder(cls, encoder)
+    try:
+        register_encoder(FreeCAD.DocumentObject, encode_document_object)
+    except AttributeError:
+        pass
+    try:
+        import Part
+        register_encoder(Part.Shape, encode_shape)
+    except (ImportError, AttributeError):
+        pass
+
+
+def _find_encoder(cls: type):
+    """Ищет кодировщик для типа по цепочке наследования"""
+    for base in cls.__mro__:
+        encoder = _encoders.get(base)
+        if encoder is not None:
+            return encoder
+    return None
+
+
+def _default(value):
+    """Кодирует значение, которое не поддерживается JSON напрямую"""
+    cls = type(value)
+    encoder = _resolved.get(cls, _UNRESOLVED)
+    if encoder is _UNRESOLVED:
+        if not _freecad_registered:
+            _register_freecad_encoders()
+        encoder = _resolved[cls] = _find_encoder(cls)
+    if encoder is not None:
+        return encoder(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return encode_binary_payload(BinaryPayload(bytes(value)))
+    return str(value)
+
+
+register_encoder(BinaryPayload, encode_binary_payload)
+
+if orjson is not None:
+    # Датаклассы (BinaryPayload) кодируются зарегистрированными кодировщиками, а не полями
+    _ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+                       | getattr(orjson, 'OPT_SERIALIZE_NUMPY', 0))
+
+    def dumps_bytes(value) -> bytes:
+        """
+        Сериализует значение в JSON (UTF-8) за один проход.
+
+        Args:
+            value: Результат или сообщение
+
+        Returns:
+            bytes: JSON для отправки текстовым фреймом
+        """
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(value) -> bytes:
+        """
+        Сериализует значение в JSON (UTF-8) за один проход.
+
+        Args:
+            value: Результат или сообщение
+
+        Returns:
+            bytes: JSON для отправки текстовым фреймом
+        """
+        return _encoder.encode(value).encode('utf-8')
+
+
+def dumps(value) -> str:
+    """Сериализует значение в JSON-строку (для UI и логов)"""
+    return dumps_bytes(value).decode('utf-8')
+
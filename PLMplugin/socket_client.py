@@ -1,167 +1,1379 @@
 import socket
 import base64
 import os
+import random
 import struct
+import codecs
+import zlib
+import threading
+import selectors
+import time
+from collections import deque
 from utils.logger import log
 
-def create_websocket_client(host, port):
-    # Установление TCP-соединения
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(10)  # Добавляем таймаут
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Размер блока для маскирования без NumPy (кратен 4, чтобы фаза маски не сдвигалась)
+MASK_CHUNK_SIZE = 65536
+_MASK_CHUNK_KEYS = {}
+
+
+def apply_mask(buffer, mask_key):
+    """
+    Накладывает (или снимает) маску WebSocket на весь буфер на месте.
+
+    Вместо побайтового цикла XOR выполняется словами: через NumPy, если он
+    доступен, иначе через целые числа Python блоками по MASK_CHUNK_SIZE байт.
+
+    Args:
+        buffer: Изменяемый буфер (bytearray или memoryview на bytearray)
+        mask_key: 4 байта маски
+    """
+    view = memoryview(buffer).cast('B')
+    length = len(view)
+    if not length:
+        return
+
+    if np is not None:
+        words = length // 4
+        if words:
+            data = np.frombuffer(view, dtype=np.uint32, count=words)
+            data ^= np.frombuffer(mask_key, dtype=np.uint32)[0]
+        for i in range(words * 4, length):
+            view[i] ^= mask_key[i % 4]
+        return
+
+    full_key = _MASK_CHUNK_KEYS.get(mask_key)
+    if full_key is None:
+        if len(_MASK_CHUNK_KEYS) > 64:
+            _MASK_CHUNK_KEYS.clear()
+        full_key = int.from_bytes(mask_key * (MASK_CHUNK_SIZE // 4), 'little')
+        _MASK_CHUNK_KEYS[mask_key] = full_key
+
+    offset = 0
+    while offset + MASK_CHUNK_SIZE <= length:
+        chunk = view[offset:offset + MASK_CHUNK_SIZE]
+        chunk[:] = (int.from_bytes(chunk, 'little') ^ full_key).to_bytes(MASK_CHUNK_SIZE, 'little')
+        offset += MASK_CHUNK_SIZE
+
+    tail = length - offset
+    if tail:
+        tail_key = int.from_bytes((mask_key * (tail // 4 + 1))[:tail], 'little')
+        chunk = view[offset:]
+        chunk[:] = (int.from_bytes(chunk, 'little') ^ tail_key).to_bytes(tail, 'little')
+
+
+def mask_payload(data, mask_key):
+    """
+    Возвращает замаскированную копию данных.
+
+    Args:
+        data: Исходные данные (bytes, bytearray или memoryview)
+        mask_key: 4 байта маски
+
+    Returns:
+        bytearray: Замаскированные данные
+    """
+    masked = bytearray(data)
+    apply_mask(masked, mask_key)
+    return masked
+
+
+class FrameReader:
+    """
+    Буферизованное чтение из сокета с точным количеством байт.
+
+    Данные принимаются через recv_into в заранее выделенный буфер, поэтому
+    заголовки фреймов разбираются без лишних системных вызовов, а большие
+    полезные нагрузки читаются напрямую в целевой буфер без перевыделений.
+    """
+
+    def __init__(self, sock, buffer_size=262144, initial=b''):
+        """
+        Args:
+            sock: Подключенный сокет
+            buffer_size: Размер внутреннего буфера приема
+            initial: Уже полученные байты (например, остаток после handshake)
+        """
+        self.sock = sock
+        self._buffer = bytearray(max(buffer_size, len(initial)))
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = len(initial)
+        self._buffer[:self._end] = initial
+
+    def pending(self):
+        """Возвращает количество уже принятых, но не прочитанных байт"""
+        return self._end - self._start
+
+    def _fill(self):
+        """Дочитывает данные из сокета во внутренний буфер"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer):
+            # Сдвигаем непрочитанный хвост в начало буфера
+            remaining = self._end - self._start
+            self._buffer[:remaining] = self._view[self._start:self._end]
+            self._start, self._end = 0, remaining
+
+        received = self.sock.recv_into(self._view[self._end:])
+        if not received:
+            raise ConnectionError("Соединение закрыто сервером")
+        self._end += received
+
+    def wait_for_data(self):
+        """
+        Блокируется до появления хотя бы одного байта.
+
+        Raises:
+            socket.timeout: Если данные не пришли за время таймаута сокета
+        """
+        if self._start == self._end:
+            self._fill()
+
+    def read_exact(self, size):
+        """
+        Читает ровно size байт (предназначено для заголовков и служебных полей).
+
+        Returns:
+            bytes: Прочитанные данные
+        """
+        if size > len(self._buffer):
+            data = bytearray(size)
+            self.read_into(data)
+            return bytes(data)
+        while self._end - self._start < size:
+            self._fill_in_frame()
+        data = bytes(self._view[self._start:self._start + size])
+        self._start += size
+        return data
+
+    def read_into(self, target):
+        """
+        Заполняет target ровно на всю длину.
+
+        Сначала копируются уже буферизованные байты, остальное принимается
+        напрямую в target через recv_into.
+
+        Args:
+            target: Изменяемый буфер (bytearray или memoryview)
+        """
+        view = memoryview(target).cast('B')
+        size = len(view)
+        buffered = min(size, self._end - self._start)
+        if buffered:
+            view[:buffered] = self._view[self._start:self._start + buffered]
+            self._start += buffered
+
+        offset = buffered
+        while offset < size:
+            try:
+                received = self.sock.recv_into(view[offset:])
+            except socket.timeout:
+                raise ConnectionError("Истек таймаут при получении данных фрейма")
+            if not received:
+                raise ConnectionError("Соединение закрыто до получения всех данных")
+            offset += received
+
+    def skip(self, size):
+        """Пропускает size байт, не накапливая их в памяти"""
+        while size > 0:
+            if self._start == self._end:
+                self._fill_in_frame()
+            step = min(size, self._end - self._start)
+            self._start += step
+            size -= step
+
+    def read_until(self, delimiter, limit=65536):
+        """
+        Читает данные до разделителя включительно (используется для HTTP handshake).
+        Байты после разделителя остаются в буфере.
+
+        Returns:
+            bytes: Данные вместе с разделителем
+        """
+        while True:
+            index = self._buffer.find(delimiter, self._start, self._end)
+            if index != -1:
+                end = index + len(delimiter)
+                data = bytes(self._view[self._start:end])
+                self._start = end
+                return data
+            if self._end - self._start >= limit:
+                raise Exception(f"Разделитель не найден в первых {limit} байтах ответа")
+            self._fill()
+
+    def _fill_in_frame(self):
+        """Дочитывает данные посреди фрейма: таймаут здесь означает разрыв потока"""
+        try:
+            self._fill()
+        except socket.timeout:
+            raise ConnectionError("Истек таймаут при получении данных фрейма")
+
+
+# Максимальный размер одного исходящего фрейма; более длинные сообщения фрагментируются
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024
+# Максимальный размер входящего сообщения после сборки всех фрагментов
+DEFAULT_MAX_MESSAGE_SIZE = 128 * 1024 * 1024
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+def build_frame_header(opcode, length, fin=True, rsv1=False):
+    """
+    Формирует заголовок маскированного клиентского фрейма (без ключа маски).
+
+    Args:
+        opcode: Код операции фрейма
+        length: Длина полезной нагрузки
+        fin: Последний ли это фрейм сообщения
+        rsv1: Флаг сжатого сообщения (permessage-deflate)
+
+    Returns:
+        bytes: Заголовок фрейма
+    """
+    first_byte = (0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode
+    if length < 126:
+        return struct.pack('!BB', first_byte, 0x80 | length)
+    elif length < 65536:
+        return struct.pack('!BBH', first_byte, 0x80 | 126, length)
+    return struct.pack('!BBQ', first_byte, 0x80 | 127, length)
+
+# Ограничения очереди потока записи: сообщений и суммарный размер в байтах
+DEFAULT_SEND_QUEUE_MESSAGES = 4096
+DEFAULT_SEND_QUEUE_BYTES = 64 * 1024 * 1024
+# Фреймы, готовые к отправке, объединяются в один системный вызов до этого размера
+DEFAULT_COALESCE_SIZE = 65536
+# Максимальное количество буферов в одном вызове sendmsg
+_MAX_SEND_BUFFERS = 64
+
+
+# Полосы отправки: сообщения приоритетной полосы отправляются раньше, чем
+# следующее сообщение полосы массовых данных (LANE_BULK)
+LANE_PRIORITY = 0
+LANE_BULK = 1
+LANES = (LANE_PRIORITY, LANE_BULK)
+
+
+class SendQueueFullError(Exception):
+    """Очередь исходящих сообщений потока записи заполнена"""
+
+
+class _OutgoingMessage:
+    """Сообщение в очереди потока записи"""
+
+    __slots__ = ('message', 'opcode', 'lane', 'size', 'framed')
+
+    def __init__(self, message, opcode, lane):
+        self.message = message
+        self.opcode = opcode
+        self.lane = lane
+        self.size = len(message)
+        # Все фреймы сообщения сформированы (отправлено после успешного sendmsg)
+        self.framed = False
+
+
+class FrameWriter:
+    """
+    Поток записи в сокет.
+
+    Отправляющие потоки только ставят сообщения в ограниченную очередь и не
+    ждут сеть. Поток записи формирует фреймы (сжатие, фрагментация, маска)
+    и отправляет заголовки и данные отдельными буферами через socket.sendmsg,
+    без склейки в один буфер. Небольшие фреймы, накопившиеся в очереди,
+    объединяются в один системный вызов. Управляющие фреймы (ping, pong)
+    отправляются вне очереди, в том числе между фрагментами длинного сообщения.
+
+    Сообщения распределяются по двум полосам с отдельными очередями: перед каждым
+    следующим сообщением поток записи сначала проверяет LANE_PRIORITY и только
+    потом LANE_BULK. Фрагменты разных сообщений по RFC 6455 не перемешиваются,
+    поэтому крупные данные в LANE_BULK стоит отправлять серией небольших сообщений.
+    """
+
+    def __init__(self, sock, build_frames, max_messages=DEFAULT_SEND_QUEUE_MESSAGES,
+                 max_bytes=DEFAULT_SEND_QUEUE_BYTES, coalesce_size=DEFAULT_COALESCE_SIZE):
+        """
+        Args:
+            sock: Подключенный сокет
+            build_frames: Функция build_frames(message, opcode), возвращающая итератор
+                фреймов; каждый фрейм - кортеж буферов (заголовок с маской, данные)
+            max_messages: Максимальное количество сообщений в очереди каждой полосы
+            max_bytes: Максимальный суммарный размер сообщений в очереди каждой полосы
+            coalesce_size: Размер, до которого фреймы объединяются в один вызов sendmsg
+        """
+        self.sock = sock
+        self.build_frames = build_frames
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.coalesce_size = coalesce_size
+        # Обратный вызов on_drained() из потока записи, когда очередь сообщений опустела
+        self.on_drained = None
+        # Ошибка сокета, остановившая поток записи
+        self.error = None
+
+        # Очереди сообщений и их суммарный размер по полосам
+        self._lanes = tuple(deque() for _ in LANES)
+        self._lane_bytes = [0] * len(LANES)
+        self._control = deque()
+        # Сообщения, взятые из очереди, но еще не отправленные полностью
+        self._in_flight = []
+        self._closing = False
+        self._final_frame = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="WebSocketWriter", daemon=True)
+        self._thread.start()
+
+    def put_message(self, message, opcode, lane=LANE_PRIORITY):
+        """
+        Ставит сообщение в очередь отправки без ожидания сети.
+
+        Args:
+            message: Данные сообщения (bytes)
+            opcode: Опкод сообщения
+            lane: Полоса отправки (LANE_PRIORITY или LANE_BULK)
+
+        Raises:
+            SendQueueFullError: Если очередь полосы заполнена
+            ConnectionError: Если соединение закрыто или поток записи остановлен ошибкой
+        """
+        entry = _OutgoingMessage(message, opcode, lane)
+        with self._condition:
+            self._check_open()
+            queue = self._lanes[lane]
+            # Одно сообщение больше лимита допускается, если очередь пуста
+            if queue and (len(queue) >= self.max_messages
+                          or self._lane_bytes[lane] + entry.size > self.max_bytes):
+                raise SendQueueFullError(
+                    f"Очередь отправки заполнена ({len(queue)} сообщений, {self._lane_bytes[lane]} байт)"
+                )
+            queue.append(entry)
+            self._lane_bytes[lane] += entry.size
+            self._condition.notify()
+
+    def put_control(self, frame):
+        """
+        Ставит управляющий фрейм в начало отправки.
+
+        Args:
+            frame: Готовый фрейм (заголовок, маска и данные)
+
+        Raises:
+            ConnectionError: Если соединение закрыто или поток записи остановлен ошибкой
+        """
+        with self._condition:
+            self._check_open()
+            self._control.append(frame)
+            self._condition.notify()
+
+    def _check_open(self):
+        if self.error is not None:
+            raise ConnectionError(f"Ошибка отправки: {self.error}")
+        if self._closing:
+            raise ConnectionError("Соединение закрыто")
+
+    def queued_bytes(self, lane=None):
+        """
+        Возвращает суммарный размер сообщений, ожидающих отправки
+
+        Args:
+            lane: Полоса отправки (None - все полосы)
+        """
+        if lane is None:
+            return sum(self._lane_bytes)
+        return self._lane_bytes[lane]
+
+    def _has_messages(self):
+        return any(self._lanes)
+
+    def close(self, final_frame=None, timeout=2.0):
+        """
+        Отправляет оставшиеся сообщения и final_frame, затем останавливает поток записи.
+
+        Args:
+            final_frame: Фрейм, отправляемый последним (например, close)
+            timeout: Сколько секунд ждать завершения отправки
+
+        Returns:
+            bool: Завершился ли поток записи за отведенное время
+        """
+        with self._condition:
+            if not self._closing:
+                self._final_frame = final_frame
+            self._closing = True
+            self._condition.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def take_unsent(self):
+        """
+        Забирает сообщения, которые не были полностью отправлены до ошибки или закрытия.
+
+        Returns:
+            list: Кортежи (message, opcode, lane): сначала начатые, затем по полосам
+        """
+        with self._condition:
+            entries = list(self._in_flight)
+            for queue in self._lanes:
+                entries.extend(queue)
+                queue.clear()
+            self._in_flight = []
+            self._lane_bytes = [0] * len(LANES)
+        return [(entry.message, entry.opcode, entry.lane) for entry in entries]
+
+    def _next_message(self):
+        """Берет следующее сообщение из очереди с наивысшим приоритетом (или None)"""
+        with self._condition:
+            for lane, queue in enumerate(self._lanes):
+                if queue:
+                    entry = queue.popleft()
+                    self._lane_bytes[lane] -= entry.size
+                    self._in_flight.append(entry)
+                    return entry
+            return None
+
+    def _run(self):
+        current = None
+        frames = None
+        final_frame = None
+        try:
+            while True:
+                with self._condition:
+                    while not self._control and not self._has_messages() and frames is None and not self._closing:
+                        self._condition.wait()
+                    if not self._control and not self._has_messages() and frames is None:
+                        # Все отправлено, соединение закрывается
+                        final_frame, self._final_frame = self._final_frame, None
+                        break
+                    buffers = list(self._control)
+                    self._control.clear()
+
+                # Управляющие фреймы идут первыми, затем фреймы сообщений до coalesce_size
+                size = sum(len(buffer) for buffer in buffers)
+                while size < self.coalesce_size and len(buffers) < _MAX_SEND_BUFFERS:
+                    if frames is None:
+                        current = self._next_message()
+                        if current is None:
+                            break
+                        frames = self.build_frames(current.message, current.opcode)
+                    frame = next(frames, None)
+                    if frame is None:
+                        current.framed = True
+                        current = frames = None
+                        continue
+                    buffers.extend(frame)
+                    size += sum(len(buffer) for buffer in frame)
+
+                if buffers:
+                    self._send_buffers(buffers)
+                self._complete_sent()
+
+            if final_frame is not None:
+                self._send_buffers([final_frame])
+        except Exception as e:
+            log(f"Ошибка в потоке записи WebSocket: {e}")
+            with self._condition:
+                self.error = e
+                self._control.clear()
+        finally:
+            with self._condition:
+                self._closing = True
+
+    def _complete_sent(self):
+        """Убирает из _in_flight полностью отправленные сообщения"""
+        with self._condition:
+            if self._in_flight:
+                self._in_flight = [entry for entry in self._in_flight if not entry.framed]
+            drained = not self._has_messages() and not self._in_flight
+        if drained and self.on_drained:
+            self.on_drained()
+
+    def _send_buffers(self, buffers):
+        """Отправляет буферы целиком, продолжая после частичной записи"""
+        if not hasattr(self.sock, 'sendmsg'):
+            # sendmsg недоступен (Windows): мелкие буферы склеиваем, крупные шлем по одному
+            if sum(len(buffer) for buffer in buffers) <= self.coalesce_size:
+                self.sock.sendall(b''.join(buffers))
+            else:
+                for buffer in buffers:
+                    self.sock.sendall(buffer)
+            return
+
+        views = deque(memoryview(buffer).cast('B') for buffer in buffers)
+        while views:
+            sent = self.sock.sendmsg(list(views)[:_MAX_SEND_BUFFERS])
+            while sent:
+                first = views[0]
+                if sent >= len(first):
+                    sent -= len(first)
+                    views.popleft()
+                else:
+                    views[0] = first[sent:]
+                    sent = 0
+
+
+# Интервал отправки ping и срок ожидания pong по умолчанию, в секундах
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+DEFAULT_HEARTBEAT_TIMEOUT = 10.0
+
+# Сообщения короче этого порога отправляются без сжатия
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+# Хвост, который отбрасывается после Z_SYNC_FLUSH и добавляется перед распаковкой
+_DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+# Задержки переподключения: начальная, максимальная, множитель и доля случайного разброса
+DEFAULT_RECONNECT_DELAY = 0.5
+DEFAULT_RECONNECT_MAX_DELAY = 30.0
+DEFAULT_RECONNECT_FACTOR = 2.0
+DEFAULT_RECONNECT_JITTER = 0.5
+
+# Ограничения очереди исходящих сообщений на время разрыва соединения
+DEFAULT_OUTBOUND_QUEUE_MESSAGES = 1000
+DEFAULT_OUTBOUND_QUEUE_BYTES = 64 * 1024 * 1024
+
+
+def reconnect_delays(initial=DEFAULT_RECONNECT_DELAY, maximum=DEFAULT_RECONNECT_MAX_DELAY,
+                     factor=DEFAULT_RECONNECT_FACTOR, jitter=DEFAULT_RECONNECT_JITTER):
+    """
+    Бесконечная последовательность задержек перед попытками переподключения.
+
+    Задержка растет экспоненциально до maximum; каждое значение случайно
+    уменьшается до доли jitter, чтобы клиенты не переподключались к серверу
+    одновременно после общего сбоя.
+
+    Args:
+        initial: Задержка перед первой попыткой в секундах
+        maximum: Максимальная задержка в секундах
+        factor: Множитель роста задержки
+        jitter: Доля случайного разброса (0 - без разброса, 1 - от 0 до полной задержки)
+
+    Yields:
+        float: Задержка перед очередной попыткой в секундах
+    """
+    delay = initial
+    while True:
+        yield delay * (1 - jitter * random.random())
+        delay = min(delay * factor, maximum)
+
+
+class OutboundQueue:
+    """
+    Очередь исходящих сообщений, накапливаемых пока соединение разорвано.
+
+    Ограничена количеством сообщений и суммарным размером; при переполнении
+    отбрасываются самые старые сообщения. Потокобезопасна.
+    """
+
+    def __init__(self, max_messages=DEFAULT_OUTBOUND_QUEUE_MESSAGES, max_bytes=DEFAULT_OUTBOUND_QUEUE_BYTES):
+        """
+        Args:
+            max_messages: Максимальное количество сообщений в очереди
+            max_bytes: Максимальный суммарный размер сообщений в байтах
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._items = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Количество сообщений, отброшенных из-за переполнения
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def pending_bytes(self):
+        """Суммарный размер сообщений в очереди"""
+        return self._bytes
+
+    def put(self, message, opcode=OPCODE_TEXT, lane=LANE_PRIORITY):
+        """
+        Добавляет сообщение в конец очереди.
+
+        Args:
+            message: Текст или байты сообщения
+            opcode: Опкод, с которым сообщение будет отправлено
+            lane: Полоса отправки
+
+        Returns:
+            bool: False, если сообщение больше max_bytes и не было поставлено в очередь
+        """
+        size = len(message.encode('utf-8')) if isinstance(message, str) else len(message)
+        if size > self.max_bytes:
+            self.dropped += 1
+            log(f"Сообщение размером {size} байт не помещается в очередь исходящих и отброшено")
+            return False
+
+        with self._lock:
+            self._items.append((message, opcode, lane, size))
+            self._bytes += size
+            while len(self._items) > self.max_messages or self._bytes > self.max_bytes:
+                dropped_size = self._items.popleft()[-1]
+                self._bytes -= dropped_size
+                self.dropped += 1
+                log(f"Очередь исходящих переполнена, отброшено самое старое сообщение ({dropped_size} байт)")
+        return True
+
+    def requeue(self, messages):
+        """
+        Возвращает в начало очереди сообщения, не отправленные до обрыва соединения.
+
+        Args:
+            messages: Кортежи (message, opcode, lane) в исходном порядке
+        """
+        for message, opcode, lane in reversed(list(messages)):
+            size = len(message.encode('utf-8')) if isinstance(message, str) else len(message)
+            with self._lock:
+                self._items.appendleft((message, opcode, lane, size))
+                self._bytes += size
+        # Ограничения соблюдаем за счет самых новых сообщений
+        with self._lock:
+            while len(self._items) > self.max_messages or self._bytes > self.max_bytes:
+                dropped_size = self._items.pop()[-1]
+                self._bytes -= dropped_size
+                self.dropped += 1
+                log(f"Очередь исходящих переполнена, отброшено сообщение ({dropped_size} байт)")
+
+    def flush(self, send):
+        """
+        Отправляет накопленные сообщения по порядку.
+
+        Сообщение удаляется из очереди только после успешной отправки; если
+        send выбрасывает исключение, оно остается первым в очереди. Если очередь
+        уже отправляется из другого потока, метод сразу возвращает 0 - новые
+        сообщения будут отправлены тем потоком.
+
+        Args:
+            send: Функция send(message, opcode, lane)
+
+        Returns:
+            int: Количество отправленных сообщений
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            sent = 0
+            while True:
+                with self._lock:
+                    if not self._items:
+                        return sent
+                    item = self._items[0]
+                message, opcode, lane, size = item
+                send(message, opcode, lane)
+                with self._lock:
+                    # Элемент мог быть вытеснен при переполнении во время отправки
+                    if self._items and self._items[0] is item:
+                        self._items.popleft()
+                        self._bytes -= size
+                sent += 1
+        finally:
+            self._flush_lock.release()
+
+    def clear(self):
+        """Очищает очередь"""
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+class MessageTooBigError(Exception):
+    """Распакованное сообщение превышает допустимый размер"""
+
+
+class PerMessageDeflate:
+    """
+    Расширение permessage-deflate (RFC 7692) для одного соединения.
+
+    Хранит согласованные с сервером параметры и контексты zlib. Если сервер
+    не запретил context takeover, словарь сжатия переиспользуется между
+    сообщениями, что особенно выгодно для однотипных JSON и BREP.
+    """
+
+    # Предложение расширения, которое клиент отправляет в handshake
+    OFFER = "permessage-deflate; client_max_window_bits"
+
+    def __init__(self, params, compression_level=6, min_size=DEFAULT_COMPRESSION_MIN_SIZE):
+        """
+        Args:
+            params: Параметры расширения из ответа сервера
+            compression_level: Уровень сжатия zlib
+            min_size: Минимальный размер сообщения для сжатия
+        """
+        self.client_no_context_takeover = 'client_no_context_takeover' in params
+        self.server_no_context_takeover = 'server_no_context_takeover' in params
+        self.client_max_window_bits = int(params.get('client_max_window_bits') or 15)
+        self.compression_level = compression_level
+        self.min_size = min_size
+        # zlib не поддерживает окно в 256 байт для raw deflate, такие
+        # сообщения отправляем без сжатия (RFC 7692 это допускает)
+        self.can_compress = self.client_max_window_bits >= 9
+        self._compressor = None
+        self._decompressor = None
+
+    @classmethod
+    def from_response(cls, header_value, compression_level=6, min_size=DEFAULT_COMPRESSION_MIN_SIZE):
+        """
+        Создает расширение по заголовку Sec-WebSocket-Extensions ответа сервера.
+
+        Returns:
+            PerMessageDeflate или None, если сервер не принял расширение
+        """
+        if not header_value:
+            return None
+        for extension in header_value.split(','):
+            name, *raw_params = [item.strip() for item in extension.split(';')]
+            if name.lower() != 'permessage-deflate':
+                continue
+            params = {}
+            for raw_param in raw_params:
+                key, _, value = raw_param.partition('=')
+                params[key.strip().lower()] = value.strip().strip('"') or None
+            return cls(params, compression_level, min_size)
+        return None
+
+    def compress(self, data):
+        """
+        Сжимает сообщение целиком.
+
+        Returns:
+            bytes или None, если сообщение слишком короткое для сжатия
+        """
+        if not self.can_compress or len(data) < self.min_size:
+            return None
+        if self._compressor is None or self.client_no_context_takeover:
+            self._compressor = zlib.compressobj(
+                self.compression_level, zlib.DEFLATED, -self.client_max_window_bits
+            )
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed.endswith(_DEFLATE_TAIL):
+            compressed = compressed[:-len(_DEFLATE_TAIL)]
+        return compressed
+
+    def start_message(self):
+        """Готовит контекст распаковки к новому сжатому сообщению"""
+        if self._decompressor is None or self.server_no_context_takeover:
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def decompress(self, data, fin, max_length):
+        """
+        Распаковывает очередной фрагмент сжатого сообщения.
+
+        Args:
+            data: Сжатые данные фрагмента
+            fin: Последний ли это фрагмент сообщения
+            max_length: Сколько байт еще допустимо получить (None - без ограничения),
+                при превышении возбуждается MessageTooBigError
+
+        Returns:
+            bytes: Распакованные данные
+        """
+        if fin:
+            data = bytes(data) + _DEFLATE_TAIL
+        limit = 0 if max_length is None else max_length + 1
+        result = self._decompressor.decompress(data, limit)
+        if max_length is not None and (len(result) > max_length or self._decompressor.unconsumed_tail):
+            # Дочитываем остаток фрагмента, чтобы словарь остался согласованным
+            self._drain(self._decompressor.unconsumed_tail)
+            raise MessageTooBigError("распакованное сообщение превышает допустимый размер")
+        return result
+
+    def discard(self, data, fin):
+        """
+        Пропускает фрагмент сжатого сообщения, сохраняя согласованность словаря.
+
+        При context takeover сервер продолжает ссылаться на данные пропущенного
+        сообщения, поэтому их нужно прогнать через распаковщик порциями.
+        """
+        if self.server_no_context_takeover:
+            return
+        if fin:
+            data = bytes(data) + _DEFLATE_TAIL
+        self._drain(data)
+
+    def _drain(self, data):
+        """Прогоняет данные через распаковщик, не сохраняя результат"""
+        while data:
+            self._decompressor.decompress(data, 1024 * 1024)
+            data = self._decompressor.unconsumed_tail
+
+
+def parse_http_headers(response):
+    """
+    Разбирает заголовки HTTP-ответа.
+
+    Returns:
+        dict: Заголовки с именами в нижнем регистре
+    """
+    headers = {}
+    for line in response.split('\r\n')[1:]:
+        name, separator, value = line.partition(':')
+        if separator:
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
+
+
+class WebSocketClient:
+    """
+    Клиентское WebSocket соединение с PLM-сервером.
+
+    Поддерживает фрагментацию, сжатие permessage-deflate, ожидание входящих
+    данных через селектор без периодического опроса и heartbeat (ping/pong)
+    для быстрого обнаружения оборванного соединения.
+    """
+
+    def __init__(self, host, port, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 max_message_size=DEFAULT_MAX_MESSAGE_SIZE, compression=True,
+                 compression_min_size=DEFAULT_COMPRESSION_MIN_SIZE, compression_level=6,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT,
+                 send_queue_messages=DEFAULT_SEND_QUEUE_MESSAGES,
+                 send_queue_bytes=DEFAULT_SEND_QUEUE_BYTES, subprotocols=None):
+        """
+        Устанавливает WebSocket соединение с сервером.
+
+        Args:
+            host: Хост сервера
+            port: Порт сервера
+            max_frame_size: Максимальный размер исходящего фрейма, более длинные
+                сообщения отправляются фрагментами
+            max_message_size: Максимальный размер входящего сообщения; более
+                длинные сообщения пропускаются без накопления в памяти
+            compression: Предлагать ли серверу сжатие permessage-deflate
+            compression_min_size: Минимальный размер исходящего сообщения для сжатия
+            compression_level: Уровень сжатия zlib (1-9)
+            heartbeat_interval: Интервал отправки ping в секундах (None - без heartbeat)
+            heartbeat_timeout: Сколько секунд ждать pong, прежде чем считать соединение
+                оборванным (любые данные от сервера тоже считаются признаком жизни)
+            send_queue_messages: Максимальное количество сообщений в очереди каждой полосы
+                потока записи
+            send_queue_bytes: Максимальный суммарный размер сообщений в очереди каждой
+                полосы потока записи
+            subprotocols: Предлагаемые серверу подпротоколы (Sec-WebSocket-Protocol);
+                выбранный сервером сохраняется в self.subprotocol
+        """
+        self.host = host
+        self.port = port
+        self.max_frame_size = max_frame_size
+        self.max_message_size = max_message_size
+        # Обратный вызов on_send_drained() из потока записи, когда очередь отправки опустела
+        self.on_send_drained = None
+
+        # Состояние heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        # Последнее измеренное время ping/pong в секундах
+        self.last_rtt = None
+        # Обратный вызов on_heartbeat(rtt) после каждого полученного pong
+        self.on_heartbeat = None
+        self._ping_counter = 0
+        self._ping_payload = None
+        self._ping_sent_at = None
+        self._next_ping_at = time.monotonic() + (heartbeat_interval or 0)
+        self._last_received_at = time.monotonic()
+
+        # Установление TCP-соединения
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.settimeout(10)  # Добавляем таймаут
     
-    # Оптимизация настроек сокета
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)  # 256KB для приема
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 262144)  # 256KB для отправки
-    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)    # Отключение алгоритма Нагла
+        # Оптимизация настроек сокета
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)  # 256KB для приема
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 262144)  # 256KB для отправки
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)    # Отключение алгоритма Нагла
     
-    try:
-        log(f"Подключение к {host}:{port}...")
-        sock.connect((host, port))
-        log("Соединение установлено")
-    except ConnectionRefusedError:
-        raise Exception(f"Не удалось подключиться к серверу {host}:{port}. Убедитесь, что сервер запущен и порт доступен.")
-
-    # HTTP handshake
-    key = base64.b64encode(os.urandom(16)).decode()  # Генерируем случайный ключ
-    handshake = (
-        f"GET / HTTP/1.1\r\n"
-        f"Host: {host}:{port}\r\n"
-        "Upgrade: websocket\r\n"
-        "Connection: Upgrade\r\n"
-        f"Sec-WebSocket-Key: {key}\r\n"
-        "Sec-WebSocket-Version: 13\r\n"
-        "\r\n"
-    )
-    sock.sendall(handshake.encode())
-
-    # Проверка ответа сервера
-    response = sock.recv(262144).decode('utf-8', errors='replace')
-    if "101 Switching Protocols" not in response:
-        raise Exception(f"Не удалось установить соединение WebSocket. Ответ сервера: {response}")
-    log("WebSocket соединение установлено успешно")
-
-    # Функция отправки сообщения
-    def send_message(message):
+        try:
+            log(f"Подключение к {host}:{port}...")
+            self.sock.connect((host, port))
+            log("Соединение установлено")
+        except ConnectionRefusedError:
+            raise Exception(f"Не удалось подключиться к серверу {host}:{port}. Убедитесь, что сервер запущен и порт доступен.")
+
+        # HTTP handshake
+        key = base64.b64encode(os.urandom(16)).decode()  # Генерируем случайный ключ
+        handshake = (
+            f"GET / HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+        )
+        if compression:
+            handshake += f"Sec-WebSocket-Extensions: {PerMessageDeflate.OFFER}\r\n"
+        if subprotocols:
+            handshake += f"Sec-WebSocket-Protocol: {', '.join(subprotocols)}\r\n"
+        handshake += "\r\n"
+        self.sock.sendall(handshake.encode())
+
+        # Проверка ответа сервера: читаем строго до конца HTTP-заголовков,
+        # байты первого фрейма (если сервер успел их прислать) остаются в буфере
+        self.reader = FrameReader(self.sock)
+        response = self.reader.read_until(b"\r\n\r\n").decode('utf-8', errors='replace')
+        if "101 Switching Protocols" not in response:
+            raise Exception(f"Не удалось установить соединение WebSocket. Ответ сервера: {response}")
+        log("WebSocket соединение установлено успешно")
+
+        headers = parse_http_headers(response)
+        # Подпротокол, выбранный сервером (None, если сервер его не поддерживает)
+        self.subprotocol = headers.get('sec-websocket-protocol')
+        if self.subprotocol is not None and self.subprotocol not in (subprotocols or ()):
+            raise Exception(f"Сервер выбрал неизвестный подпротокол: {self.subprotocol}")
+
+        self.deflate = None
+        if compression:
+            self.deflate = PerMessageDeflate.from_response(
+                headers.get('sec-websocket-extensions'),
+                compression_level, compression_min_size
+            )
+            log(f"Сжатие permessage-deflate: {'включено' if self.deflate else 'не поддерживается сервером'}")
+
+        # Пара сокетов для пробуждения потока, ожидающего данные в селекторе
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+
+        # Запись в сокет выполняет отдельный поток, отправляющие потоки не ждут сеть
+        self.writer = FrameWriter(self.sock, self._build_frames, send_queue_messages, send_queue_bytes)
+        self.writer.on_drained = self._on_send_drained
+
+    def send_message(self, message, opcode=OPCODE_TEXT, lane=LANE_PRIORITY):
+        """
+        Ставит сообщение в очередь потока записи и сразу возвращает управление.
+
+        Сжатие, фрагментация и маскирование выполняются в потоке записи.
+        Переданные байты не копируются, поэтому bytearray нельзя изменять после вызова.
+
+        Args:
+            message: Текст (str) или данные (bytes)
+            opcode: OPCODE_TEXT или OPCODE_BINARY
+            lane: LANE_PRIORITY или LANE_BULK для крупных данных, которые не должны
+                задерживать остальные сообщения
+
+        Raises:
+            SendQueueFullError: Если очередь отправки заполнена
+            ConnectionError: Если соединение закрыто или оборвано
+        """
         if isinstance(message, str):
             message = message.encode('utf-8')
-        elif not isinstance(message, bytes):
+        elif not isinstance(message, (bytes, bytearray, memoryview)):
             message = str(message).encode('utf-8')
-            
-        # Создаем маску (обязательно для клиентов)
-        mask_key = os.urandom(4)
-        
-        # Маскируем данные
+        self.writer.put_message(message, opcode, lane)
+
+    def _build_frames(self, message, opcode):
+        """
+        Формирует фреймы сообщения (вызывается только из потока записи).
+
+        Yields:
+            tuple: (заголовок с маской, маскированные данные фрейма)
+        """
+        # Контекст zlib используется только потоком записи, блокировка не нужна
+        compressed = self.deflate.compress(message) if self.deflate else None
+        if compressed is not None:
+            message = compressed
+
+        # Копируем данные один раз и маскируем каждый фрагмент на месте
         masked_data = bytearray(message)
-        for i in range(len(masked_data)):
-            masked_data[i] ^= mask_key[i % 4]
-        
-        # Определяем длину сообщения
-        length = len(message)
-        
-        # Формируем заголовок
-        if length < 126:
-            header = struct.pack('!BB', 0x81, 0x80 | length)
-        elif length < 65536:
-            header = struct.pack('!BBH', 0x81, 0x80 | 126, length)
-        else:
-            header = struct.pack('!BBQ', 0x81, 0x80 | 127, length)
-        
-        # Отправляем фрейм: заголовок + маска + маскированные данные
-        sock.sendall(header + mask_key + masked_data)
-
-    # Функция получения сообщения
-    def receive_message():
+        view = memoryview(masked_data)
+        length = len(masked_data)
+
+        offset = 0
+        frame_opcode = opcode
+        while True:
+            chunk = view[offset:offset + self.max_frame_size]
+            offset += len(chunk)
+            fin = offset >= length
+
+            # Создаем маску (обязательно для клиентов, своя для каждого фрейма)
+            mask_key = os.urandom(4)
+            apply_mask(chunk, mask_key)
+
+            # Заголовок и данные уходят отдельными буферами, без склейки
+            header = build_frame_header(
+                frame_opcode, len(chunk), fin,
+                rsv1=compressed is not None and frame_opcode != OPCODE_CONTINUATION
+            )
+            yield header + mask_key, chunk
+            if fin:
+                break
+            frame_opcode = OPCODE_CONTINUATION
+
+    def _on_send_drained(self):
+        if self.on_send_drained:
+            self.on_send_drained()
+
+    def take_unsent(self):
+        """
+        Возвращает сообщения, которые не успели уйти до обрыва соединения,
+        чтобы отправить их заново после переподключения.
+
+        Returns:
+            list: Кортежи (message, opcode, lane)
+        """
+        return self.writer.take_unsent()
+
+    def _read_frame_header(self):
+        """Читает заголовок очередного фрейма"""
+        # Получаем первые 2 байта заголовка
+        header = self.reader.read_exact(2)
+
+        # Разбираем заголовок
+        fin = (header[0] & 0x80) != 0
+        rsv1 = (header[0] & 0x40) != 0
+        opcode = header[0] & 0x0F
+        has_mask = (header[1] & 0x80) != 0
+        length = header[1] & 0x7F
+
+        # Добавляем отладочное сообщение
+        log(f"WebSocket заголовок: fin={fin}, rsv1={rsv1}, opcode={opcode}, has_mask={has_mask}, length={length}")
+
+        # Получаем расширенную длину, если необходимо
+        if length == 126:
+            length = struct.unpack('!H', self.reader.read_exact(2))[0]
+            log(f"Расширенная длина (16 бит): {length}")
+        elif length == 127:
+            length = struct.unpack('!Q', self.reader.read_exact(8))[0]
+            log(f"Расширенная длина (64 бит): {length}")
+
+        # Получаем маску, если она есть (для сервера)
+        mask = self.reader.read_exact(4) if has_mask else None
+        return fin, rsv1, opcode, length, mask
+
+    def _read_payload(self, length, mask):
+        """Читает и демаскирует полезную нагрузку фрейма"""
+        # Получаем данные целиком в заранее выделенный буфер
+        payload = bytearray(length)
+        self.reader.read_into(payload)
+
+        # Демаскируем данные, если необходимо
+        if mask:
+            apply_mask(payload, mask)
+        return payload
+
+    def receive_message(self):
+        """
+        Получает одно сообщение, собирая его из фрагментов.
+
+        Returns:
+            str для текстовых сообщений, bytearray для бинарных или None,
+            если сообщения нет (таймаут, управляющий фрейм, пропущенное сообщение)
+        """
         try:
-            # Получаем первые 2 байта заголовка
-            header = sock.recv(2)
-            if not header or len(header) < 2:
-                return None
-                
-            # Разбираем заголовок
-            fin = (header[0] & 0x80) != 0
-            opcode = header[0] & 0x0F
-            has_mask = (header[1] & 0x80) != 0
-            length = header[1] & 0x7F
-            
-            # Добавляем отладочное сообщение
-            log(f"WebSocket заголовок: fin={fin}, opcode={opcode}, has_mask={has_mask}, length={length}")
-            
-            # Получаем расширенную длину, если необходимо
-            if length == 126:
-                length_bytes = sock.recv(2)
-                length = struct.unpack('!H', length_bytes)[0]
-                log(f"Расширенная длина (16 бит): {length}")
-            elif length == 127:
-                length_bytes = sock.recv(8)
-                length = struct.unpack('!Q', length_bytes)[0]
-                log(f"Расширенная длина (64 бит): {length}")
-                
-            # Получаем маску, если она есть (для сервера)
-            mask = None
-            if has_mask:
-                mask = sock.recv(4)
-                log(f"Получена маска: {mask.hex()}")
-                
-            # Получаем данные
-            payload = bytearray()
-            remaining = length
-            log(f"Ожидаем получение {length} байт данных")
-            while remaining > 0:
-                chunk = sock.recv(min(remaining, 16384))
-                if not chunk:
-                    log("Соединение закрыто до получения всех данных")
+            # Ждем начала фрейма; таймаут здесь означает лишь отсутствие сообщений
+            self.reader.wait_for_data()
+        except socket.timeout:
+            return None
+        self._last_received_at = time.monotonic()
+
+        try:
+            message_opcode = None
+            compressed = False
+            parts = []
+            decoder = None
+            total_length = 0
+            # Причина, по которой остаток сообщения пропускается без сохранения
+            discard_reason = None
+
+            while True:
+                fin, rsv1, opcode, length, mask = self._read_frame_header()
+
+                # Управляющие фреймы могут приходить между фрагментами сообщения
+                if opcode >= OPCODE_CLOSE:
+                    payload = self._read_payload(length, mask)
+                    if opcode == OPCODE_CLOSE:
+                        log("Сервер закрыл соединение")
+                        # Отвечаем фреймом закрытия и останавливаем поток записи
+                        self.writer.close(self._control_frame(OPCODE_CLOSE))
+                        self.sock.close()
+                        return None
+                    elif opcode == OPCODE_PING:
+                        self._send_control(OPCODE_PONG, payload)
+                    elif opcode == OPCODE_PONG:
+                        self._handle_pong(payload)
+                    else:
+                        log(f"Получен управляющий фрейм с opcode={opcode}")
+                    if message_opcode is None:
+                        return None
+                    continue
+
+                if opcode == OPCODE_CONTINUATION:
+                    if message_opcode is None:
+                        raise ConnectionError("Получен фрейм продолжения без начального фрейма")
+                elif message_opcode is not None:
+                    raise ConnectionError("Новое сообщение начато до завершения фрагментированного")
+                else:
+                    message_opcode = opcode
+                    if rsv1 and self.deflate is None:
+                        raise ConnectionError("Получено сжатое сообщение без согласованного расширения")
+                    compressed = rsv1
+                    if compressed:
+                        self.deflate.start_message()
+
+                if compressed:
+                    if discard_reason is not None:
+                        self.deflate.discard(self._read_payload(length, mask), fin)
+                        data = None
+                    else:
+                        try:
+                            data = self.deflate.decompress(
+                                self._read_payload(length, mask), fin, self.max_message_size - total_length
+                            )
+                        except MessageTooBigError as e:
+                            discard_reason = f"{e} ({self.max_message_size} байт)"
+                            data = None
+                else:
+                    if discard_reason is None and total_length + length > self.max_message_size:
+                        discard_reason = f"размер превышает {self.max_message_size} байт"
+                    if discard_reason is not None:
+                        self.reader.skip(length)
+                        data = None
+                    else:
+                        data = self._read_payload(length, mask)
+
+                if data is not None:
+                    total_length += len(data)
+                    if message_opcode != OPCODE_TEXT:
+                        parts.append(data)
+                    elif fin and decoder is None:
+                        # Нефрагментированное сообщение декодируем целиком
+                        try:
+                            parts.append(data.decode('utf-8'))
+                        except UnicodeDecodeError as e:
+                            discard_reason = f"ошибка декодирования UTF-8: {e}"
+                    else:
+                        # Фрагменты декодируем по мере поступления, без накопления байтов
+                        if decoder is None:
+                            decoder = codecs.getincrementaldecoder('utf-8')()
+                        try:
+                            parts.append(decoder.decode(data, final=fin))
+                        except UnicodeDecodeError as e:
+                            discard_reason = f"ошибка декодирования UTF-8: {e}"
+
+                if fin:
                     break
-                payload.extend(chunk)
-                remaining -= len(chunk)
-                log(f"Получено {len(chunk)} байт, осталось {remaining} байт")
-                
-            # Демаскируем данные, если необходимо
-            if has_mask and mask:
-                log("Демаскируем данные")
-                for i in range(len(payload)):
-                    payload[i] ^= mask[i % 4]
-                    
-            # Преобразуем в строку, если это текстовый фрейм
-            if opcode == 1:  # Текстовый фрейм
-                try:
-                    result = payload.decode('utf-8')
-                    log(f"Декодировано как UTF-8: {result}")
-                    
-                    # # Проверяем, является ли сообщение JSON
-                    # try:
-                    #     json_data = json.loads(result)
-                    #     log(f"Сообщение является JSON: {json_data}")
-                    #     if isinstance(json_data, dict) and 'python_code' in json_data:
-                    #         log(f"Найден ключ python_code: {json_data['python_code']}")
-                    # except json.JSONDecodeError:
-                    #     log("Сообщение не является JSON")
-                    
-                    return result
-                except UnicodeDecodeError as e:
-                    log(f"Ошибка декодирования UTF-8: {e}")
-                    return None
-            elif opcode == 8:  # Закрытие соединения
-                log("Сервер закрыл соединение")
-                sock.close()
+
+            if discard_reason is not None:
+                log(f"Сообщение пропущено: {discard_reason}")
                 return None
-            else:
-                log(f"Получен бинарный фрейм с opcode={opcode}")
-                return payload
+
+            # Преобразуем в строку, если это текстовый фрейм
+            if message_opcode == OPCODE_TEXT:
+                result = parts[0] if len(parts) == 1 else ''.join(parts)
+                log(f"Декодировано как UTF-8: {result}")
+
+                # # Проверяем, является ли сообщение JSON
+                # try:
+                #     json_data = json.loads(result)
+                #     log(f"Сообщение является JSON: {json_data}")
+                #     if isinstance(json_data, dict) and 'python_code' in json_data:
+                #         log(f"Найден ключ python_code: {json_data['python_code']}")
+                # except json.JSONDecodeError:
+                #     log("Сообщение не является JSON")
+
+                return result
+
+            log(f"Получен бинарный фрейм с opcode={message_opcode}")
+            return parts[0] if len(parts) == 1 else bytearray().join(parts)
+        except (ConnectionError, OSError) as e:
+            # Поток фреймов рассинхронизирован или сокет закрыт: дальше читать нельзя
+            log(f"Ошибка соединения при получении сообщения: {e}")
+            raise
         except Exception as e:
             log(f"Ошибка при получении сообщения: {e}")
             return None
 
-    # Функция закрытия соединения
-    def close():
+    @staticmethod
+    def _control_frame(opcode, payload=b''):
+        """Формирует маскированный управляющий фрейм"""
+        mask_key = os.urandom(4)
+        masked = mask_payload(payload, mask_key)
+        return build_frame_header(opcode, len(masked)) + mask_key + masked
+
+    def _send_control(self, opcode, payload=b''):
+        """Отправляет управляющий фрейм (ping или pong) вне очереди сообщений"""
+        self.writer.put_control(self._control_frame(opcode, payload))
+
+    def ping(self):
+        """Отправляет ping; время до ответа сохраняется в last_rtt"""
+        self._ping_counter += 1
+        self._ping_payload = struct.pack('!Q', self._ping_counter)
+        self._ping_sent_at = time.monotonic()
+        if self.heartbeat_interval:
+            self._next_ping_at = self._ping_sent_at + self.heartbeat_interval
+        self._send_control(OPCODE_PING, self._ping_payload)
+
+    def _handle_pong(self, payload):
+        """Обрабатывает pong: ответ на наш последний ping дает время RTT"""
+        if self._ping_payload is None or bytes(payload) != self._ping_payload:
+            log("Получен pong без ожидающего ping")
+            return
+        self.last_rtt = time.monotonic() - self._ping_sent_at
+        self._ping_payload = None
+        self._ping_sent_at = None
+        log(f"Heartbeat: RTT {self.last_rtt * 1000:.1f} мс")
+        if self.on_heartbeat:
+            self.on_heartbeat(self.last_rtt)
+
+    def heartbeat_delay(self):
+        """
+        Возвращает, через сколько секунд нужно вызвать check_heartbeat.
+
+        Returns:
+            float или None, если heartbeat отключен
+        """
+        if not self.heartbeat_interval:
+            return None
+        now = time.monotonic()
+        if self._ping_sent_at is not None:
+            return max(0.0, self._ping_sent_at + self.heartbeat_timeout - now)
+        return max(0.0, self._next_ping_at - now)
+
+    def check_heartbeat(self):
+        """
+        Отправляет очередной ping и проверяет срок ожидания pong.
+
+        Raises:
+            ConnectionError: Если за heartbeat_timeout от сервера не пришло ни pong, ни данных
+        """
+        if not self.heartbeat_interval:
+            return
+        now = time.monotonic()
+        if self._ping_sent_at is not None:
+            if now - self._ping_sent_at < self.heartbeat_timeout:
+                return
+            if self._last_received_at < self._ping_sent_at:
+                raise ConnectionError(
+                    f"Сервер не ответил на ping за {self.heartbeat_timeout:.1f} с, соединение потеряно"
+                )
+            # Данные от сервера идут, значит соединение живо, хоть pong и задержался
+            self._ping_payload = None
+            self._ping_sent_at = None
+        if now >= self._next_ping_at:
+            self.ping()
+
+    def pending(self):
+        """Возвращает количество принятых, но еще не разобранных байт"""
+        return self.reader.pending()
+
+    def wait_readable(self, timeout=None):
+        """
+        Ждет входящих данных через селектор, не занимая процессор.
+
+        Args:
+            timeout: Максимальное время ожидания в секундах (None - без ограничения)
+
+        Returns:
+            bool: Есть ли данные для чтения (False при таймауте или пробуждении через wakeup)
+
+        Raises:
+            ConnectionError: Если сокет уже закрыт
+        """
+        if self.sock.fileno() == -1:
+            raise ConnectionError("Соединение закрыто")
+        if self.reader.pending():
+            return True
+        readable = False
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._wakeup_reader:
+                try:
+                    self._wakeup_reader.recv(4096)
+                except (BlockingIOError, OSError):
+                    pass
+            else:
+                readable = True
+        return readable
+
+    def receive_available(self, timeout=None):
+        """
+        Ждет входящие данные и вычитывает все сообщения, уже доступные без ожидания.
+
+        Ожидание прерывается к сроку очередной проверки heartbeat.
+
+        Args:
+            timeout: Максимальное время ожидания первых данных в секундах
+
+        Returns:
+            list: Полученные сообщения (пустой при таймауте или пробуждении)
+
+        Raises:
+            ConnectionError: Если соединение закрыто или сервер перестал отвечать на ping
+        """
+        messages = []
+        delay = self.heartbeat_delay()
+        if delay is not None and (timeout is None or delay < timeout):
+            timeout = delay
+        readable = self.wait_readable(timeout)
+        if not readable:
+            self.check_heartbeat()
+            return messages
+        while True:
+            message = self.receive_message()
+            if message:
+                messages.append(message)
+            # Продолжаем, пока в буфере или в сокете остаются данные
+            if not self.reader.pending() and not self._socket_readable():
+                self.check_heartbeat()
+                return messages
+
+    def _socket_readable(self):
+        """Проверяет без ожидания, есть ли в сокете непрочитанные данные"""
+        if self.sock.fileno() == -1:
+            return False
+        return any(key.fileobj is self.sock for key, _ in self._selector.select(0))
+
+    def wakeup(self):
+        """Прерывает ожидание в wait_readable из другого потока"""
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def close(self, timeout=2.0):
+        """
+        Отправляет оставшиеся в очереди сообщения и фрейм закрытия,
+        закрывает сокет и будит ожидающий поток.
+
+        Args:
+            timeout: Сколько секунд ждать отправки очереди
+        """
         try:
             log("Закрытие WebSocket соединения...")
-            # Отправляем фрейм закрытия соединения
-            close_frame = struct.pack('!BB', 0x88, 0x80)
-            mask_key = os.urandom(4)
-            sock.sendall(close_frame + mask_key)
-            sock.close()
+            # Отправляем фрейм закрытия соединения после оставшихся сообщений
+            if not self.writer.close(self._control_frame(OPCODE_CLOSE), timeout):
+                log("Очередь отправки не успела уйти до закрытия соединения")
+                # Прерываем зависшую запись
+                self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
             log("Соединение закрыто")
         except Exception as e:
             log(f"Ошибка при закрытии соединения: {e}")
+        finally:
+            self.wakeup()
+
+
+def create_websocket_client(host, port, **options):
+    """
+    Устанавливает WebSocket соединение с сервером.
+
+    Args:
+        host: Хост сервера
+        port: Порт сервера
+        **options: Параметры WebSocketClient
 
-    return send_message, receive_message, close 
\ No newline at end of file
+    Returns:
+        tuple: Функции (send_message, receive_message, close)
+    """
+    client = WebSocketClient(host, port, **options)
+    return client.send_message, client.receive_message, client.close
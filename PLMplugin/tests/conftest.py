@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули плагина импортируются по имени, как в FreeCAD (каталог плагина в sys.path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
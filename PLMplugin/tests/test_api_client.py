@@ -0,0 +1,80 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_client import HTTPConnectionPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == '/drop':
+            # Сервер закрывает соединение, не предупредив клиента
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _pool(server, **options):
+    return HTTPConnectionPool('127.0.0.1', server.server_address[1], **options)
+
+
+def test_keep_alive_connection_is_reused(server):
+    pool = _pool(server)
+    for n in range(5):
+        assert pool.request('GET', f'/item/{n}') == (200, 'OK', f'/item/{n}'.encode())
+    stats = pool.stats()
+    assert (stats['connections_created'], stats['connections_reused'], stats['idle']) == (1, 4, 1)
+    pool.close()
+    assert pool.stats()['idle'] == 0
+
+
+def test_connection_close_response_is_not_reused(server):
+    pool = _pool(server)
+    pool.request('GET', '/close')
+    pool.request('GET', '/next')
+    assert pool.stats()['connections_created'] == 2
+
+
+def test_connection_dropped_by_server_is_replaced(server):
+    pool = _pool(server)
+    pool.request('GET', '/drop')
+    assert pool.request('GET', '/after') == (200, 'OK', b'/after')
+    stats = pool.stats()
+    assert stats['reconnects'] == 1 and stats['connections_created'] == 2
+
+
+def test_expired_idle_connection_is_not_reused(server):
+    pool = _pool(server, idle_timeout=0)
+    pool.request('GET', '/a')
+    pool.request('GET', '/b')
+    assert pool.stats()['connections_reused'] == 0
+
+
+def test_pool_keeps_at_most_max_size_idle_connections(server):
+    pool = _pool(server, max_size=1)
+    connections = [pool._acquire()[0] for _ in range(3)]
+    for conn in connections:
+        pool._release(conn, True)
+    stats = pool.stats()
+    assert (stats['idle'], stats['in_use']) == (1, 0)
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from binary_messages import (
+    BinaryMessage, ChunkAssembler, ChunkProtocolError, MESSAGE_TYPE_CHUNK, MESSAGE_TYPE_FUNCTION_RESPONSE,
+    decode_binary_message, encode_binary_message, split_into_chunks,
+)
+
+
+def _chunk(transfer_id, seq, count, payload=b'x'):
+    return BinaryMessage(MESSAGE_TYPE_CHUNK, payload, '', transfer_id, {'seq': seq, 'count': count})
+
+
+def test_binary_message_round_trip():
+    message = BinaryMessage(MESSAGE_TYPE_FUNCTION_RESPONSE, b'\x00brep', 'application/x-brep', 'req-1', {'ok': True})
+    decoded = decode_binary_message(encode_binary_message(message))
+    assert decoded.message_type == MESSAGE_TYPE_FUNCTION_RESPONSE
+    assert bytes(decoded.payload) == b'\x00brep'
+    assert (decoded.content_type, decoded.correlation_id, decoded.meta) == ('application/x-brep', 'req-1', {'ok': True})
+
+
+def test_chunks_reassemble_in_any_order():
+    data = encode_binary_message(BinaryMessage(MESSAGE_TYPE_FUNCTION_RESPONSE, os.urandom(1000)))
+    chunks = [decode_binary_message(chunk) for chunk in split_into_chunks(data, chunk_size=64)]
+    assert len(chunks) == -(-len(data) // 64)
+
+    assembler = ChunkAssembler()
+    first, rest = chunks[0], chunks[1:]
+    for chunk in reversed(rest):
+        assert assembler.add(chunk) is None
+    assert assembler.add(first) == data
+
+
+def test_chunk_with_invalid_meta_is_rejected():
+    assembler = ChunkAssembler()
+    for seq, count in ((1, 1), (-1, 2), ('0', 2), (True, 2), (0, None)):
+        with pytest.raises(ChunkProtocolError):
+            assembler.add(_chunk('t', seq, count))
+
+
+def test_chunk_count_mismatch_drops_transfer():
+    assembler = ChunkAssembler()
+    assembler.add(_chunk('t', 0, 3))
+    with pytest.raises(ChunkProtocolError):
+        assembler.add(_chunk('t', 1, 2))
+    # Передача начата заново: прежние куски отброшены
+    assert assembler.add(_chunk('t', 0, 2, b'a')) is None
+    assert assembler.add(_chunk('t', 1, 2, b'b')) == b'ab'
+
+
+def test_chunks_are_bounded_by_max_message_size():
+    assembler = ChunkAssembler(max_message_size=10)
+    with pytest.raises(ChunkProtocolError):
+        assembler.add(_chunk('huge', 0, 1000))
+    assembler.add(_chunk('t', 0, 2, b'123456'))
+    with pytest.raises(ChunkProtocolError):
+        assembler.add(_chunk('t', 1, 2, b'7890a'))
+    assert assembler.add(_chunk('t', 1, 2, b'7890')) is None
+
+
+def test_oldest_unfinished_transfer_is_dropped():
+    assembler = ChunkAssembler(max_transfers=2)
+    assembler.add(_chunk('a', 0, 2, b'a'))
+    assembler.add(_chunk('b', 0, 2, b'b'))
+    assembler.add(_chunk('c', 0, 2, b'c'))
+    assert assembler.add(_chunk('b', 1, 2, b'B')) == b'bB'
+    assert assembler.add(_chunk('a', 1, 2, b'A')) is None
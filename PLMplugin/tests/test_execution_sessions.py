@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from execution_sessions import SessionError, SessionManager, estimate_size
+
+
+def test_session_lifecycle():
+    manager = SessionManager()
+    session = manager.create({'App': object()}, 'doc')
+    assert manager.get('doc') is session
+    assert session.namespace['__name__'] == 'plm_session_doc'
+    with pytest.raises(SessionError):
+        manager.create({}, 'doc')
+
+    session.namespace['part'] = 'Box'
+    assert session.describe()['variables'] == ['part']
+    assert manager.destroy('doc')
+    assert not manager.destroy('doc')
+    with pytest.raises(SessionError):
+        manager.get('doc')
+
+
+def test_least_recently_used_session_is_closed_over_limit():
+    manager = SessionManager(max_sessions=2)
+    manager.create({}, 'a')
+    manager.create({}, 'b')
+    time.sleep(0.01)
+    manager.get('a')
+    manager.create({}, 'c')
+    assert sorted(session['session_id'] for session in manager.list()) == ['a', 'c']
+
+
+def test_idle_sessions_are_closed():
+    manager = SessionManager(idle_timeout=0.05)
+    manager.create({}, 'idle')
+    time.sleep(0.1)
+    assert len(manager.list()) == 0
+    with pytest.raises(SessionError):
+        manager.get('idle')
+
+
+def test_session_over_memory_limit_is_closed():
+    big = list(range(1000))
+    manager = SessionManager(max_bytes=10000)
+    session = manager.create({'base': big}, 's')
+    # Значения базового пространства имен не учитываются
+    assert manager.check_memory(session) is None
+
+    session.namespace['data'] = [bytes(100)] * 1000
+    assert manager.check_memory(session) > 10000
+    assert len(manager) == 0
+
+
+def test_estimate_size_extrapolates_long_containers():
+    small = estimate_size([bytes(1000)] * 10)
+    large = estimate_size([bytes(1000)] * 10000)
+    assert large == pytest.approx(small * 1000, rel=0.1)
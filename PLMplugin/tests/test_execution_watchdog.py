@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from execution_watchdog import ExecutionWatchdog, ScriptCancelled, ScriptTimeout
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_isolated(code, timeout=30):
+    """Выполняет код в отдельном процессе: зависание не блокирует остальные тесты"""
+    return subprocess.run(
+        [sys.executable, '-c', textwrap.dedent(code)],
+        cwd=PLUGIN_DIR, capture_output=True, text=True, timeout=timeout,
+    )
+
+
+def test_timeout_interrupts_script():
+    watchdog = ExecutionWatchdog()
+    with pytest.raises(ScriptTimeout):
+        with watchdog.guard(0.1) as execution:
+            while True:
+                time.sleep(0.001)
+    assert execution.report()['interrupted'] == 'timeout'
+
+
+def test_cancel_interrupts_script():
+    watchdog = ExecutionWatchdog()
+    threading.Timer(0.1, watchdog.cancel, args=('req',)).start()
+    with pytest.raises(ScriptCancelled):
+        with watchdog.guard(None, 'req'):
+            while True:
+                time.sleep(0.001)
+    assert watchdog.active() == []
+
+
+def test_interrupt_after_finish_is_ignored():
+    watchdog = ExecutionWatchdog()
+    with watchdog.guard(0.05) as execution:
+        execution.finish()
+        time.sleep(0.2)
+    assert 'interrupted' not in execution.report()
+
+
+def test_profiled_call_after_timeout_does_not_hang():
+    # Снятие прерывания через SetAsyncExc(NULL) оставляло флаг интерпретатора
+    # взведенным, и следующий вызов под cProfile зацикливался
+    result = _run_isolated('''
+        import cProfile, time
+        from execution_watchdog import ExecutionWatchdog, ScriptInterrupted
+        watchdog = ExecutionWatchdog()
+        try:
+            with watchdog.guard(0.1):
+                while True:
+                    time.sleep(0.001)
+        except ScriptInterrupted:
+            pass
+        with watchdog.guard(0.05) as execution:
+            try:
+                while True:
+                    time.sleep(0.001)
+            except ScriptInterrupted:
+                pass
+            execution.finish()
+        def call():
+            return 1
+        profiler = cProfile.Profile()
+        profiler.enable()
+        call()
+        profiler.disable()
+        print('ok')
+    ''')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == 'ok'
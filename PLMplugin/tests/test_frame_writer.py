@@ -0,0 +1,48 @@
+import socket
+import threading
+
+from socket_client import FrameWriter, LANE_BULK, LANE_PRIORITY, OPCODE_BINARY
+
+
+def _read_all(sock):
+    data = b''
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+def test_control_frames_go_out_between_fragments():
+    client, server = socket.socketpair()
+    writer = None
+
+    def build_frames(message, opcode):
+        # Управляющий фрейм, поставленный, пока отправляется первый фрагмент
+        writer.put_control(b'<PING>')
+        yield b'<F1>', message[:2]
+        yield b'<F2>', message[2:]
+
+    writer = FrameWriter(client, build_frames, coalesce_size=1)
+    drained = threading.Event()
+    writer.on_drained = drained.set
+    writer.put_message(b'abcd', OPCODE_BINARY, LANE_BULK)
+    assert drained.wait(5)
+    writer.close()
+    client.close()
+    assert _read_all(server) == b'<F1>ab<PING><F2>cd'
+    server.close()
+
+
+def test_priority_lane_goes_before_queued_bulk():
+    client, server = socket.socketpair()
+    frames = lambda message, opcode: iter([(message,)])
+    writer = FrameWriter(client, frames)
+    # Поток записи занят, пока сообщения ставятся в очередь
+    with writer._condition:
+        writer.put_message(b'[bulk]', OPCODE_BINARY, LANE_BULK)
+        writer.put_message(b'[priority]', OPCODE_BINARY, LANE_PRIORITY)
+    writer.close()
+    client.close()
+    assert _read_all(server) == b'[priority][bulk]'
+    server.close()
@@ -0,0 +1,74 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from freecad_executor import CompiledCodeCache, FreeCADExecutor
+
+
+def _resolved_later(value, delay):
+    future = concurrent.futures.Future()
+    threading.Timer(delay, future.set_result, args=(value,)).start()
+    return future
+
+
+def test_batch_function_call_waits_for_future():
+    executor = FreeCADExecutor()
+    item = {'function_call': 'compare', 'arguments': {}}
+    result = executor._execute_batch_item(
+        item, None, None, 5, lambda name, arguments: _resolved_later([{'identical': True}], 0.05)
+    )
+    assert result['success'] is True
+    assert result['result'] == [{'identical': True}]
+
+
+def test_batch_function_call_future_timeout_is_an_error():
+    executor = FreeCADExecutor()
+    item = {'function_call': 'fuse', 'arguments': {}}
+    result = executor._execute_batch_item(
+        item, None, None, 0.05, lambda name, arguments: concurrent.futures.Future()
+    )
+    assert result['success'] is False
+    assert 'fuse' in result['error']
+
+
+def test_batch_function_call_future_error_is_reported():
+    def failing(name, arguments):
+        future = concurrent.futures.Future()
+        future.set_exception(ValueError('bad shape'))
+        return future
+
+    result = FreeCADExecutor()._execute_batch_item({'function_call': 'fuse'}, None, None, None, failing)
+    assert result['success'] is False
+    assert result['error'] == 'bad shape'
+
+
+def test_lazy_namespace_module_imports_on_first_use():
+    from freecad_executor import _LazyModule
+    module = _LazyModule('colorsys')
+    assert module.rgb_to_hsv(1, 0, 0) == (0.0, 1.0, 1)
+
+
+def test_compiled_code_cache_reuses_code_and_evicts_lru():
+    cache = CompiledCodeCache(max_size=2)
+    first = cache.get('x = 1')
+    assert cache.get('x = 1') is first
+    cache.get('x = 2')
+    cache.get('x = 1')
+    cache.get('x = 3')
+    # 'x = 2' использовался раньше всех и вытеснен
+    assert cache.get('x = 1') is first
+    cache.get('x = 2')
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses']) == (2, 3, 4)
+
+    assert cache.get('x = 1', '<other>') is not first
+    cache.clear()
+    assert cache.stats()['size'] == 0 and cache.stats()['hits'] == 0
+
+
+def test_compiled_code_cache_does_not_store_syntax_errors():
+    cache = CompiledCodeCache()
+    with pytest.raises(SyntaxError):
+        cache.get('def (')
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,71 @@
+import time
+
+from function_cache import FunctionResultCache, canonical_arguments
+
+
+def test_canonical_arguments_ignore_key_order():
+    assert canonical_arguments({'b': 1, 'a': 2}) == canonical_arguments({'a': 2, 'b': 1})
+    assert canonical_arguments(None) == canonical_arguments({})
+    assert canonical_arguments({'data': object()}) is None
+
+
+def test_returned_result_is_a_copy():
+    cache = FunctionResultCache()
+    result = {'n': 1, 'items': [1, 2]}
+    cache.put('f', '{}', result, ttl=60)
+    result['n'] = 2
+
+    found, cached = cache.get('f', '{}')
+    assert found and cached == {'n': 1, 'items': [1, 2]}
+    cached['n'] = 999
+    cached['items'].append(3)
+    assert cache.get('f', '{}') == (True, {'n': 1, 'items': [1, 2]})
+
+
+def test_entries_expire():
+    cache = FunctionResultCache()
+    cache.put('f', '{}', 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get('f', '{}') == (False, None)
+
+
+def test_invalidate_by_tag_and_function_name():
+    cache = FunctionResultCache()
+    cache.put('parts', '{}', 1, ttl=60, tags=('plm_objects',))
+    cache.put('count', '{}', 2, ttl=60, tags=('plm_objects',))
+    cache.put('other', '{}', 3, ttl=60)
+    assert cache.invalidate(('plm_objects',)) == 2
+    assert cache.invalidate(('other',)) == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_lru_eviction():
+    cache = FunctionResultCache(max_size=2)
+    cache.put('f', '1', 1, ttl=60)
+    cache.put('f', '2', 2, ttl=60)
+    cache.get('f', '1')
+    cache.put('f', '3', 3, ttl=60)
+    assert cache.get('f', '2') == (False, None)
+    assert cache.get('f', '1') == (True, 1)
+
+
+def test_result_computed_across_invalidation_is_not_stored():
+    cache = FunctionResultCache()
+    generation = cache.generation('parts', ('plm_objects',))
+    cache.invalidate(('plm_objects',))
+    assert not cache.put('parts', '{}', 'stale', ttl=60, tags=('plm_objects',), generation=generation)
+    assert cache.get('parts', '{}') == (False, None)
+
+    generation = cache.generation('parts', ('plm_objects',))
+    cache.invalidate(('unrelated',))
+    assert cache.put('parts', '{}', 'fresh', ttl=60, tags=('plm_objects',), generation=generation)
+
+
+def test_uncopyable_result_is_not_cached():
+    class Uncopyable:
+        def __deepcopy__(self, memo):
+            raise TypeError('no copy')
+
+    cache = FunctionResultCache()
+    assert not cache.put('f', '{}', Uncopyable(), ttl=60)
+    assert cache.stats()['size'] == 0
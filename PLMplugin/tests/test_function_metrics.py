@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from function_metrics import HISTOGRAM_MAX_MS, HISTOGRAM_MIN_MS, FunctionMetrics, LatencyHistogram
+
+
+def test_percentiles_stay_within_bucket_error():
+    histogram = LatencyHistogram()
+    values = [random.uniform(0.1, 500.0) for _ in range(5000)]
+    for value in values:
+        histogram.add(value)
+    values.sort()
+    for percent in (50, 95, 99):
+        exact = values[int(len(values) * percent / 100) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.1)
+
+
+def test_percentiles_are_clamped_to_observed_range():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    histogram.add(5.0)
+    assert histogram.percentile(50) == histogram.percentile(99) == 5.0
+    # Значения вне диапазона гистограммы попадают в крайние корзины
+    histogram.add(0.0)
+    histogram.add(1e9)
+    assert histogram.percentile(1) == HISTOGRAM_MIN_MS
+    assert histogram.percentile(100) == pytest.approx(HISTOGRAM_MAX_MS, rel=0.1)
+
+
+def test_metrics_report_and_reset():
+    metrics = FunctionMetrics()
+    metrics.record('echo', 1.0)
+    metrics.record('echo', 3.0, error=True)
+    metrics.record('search', 10.0)
+
+    report = metrics.report('echo')['echo']
+    assert (report['calls'], report['errors'], report['error_rate']) == (2, 1, 0.5)
+    assert (report['min_ms'], report['max_ms'], report['mean_ms']) == (1.0, 3.0, 2.0)
+    assert set(metrics.report()) == {'echo', 'search'}
+    assert metrics.report('missing') == {}
+
+    assert metrics.reset('echo') == 1
+    assert metrics.reset('echo') == 0
+    assert metrics.reset() == 1
+    assert metrics.report() == {}
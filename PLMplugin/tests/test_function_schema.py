@@ -0,0 +1,82 @@
+from typing import Dict, List, Literal, Optional, Union
+
+import pytest
+
+from function_schema import ArgumentError, FunctionSchema
+
+
+def _schema(function):
+    return FunctionSchema.from_callable(function)
+
+
+def test_arguments_are_coerced_to_annotated_types():
+    def search(part_id: int, scale: float, exact: bool, label: str, tags: List[int], limits: Dict[str, float]):
+        pass
+
+    validated = _schema(search).validate({
+        'part_id': '10', 'scale': 2, 'exact': 'yes', 'label': 12, 'tags': ['1', 2], 'limits': {'max': '1.5'},
+    })
+    assert validated == {
+        'part_id': 10, 'scale': 2.0, 'exact': True, 'label': '12', 'tags': [1, 2], 'limits': {'max': 1.5},
+    }
+
+
+def test_type_is_taken_from_default_without_annotation():
+    def lookup(limit=10, name=None):
+        pass
+
+    schema = _schema(lookup)
+    assert schema.validate({'limit': '5', 'name': {'any': 'value'}}) == {'limit': 5, 'name': {'any': 'value'}}
+    assert schema.defaults == {'limit': 10, 'name': None}
+
+
+def test_all_errors_are_reported_together():
+    def create(part_id: int, kind: Literal['box', 'cylinder']):
+        pass
+
+    with pytest.raises(ArgumentError) as error:
+        _schema(create).validate({'part_id': True, 'kind': 'cone', 'extra': 1})
+    message = str(error.value)
+    assert "'part_id'" in message and "'kind'" in message and "'extra'" in message
+
+    with pytest.raises(ArgumentError, match="обязательный аргумент 'part_id'"):
+        _schema(create).validate({'kind': 'box'})
+    with pytest.raises(ArgumentError):
+        _schema(create).validate(['not', 'a', 'dict'])
+
+
+def test_union_prefers_exact_type_and_optional_allows_none():
+    def update(value: Union[int, str], label: str = None, note: Optional[float] = None):
+        pass
+
+    schema = _schema(update)
+    assert schema.validate({'value': '1'}) == {'value': '1'}
+    assert schema.validate({'value': 1.0, 'label': None, 'note': '2'}) == {'value': 1, 'label': None, 'note': 2.0}
+
+
+def test_var_keyword_accepts_extra_arguments():
+    def call(name: str, **options):
+        pass
+
+    assert _schema(call).validate({'name': 'a', 'depth': 2}) == {'name': 'a', 'depth': 2}
+
+
+def test_json_schema_describes_parameters():
+    def export(part_id: int, formats: List[str], compress: bool = False):
+        """Экспортирует деталь.
+
+        Подробности."""
+
+    schema = _schema(export)
+    assert schema.description == 'Экспортирует деталь.'
+    assert schema.json_schema() == {
+        'type': 'object',
+        'properties': {
+            'part_id': {'type': 'integer'},
+            'formats': {'type': 'array', 'items': {'type': 'string'}},
+            'compress': {'type': 'boolean', 'default': False},
+        },
+        'additionalProperties': False,
+        'required': ['part_id', 'formats'],
+    }
+
@@ -0,0 +1,87 @@
+import json
+import sys
+import threading
+import time
+import types
+
+import request_profiler
+from request_profiler import RequestProfile
+
+
+class _Document:
+    """Документ, пересчет которого оповещает наблюдателей, как в FreeCAD"""
+
+    def __init__(self, observers, duration):
+        self.observers = observers
+        self.duration = duration
+
+    def recompute(self):
+        for observer in self.observers:
+            observer.slotBeforeRecomputeDocument(self)
+        time.sleep(self.duration)
+        for observer in self.observers:
+            observer.slotRecomputedDocument(self)
+
+
+def test_recompute_is_timed_without_cprofile(monkeypatch):
+    observers = []
+    freecad = types.ModuleType('FreeCAD')
+    freecad.addDocumentObserver = observers.append
+    monkeypatch.setitem(sys.modules, 'FreeCAD', freecad)
+    monkeypatch.setattr(request_profiler, '_recompute_timer_registered', False)
+
+    profile = RequestProfile(top=0)
+    with profile.execution():
+        _Document(observers, 0.05).recompute()
+        time.sleep(0.02)
+
+    assert profile._stats is None
+    report = profile.report()
+    assert report['recompute_ms'] >= 45
+    assert 15 <= report['execution_ms'] < report['recompute_ms']
+
+
+def test_top_report_requires_top():
+    profile = RequestProfile(top=0)
+    with profile.execution():
+        sum(range(1000))
+    assert 'top' not in profile.report()
+
+    profile = RequestProfile(top=3)
+    with profile.execution():
+        sorted(range(1000))
+    assert len(profile.report()['top']) == 3
+
+
+def test_concurrent_profiling_falls_back_to_timer():
+    first, second = RequestProfile(top=3), RequestProfile(top=3)
+    started, release = threading.Event(), threading.Event()
+
+    def run_first():
+        with first.execution():
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run_first)
+    thread.start()
+    started.wait(5)
+    with second.execution():
+        sum(range(1000))
+    release.set()
+    thread.join()
+
+    assert second.report()['profiler_busy'] is True
+    assert 'top' not in second.report()
+    assert 'top' in first.report()
+
+
+def test_serialize_splices_report_with_serialize_time():
+    profile = RequestProfile()
+    with profile.execution():
+        pass
+    body = profile.serialize({'function_response': 'f', 'profile': profile, 'result': list(range(1000))})
+
+    response = json.loads(body)
+    assert response['result'] == list(range(1000))
+    assert 'serialize_ms' in response['profile']
+    assert response['profile']['total_ms'] >= response['profile']['serialize_ms']
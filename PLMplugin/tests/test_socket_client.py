@@ -0,0 +1,196 @@
+import itertools
+import os
+import socket
+import zlib
+
+import pytest
+
+from socket_client import (
+    FrameReader, MASK_CHUNK_SIZE, MessageTooBigError, OPCODE_BINARY, OPCODE_TEXT, LANE_BULK,
+    LANE_PRIORITY, OutboundQueue, PerMessageDeflate, apply_mask, reconnect_delays,
+)
+
+
+def _bytewise_mask(data, mask_key):
+    return bytes(byte ^ mask_key[i % 4] for i, byte in enumerate(data))
+
+
+@pytest.mark.parametrize('size', [0, 1, 3, 4, 5, 1023, MASK_CHUNK_SIZE, MASK_CHUNK_SIZE + 7, 3 * MASK_CHUNK_SIZE - 1])
+def test_apply_mask_matches_bytewise_xor(size):
+    data = os.urandom(size)
+    mask_key = os.urandom(4)
+    buffer = bytearray(data)
+    apply_mask(buffer, mask_key)
+    assert bytes(buffer) == _bytewise_mask(data, mask_key)
+    apply_mask(buffer, mask_key)
+    assert bytes(buffer) == data
+
+
+def test_apply_mask_on_memoryview_slice_keeps_key_phase():
+    data = os.urandom(100)
+    mask_key = b'\x01\x02\x03\x04'
+    buffer = bytearray(data)
+    apply_mask(memoryview(buffer)[10:90], mask_key)
+    assert bytes(buffer) == data[:10] + _bytewise_mask(data[10:90], mask_key) + data[90:]
+
+
+class _ChunkedSocket:
+    """Сокет, отдающий данные порциями не больше step байт"""
+
+    def __init__(self, data, step):
+        self.data = memoryview(data)
+        self.step = step
+        self.recv_calls = 0
+
+    def recv_into(self, buffer):
+        self.recv_calls += 1
+        size = min(len(buffer), self.step, len(self.data))
+        buffer[:size] = self.data[:size]
+        self.data = self.data[size:]
+        return size
+
+
+def test_frame_reader_reads_exact_sizes_across_recv_boundaries():
+    data = bytes(range(256)) * 4
+    reader = FrameReader(_ChunkedSocket(data, 7), buffer_size=16, initial=b'HTTP\r\n\r\n')
+    assert reader.read_until(b'\r\n\r\n') == b'HTTP\r\n\r\n'
+    assert reader.read_exact(2) == data[:2]
+    target = bytearray(100)
+    reader.read_into(target)
+    assert bytes(target) == data[2:102]
+    reader.skip(500)
+    assert reader.read_exact(40) == data[602:642]
+    assert reader.read_exact(len(data) - 642) == data[642:]
+
+
+def test_frame_reader_raises_connection_error_on_eof():
+    reader = FrameReader(_ChunkedSocket(b'abc', 10))
+    with pytest.raises(ConnectionError):
+        reader.read_exact(4)
+
+
+def test_frame_reader_timeout_mid_frame_is_a_connection_error():
+    client, server = socket.socketpair()
+    client.settimeout(0.05)
+    server.sendall(b'ab')
+    reader = FrameReader(client)
+    try:
+        with pytest.raises(ConnectionError):
+            reader.read_exact(4)
+    finally:
+        client.close()
+        server.close()
+
+
+def test_deflate_negotiation_parses_server_parameters():
+    assert PerMessageDeflate.from_response(None) is None
+    assert PerMessageDeflate.from_response('x-webkit-deflate-frame') is None
+    extension = PerMessageDeflate.from_response(
+        'permessage-deflate; client_max_window_bits="12"; server_no_context_takeover'
+    )
+    assert extension.client_max_window_bits == 12
+    assert extension.server_no_context_takeover
+    assert not extension.client_no_context_takeover
+
+
+def _server_compress(compressor, data):
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return compressed[:-4]
+
+
+def test_deflate_round_trip_with_context_takeover():
+    extension = PerMessageDeflate({}, min_size=10)
+    assert extension.compress(b'short') is None
+
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    messages = [b'{"status": "ok", "value": %d}' % n * 20 for n in range(3)]
+    sizes = []
+    for message in messages:
+        compressed = extension.compress(message)
+        sizes.append(len(compressed))
+        assert inflater.decompress(compressed + b'\x00\x00\xff\xff') == message
+    # Словарь переиспользуется: повторяющиеся сообщения сжимаются лучше первого
+    assert sizes[1] < sizes[0]
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    for message in messages:
+        extension.start_message()
+        compressed = _server_compress(compressor, message)
+        half = len(compressed) // 2
+        received = extension.decompress(compressed[:half], False, None)
+        received += extension.decompress(compressed[half:], True, None)
+        assert received == message
+
+
+def test_deflate_limit_keeps_dictionary_in_sync():
+    extension = PerMessageDeflate({})
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    big = b'x' * 10000
+    extension.start_message()
+    with pytest.raises(MessageTooBigError):
+        extension.decompress(_server_compress(compressor, big), True, 100)
+
+    # Следующее сообщение ссылается на словарь предыдущего
+    extension.start_message()
+    assert extension.decompress(_server_compress(compressor, big), True, None) == big
+
+    extension.start_message()
+    extension.discard(_server_compress(compressor, b'y' * 5000), True)
+    extension.start_message()
+    assert extension.decompress(_server_compress(compressor, b'y' * 5000), True, None) == b'y' * 5000
+
+
+def test_reconnect_delays_grow_to_maximum():
+    assert list(itertools.islice(reconnect_delays(0.5, 4.0, 2.0, 0), 6)) == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+
+
+def test_reconnect_delays_jitter_stays_in_range():
+    for delay in itertools.islice(reconnect_delays(1.0, 1.0, 2.0, 0.5), 200):
+        assert 0.5 <= delay <= 1.0
+
+
+def test_outbound_queue_drops_oldest_when_full():
+    queue = OutboundQueue(max_messages=3, max_bytes=10)
+    for message in ('a', 'b', 'c', 'd'):
+        assert queue.put(message)
+    assert len(queue) == 3 and queue.dropped == 1
+    # 'c' + 'd' + 8 байт укладываются в max_bytes только без 'b'
+    assert queue.put(b'12345678')
+    assert queue.pending_bytes == 10 and queue.dropped == 2
+    assert not queue.put(b'x' * 11)
+
+    sent = []
+    assert queue.flush(lambda message, opcode, lane: sent.append(message)) == 3
+    assert sent == ['c', 'd', b'12345678']
+    assert len(queue) == 0 and queue.pending_bytes == 0
+
+
+def test_outbound_queue_keeps_message_when_send_fails():
+    queue = OutboundQueue()
+    queue.put('first')
+    queue.put(b'second', OPCODE_BINARY, LANE_BULK)
+
+    def failing_send(message, opcode, lane):
+        raise ConnectionError("нет соединения")
+
+    with pytest.raises(ConnectionError):
+        queue.flush(failing_send)
+    assert len(queue) == 2
+
+    queue.requeue([('unsent', OPCODE_TEXT, LANE_PRIORITY)])
+    sent = []
+    queue.flush(lambda *item: sent.append(item))
+    assert sent == [
+        ('unsent', OPCODE_TEXT, LANE_PRIORITY),
+        ('first', OPCODE_TEXT, LANE_PRIORITY),
+        (b'second', OPCODE_BINARY, LANE_BULK),
+    ]
+
+
+def test_outbound_queue_requeue_drops_newest_over_limit():
+    queue = OutboundQueue(max_messages=2)
+    queue.put('new')
+    queue.requeue([('old1', OPCODE_TEXT, LANE_PRIORITY), ('old2', OPCODE_TEXT, LANE_PRIORITY)])
+    sent = []
+    queue.flush(lambda message, opcode, lane: sent.append(message))
+    assert sent == ['old1', 'old2'] and queue.dropped == 1
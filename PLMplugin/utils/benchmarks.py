@@ -0,0 +1,495 @@
+"""
+Микро-бенчмарки транспортного слоя PLM-клиента.
+
+Запуск из каталога PLMplugin:
+    python -m utils.benchmarks mask echo calls http lanes compile serialize
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _measure(func, repeat):
+    """Возвращает лучшее время выполнения func из repeat попыток"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_mask(sizes=(1024, 1024 * 1024, 50 * 1024 * 1024)):
+    """
+    Измеряет пропускную способность маскирования WebSocket-фреймов.
+
+    Сравнивает apply_mask с прежним побайтовым циклом (для 50 МБ побайтовый
+    цикл оценивается по первому мегабайту, чтобы не ждать минуту).
+
+    Args:
+        sizes: Размеры фреймов в байтах
+
+    Returns:
+        list: Строки результатов вида (размер, МБ/с apply_mask, МБ/с побайтово)
+    """
+    from socket_client import apply_mask, np
+
+    def bytewise(buffer, mask_key):
+        for i in range(len(buffer)):
+            buffer[i] ^= mask_key[i % 4]
+
+    mask_key = os.urandom(4)
+    rows = []
+    print(f"Движок маскирования: {'numpy' if np is not None else 'int-xor'}")
+    for size in sizes:
+        buffer = bytearray(os.urandom(size))
+        repeat = 20 if size <= 1024 * 1024 else 3
+        fast = _measure(lambda: apply_mask(buffer, mask_key), repeat)
+
+        sample = buffer[:min(size, 1024 * 1024)]
+        slow = _measure(lambda: bytewise(sample, mask_key), 1) * (size / len(sample))
+
+        mb = size / (1024 * 1024)
+        rows.append((size, mb / fast, mb / slow))
+        print(f"{size:>10} байт: apply_mask {mb / fast:10.1f} МБ/с, побайтово {mb / slow:8.1f} МБ/с")
+    return rows
+
+
+class _LoopbackServer:
+    """Минимальный WebSocket-сервер на localhost для измерения задержек клиента"""
+
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.conn = None
+
+    def accept(self):
+        """Принимает клиента и отвечает на HTTP handshake"""
+        self.conn, _ = self.listener.accept()
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += self.conn.recv(4096)
+        key = next(
+            line.split(':', 1)[1].strip()
+            for line in request.decode().split('\r\n')
+            if line.lower().startswith('sec-websocket-key')
+        )
+        accept = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+        self.conn.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode()
+        )
+
+    def _recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Клиент закрыл соединение")
+            data.extend(chunk)
+        return data
+
+    def send_text(self, text):
+        """Отправляет нефрагментированный текстовый фрейм без маски"""
+        payload = text.encode('utf-8')
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x81, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x81, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x81, 127, length)
+        self.conn.sendall(header + payload)
+
+    def receive(self):
+        """Читает один фрейм клиента и возвращает демаскированные данные"""
+        from socket_client import apply_mask
+
+        header = self._recv_exact(2)
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._recv_exact(8))[0]
+        mask = bytes(self._recv_exact(4))
+        payload = self._recv_exact(length)
+        apply_mask(payload, mask)
+        return payload
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+        self.listener.close()
+
+
+def _dispatch(registry, client, message):
+    """Выполняет function_call или function_calls из message и отправляет ответ"""
+    data = json.loads(message)
+    if 'function_calls' in data:
+        batch = registry.execute_batch(data['function_calls'], data.get('stop_on_error', True))
+        response = registry.build_batch_response(batch, data.get('request_id'))
+    else:
+        result = registry.execute_function(data['function_call'], data.get('arguments', {}))
+        response = registry.build_response(data['function_call'], result, data.get('request_id'))
+    client.send_message(json.dumps(response))
+
+
+def _selector_loop(registry, client, stop):
+    """Цикл прослушивания с ожиданием через селектор (WebSocketClient.receive_available)"""
+    while not stop.is_set():
+        for message in client.receive_available():
+            _dispatch(registry, client, message)
+
+
+def _poll_loop(registry, client, stop):
+    """Прежний цикл прослушивания: receive_message и sleep 0.1 с"""
+    while not stop.is_set():
+        message = client.receive_message()
+        if message:
+            _dispatch(registry, client, message)
+        time.sleep(0.1)
+
+
+@contextmanager
+def _loopback_client(listen=None, close_timeout=2.0, **options):
+    """
+    Подключает WebSocketClient без сжатия к _LoopbackServer.
+
+    Args:
+        listen: Цикл прослушивания (registry, client, stop) для FunctionRegistry
+            в отдельном потоке или None
+        close_timeout: Ожидание отправки очереди при закрытии клиента
+        **options: Дополнительные параметры WebSocketClient
+
+    Yields:
+        tuple: (server, client)
+    """
+    from socket_client import WebSocketClient
+    from function_registry import FunctionRegistry
+
+    server = _LoopbackServer()
+    acceptor = threading.Thread(target=server.accept)
+    acceptor.start()
+    client = WebSocketClient('127.0.0.1', server.port, compression=False, **options)
+    acceptor.join()
+    stop = threading.Event()
+    if listen is not None:
+        threading.Thread(target=listen, args=(FunctionRegistry(), client, stop), daemon=True).start()
+    try:
+        yield server, client
+    finally:
+        stop.set()
+        client.close(timeout=close_timeout)
+        server.close()
+
+
+def _round_trips(server, messages):
+    """Отправляет сообщения по одному, дожидаясь ответа на каждое; время в мс"""
+    start = time.perf_counter()
+    for message in messages:
+        server.send_text(message)
+        server.receive()
+    return (time.perf_counter() - start) * 1000
+
+
+def _print_totals(results, count, unit):
+    for name, elapsed in results.items():
+        print(f"{name:>10}: {count} {unit} за {elapsed:8.3f} мс")
+
+
+def _print_latencies(name, latencies):
+    """Печатает медиану и максимум задержек; возвращает (медиана, максимум)"""
+    latencies = sorted(latencies)
+    median, worst = latencies[len(latencies) // 2], latencies[-1]
+    print(f"{name:>10}: медиана {median:8.3f} мс, максимум {worst:8.3f} мс")
+    return median, worst
+
+
+def bench_echo(calls=30):
+    """
+    Измеряет задержку полного цикла вызова функции echo через WebSocket.
+
+    Сервер отправляет function_call и ждет ответа, клиент обрабатывает вызов
+    через FunctionRegistry. Сравниваются прежний цикл прослушивания
+    (receive_message + sleep 0.1 с) и ожидание через селектор
+    (WebSocketClient.receive_available).
+
+    Args:
+        calls: Количество вызовов для каждого варианта
+
+    Returns:
+        dict: Медианная задержка в миллисекундах для каждого варианта
+    """
+    request = json.dumps({"function_call": "echo", "arguments": {"message": "ping"}})
+    results = {}
+    for name, loop in (('sleep-poll', _poll_loop), ('selector', _selector_loop)):
+        with _loopback_client(loop) as (server, _):
+            latencies = [_round_trips(server, [request]) for _ in range(calls)]
+        results[name] = _print_latencies(name, latencies)[0]
+    return results
+
+
+def bench_calls(calls=50):
+    """
+    Сравнивает отдельные сообщения function_call (каждое - свой разбор, вызов
+    с логированием и ответ) с одним сообщением function_calls на все вызовы.
+
+    Args:
+        calls: Количество вызовов echo
+
+    Returns:
+        dict: Общее время в миллисекундах для каждого варианта
+    """
+    call = {"function_call": "echo", "arguments": {"message": "ping"}}
+    with _loopback_client(_selector_loop) as (server, _):
+        results = {
+            'single': _round_trips(server, [json.dumps(dict(call, request_id=n)) for n in range(calls)]),
+            'batch': _round_trips(server, [json.dumps({"function_calls": [call] * calls, "request_id": calls})]),
+        }
+    _print_totals(results, calls, 'вызовов')
+    return results
+
+
+def bench_http(requests=300):
+    """
+    Сравнивает GET-запросы APIClient с новым TCP-соединением на каждый запрос
+    (прежнее поведение) и через пул keep-alive соединений.
+
+    Args:
+        requests: Количество запросов для каждого варианта
+
+    Returns:
+        dict: Общее время в миллисекундах для каждого варианта
+    """
+    import http.client
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from api_client import APIClient
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Тело ответа не ждет подтверждения заголовков (задержанный ACK клиента)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = b'{"id": 1, "name": "part"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    def new_connection():
+        conn = http.client.HTTPConnection('127.0.0.1', port=port)
+        try:
+            conn.request("GET", "/api/basic_object/1")
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+    client = APIClient('127.0.0.1', port)
+    results = {}
+    for name, request in (('new-conn', new_connection),
+                          ('pooled', lambda: client.send_get_request("/api/basic_object/1"))):
+        results[name] = _measure(lambda: [request() for _ in range(requests)], 1) * 1000
+    _print_totals(results, requests, 'запросов')
+    print(f"{'pool':>10}: {client.get_pool_stats()}")
+
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def bench_lanes(bulk_size=50 * 1024 * 1024, probes=20):
+    """
+    Измеряет задержку мелких сообщений, отправленных во время передачи крупного
+    бинарного результата: целиком одним сообщением и кусками в полосе LANE_BULK.
+
+    Args:
+        bulk_size: Размер крупного результата в байтах
+        probes: Количество мелких сообщений (отправляются каждые 5 мс)
+
+    Returns:
+        dict: Медианная и максимальная задержка мелких сообщений в миллисекундах
+    """
+    from socket_client import OPCODE_BINARY, LANE_BULK
+    from binary_messages import (
+        BinaryMessage, MESSAGE_TYPE_FUNCTION_RESPONSE, encode_binary_message, split_into_chunks
+    )
+
+    payload = encode_binary_message(BinaryMessage(
+        MESSAGE_TYPE_FUNCTION_RESPONSE, os.urandom(bulk_size), 'application/x-brep'
+    ))
+    results = {}
+    for name, chunked in (('single', False), ('chunked', True)):
+        with _loopback_client(close_timeout=0, heartbeat_interval=None) as (server, client):
+            arrived = {}
+
+            def read_probes():
+                while len(arrived) < probes:
+                    data = server.receive()
+                    if data[:1] == b'{':
+                        arrived[json.loads(data)['probe']] = time.perf_counter()
+
+            reader = threading.Thread(target=read_probes)
+            reader.start()
+
+            if chunked:
+                for chunk in split_into_chunks(payload):
+                    client.send_message(chunk, OPCODE_BINARY, LANE_BULK)
+            else:
+                client.send_message(payload, OPCODE_BINARY)
+
+            sent = {}
+            for probe in range(probes):
+                sent[probe] = time.perf_counter()
+                client.send_message(json.dumps({"probe": probe}))
+                time.sleep(0.005)
+            reader.join()
+
+        results[name] = _print_latencies(name, ((arrived[n] - sent[n]) * 1000 for n in range(probes)))
+    return results
+
+
+def bench_compile(calls=1000):
+    """
+    Сравнивает компиляцию скрипта при каждом вызове с получением
+    скомпилированного объекта из CompiledCodeCache (шаблон compare_objects).
+
+    Args:
+        calls: Количество вызовов
+
+    Returns:
+        dict: Время одного вызова в микросекундах для каждого варианта
+    """
+    from freecad_executor import BUILTIN_TEMPLATES, CompiledCodeCache
+
+    source = BUILTIN_TEMPLATES['compare_objects']
+    cache = CompiledCodeCache()
+
+    def compile_each():
+        for _ in range(calls):
+            compile(source, '<freecad-script>', 'exec')
+
+    def cached():
+        for _ in range(calls):
+            cache.get(source)
+
+    results = {
+        'compile': _measure(compile_each, 3) / calls * 1e6,
+        'cache': _measure(cached, 3) / calls * 1e6,
+    }
+    for name, elapsed in results.items():
+        print(f"{name:>10}: {elapsed:8.2f} мкс на вызов")
+    return results
+
+
+def bench_serialize(objects=20000):
+    """
+    Сравнивает прежнюю сериализацию результата (json.dumps дважды: в неиспользуемую
+    переменную и при отправке) с однопроходной result_serializer.dumps_bytes
+    на крупном результате со списком объектов.
+
+    Прежний путь не умеет кодировать Vector, поэтому для него координаты
+    заранее переведены в списки; новому сериализатору передаются объекты.
+
+    Args:
+        objects: Количество объектов в результате
+
+    Returns:
+        dict: Время сериализации в миллисекундах и пропускная способность в МБ/с
+    """
+    import result_serializer
+
+    class Vector:
+        __slots__ = ('x', 'y', 'z')
+
+        def __init__(self, x, y, z):
+            self.x, self.y, self.z = x, y, z
+
+    result_serializer.register_encoder(Vector, result_serializer.encode_vector)
+
+    def build(vector):
+        return {
+            'success': True,
+            'message': 'Python-код успешно выполнен',
+            'result': {
+                'objects': [
+                    {
+                        'name': f'Part{i}',
+                        'label': f'Деталь {i}',
+                        'position': vector(i * 0.5, i * 0.25, 1.0),
+                        'volume': i * 1.125,
+                        'tags': ['plm', 'brep'],
+                    }
+                    for i in range(objects)
+                ]
+            }
+        }
+
+    plain = build(lambda x, y, z: [x, y, z])
+    rich = build(Vector)
+    size = len(result_serializer.dumps_bytes(rich))
+
+    def old():
+        json.dumps(plain)
+        json.dumps({'type': 'execution_result', 'data': plain}).encode('utf-8')
+
+    def new():
+        result_serializer.dumps_bytes({'type': 'execution_result', 'data': rich})
+
+    print(f"Сериализатор: {'orjson' if result_serializer.orjson is not None else 'json'}, "
+          f"результат {size / (1024 * 1024):.1f} МБ")
+    results = {}
+    for name, func in (('json x2', old), ('single', new)):
+        elapsed = _measure(func, 5)
+        results[name] = (elapsed * 1000, size / elapsed / (1024 * 1024))
+        print(f"{name:>10}: {results[name][0]:8.2f} мс, {results[name][1]:8.1f} МБ/с")
+    return results
+
+
+BENCHMARKS = {
+    'mask': bench_mask,
+    'echo': bench_echo,
+    'calls': bench_calls,
+    'http': bench_http,
+    'lanes': bench_lanes,
+    'compile': bench_compile,
+    'serialize': bench_serialize,
+}
+
+
+if __name__ == "__main__":
+    from utils import logger
+    logger.debug = False
+
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
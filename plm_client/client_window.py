@@ -3,7 +3,7 @@ import threading
 import time
 from PySide2 import QtWidgets, QtCore
 
-from socket_client import create_websocket_client
+from socket_client import WebSocketClient
 
 # Добавляем импорт для выполнения кода
 import traceback
@@ -14,11 +14,14 @@ class PLMClientWindow(QtWidgets.QWidget):
     # Сигнал для обновления UI из другого потока
     message_received = QtCore.Signal(str)
     connection_status_changed = QtCore.Signal(bool, str)
+    # Сигнал с результатом heartbeat (RTT в миллисекундах)
+    heartbeat_updated = QtCore.Signal(float)
     # Добавляем сигнал для выполнения кода в главном потоке
     execute_code_signal = QtCore.Signal(str)
 
     def __init__(self):
         super().__init__()
+        self.ws_client = None
         self.send_message = None
         self.receive_message = None
         self.close_connection = None
@@ -32,6 +35,7 @@ class PLMClientWindow(QtWidgets.QWidget):
         # Подключаем сигналы
         self.message_received.connect(self.update_messages)
         self.connection_status_changed.connect(self.update_connection_status)
+        self.heartbeat_updated.connect(self.update_heartbeat_status)
         # Подключаем сигнал для выполнения кода
         self.execute_code_signal.connect(self.execute_code_in_main_thread)
 
@@ -65,6 +69,10 @@ class PLMClientWindow(QtWidgets.QWidget):
         self.status_label = QtWidgets.QLabel('Статус: Отключено')
         connection_layout.addWidget(self.status_label, 3, 0, 1, 2)
         
+        # Состояние heartbeat: время ответа сервера на ping
+        self.heartbeat_label = QtWidgets.QLabel('Пинг: -')
+        connection_layout.addWidget(self.heartbeat_label, 4, 0, 1, 2)
+        
         layout.addLayout(connection_layout)
         
         # Область для отправки сообщений
@@ -110,7 +118,12 @@ class PLMClientWindow(QtWidgets.QWidget):
             
         try:
             self.add_message(f"Подключение к {host}:{port}...")
-            self.send_message, self.receive_message, self.close_connection = create_websocket_client(host, port)
+            self.ws_client = WebSocketClient(host, port)
+            self.send_message = self.ws_client.send_message
+            self.receive_message = self.ws_client.receive_message
+            self.close_connection = self.ws_client.close
+            # RTT приходит из потока прослушивания, поэтому передаем его через сигнал
+            self.ws_client.on_heartbeat = lambda rtt: self.heartbeat_updated.emit(rtt * 1000)
             
             # Проверяем, что функции получены корректно
             if not self.send_message or not self.receive_message or not self.close_connection:
@@ -136,6 +149,8 @@ class PLMClientWindow(QtWidgets.QWidget):
             self.add_message(f"Ошибка подключения: {str(e)}")
 
     def disconnect_from_server(self):
+        # Сбрасываем флаг до закрытия, чтобы поток прослушивания завершился без ошибки
+        self.is_connected = False
         if self.close_connection:
             try:
                 self.close_connection()
@@ -147,6 +162,7 @@ class PLMClientWindow(QtWidgets.QWidget):
         self.connection_status_changed.emit(False, "Отключено")
         
         # Сбрасываем функции
+        self.ws_client = None
         self.send_message = None
         self.receive_message = None
         self.close_connection = None
@@ -160,10 +176,11 @@ class PLMClientWindow(QtWidgets.QWidget):
         self.message_received.emit("Запущен поток прослушивания сообщений")
         
         message_count = 0
-        while self.is_connected and self.receive_message:
+        ws_client = self.ws_client
+        while self.is_connected and ws_client:
             try:
-                message = self.receive_message()
-                if message:
+                # Ждем данных в селекторе и разбираем все фреймы, пришедшие за одно пробуждение
+                for message in ws_client.receive_available():
                     # Добавляем отладочное сообщение
                     log(f"Получено сырое сообщение от сервера: {message}")
                     
@@ -182,10 +199,10 @@ class PLMClientWindow(QtWidgets.QWidget):
                     # Увеличиваем счетчик сообщений
                     message_count += 1
                     log(f"Всего получено сообщений: {message_count}")
-                    
-                # Небольшая задержка, чтобы не нагружать CPU
-                time.sleep(0.1)
             except Exception as e:
+                if not self.is_connected:
+                    # Соединение закрыто пользователем во время ожидания
+                    break
                 error_msg = f"Ошибка при получении сообщения: {str(e)}"
                 log(error_msg)  # Отладочная информация в консоль
                 
@@ -246,6 +263,11 @@ class PLMClientWindow(QtWidgets.QWidget):
             self.connect_button.setText("Подключиться")
             self.message_input.setEnabled(False)
             self.send_button.setEnabled(False)
+            self.heartbeat_label.setText("Пинг: -")
+
+    def update_heartbeat_status(self, rtt_ms):
+        """Обновляет время ответа сервера на ping (вызывается из другого потока через сигнал)"""
+        self.heartbeat_label.setText(f"Пинг: {rtt_ms:.1f} мс")
 
     def clear_messages(self):
         """Очищает область сообщений"""